@@ -27,4 +27,15 @@ CATEGORY_TYPES = {
     'short': 'short',
     'long': 'long',
     'beard': 'beard'
-}
\ No newline at end of file
+}
+
+# Варианты фильтра по специализации (цифра, которую отправляет клиент)
+SPECIALIZATION_FILTERS = {
+    1: ['beard'],
+    2: ['long'],
+    3: ['short'],
+    4: ['beard', 'short'],
+    5: ['beard', 'long'],
+    6: ['long', 'short'],
+    7: ['beard', 'long', 'short'],
+}
@@ -6,9 +6,61 @@ class Settings:
     DB_USER = "root"
     DB_PASS = "root"
 
+    # Пул соединений (core/database.py)
+    DB_POOL_SIZE = 16              # не меньше 2 × BOT_WORKERS: часть методов берёт вложенное соединение
+    DB_POOL_TIMEOUT = 5            # сек. ожидания свободного соединения
+    DB_POOL_IDLE_TIMEOUT = 300     # сек. простоя до закрытия соединения
+    DB_POOL_PING_INTERVAL = 30     # сек. простоя, после которых соединение проверяется ping
+    # Транзакции (Database.run_transaction): повторы при deadlock и таймауте блокировки
+    DB_DEADLOCK_RETRIES = 3
+    DB_DEADLOCK_BACKOFF = 0.05     # сек.; пауза перед n-м повтором — n × (1..2) × DB_DEADLOCK_BACKOFF
+
+    # Схема БД (core/migrations.py, sql/migrations): при запуске бот проверяет,
+    # что миграции применены и индексы под запросы на месте
+    DB_MIGRATE_ON_START = False    # применять неприменённые миграции при запуске (иначе — scripts/migrate.py)
+    SCHEMA_CHECK_STRICT = False    # не запускать бота, если схема устарела или нет индексов
+
+    # Фоновые задачи (core/scheduler.py)
+    AGGREGATES_RECONCILE_INTERVAL = 3600   # сек. между сверками photos_count/avg_rating/reviews_count
+    SEARCH_INDEX_REBUILD_INTERVAL = 600    # сек. между полными перестроениями поискового индекса
+    REFERENCE_REFRESH_INTERVAL = 3600      # сек. между перечитываниями городов, метро и категорий (вручную — /refresh)
+    GUIDE_CHECK_INTERVAL = 60              # сек. между проверками справочника стрижек на изменения (вручную — /refresh)
+
+    # Кэш карточек анкет для клиентов (managers/cards.py)
+    PROFILE_CARD_CACHE_SIZE = 500
+    # Кэш альбомов фото (managers/media.py): портфолио барберов и фото стрижек
+    MEDIA_CACHE_SIZE = 1000
+
 
     BOT_TOKEN = ""
 
+    # Диспетчер апдейтов (core/dispatcher.py)
+    BOT_WORKERS = 8                # потоков-обработчиков; апдейты одного чата идут в один поток
+    BOT_WORKER_QUEUE_SIZE = 100    # длина очереди потока, при заполнении приём апдейтов ждёт
+
+    # Лимиты исходящих запросов к Telegram (core/sender.py)
+    TG_GLOBAL_RATE = 30            # сообщений в секунду на бота
+    TG_CHAT_RATE = 1               # сообщений в секунду в один чат
+    # Допустимая пачка сообщений в чат сверх TG_CHAT_RATE. Ответ с анкетой — альбом
+    # и сообщение с кнопками (2 отправки); 5 хватает на два таких ответа подряд
+    # и правку, не задерживая поток диспетчера (см. RateLimitedTeleBot._limited)
+    TG_CHAT_BURST = 5
+    OUTBOX_WORKERS = 4             # потоков очереди уведомлений
+
+    # Приём апдейтов: 'polling' или 'webhook' (core/webhook.py)
+    BOT_MODE = 'polling'
+    WEBHOOK_HOST = '0.0.0.0'
+    WEBHOOK_PORT = 8443
+    WEBHOOK_PATH = '/webhook'
+    WEBHOOK_URL = ''               # публичный адрес для setWebhook; пусто — вебхук настроен вручную
+    WEBHOOK_SECRET = ''            # проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+
+    # Метрики (core/metrics.py): Prometheus на http://METRICS_HOST:METRICS_PORT/metrics, 0 — выключено
+    METRICS_HOST = '127.0.0.1'
+    METRICS_PORT = 9100
+    SLOW_UPDATE_THRESHOLD = 1.0    # сек.; более долгие апдейты пишутся в лог со списком запросов
+    SLOW_UPDATE_MAX_QUERIES = 20   # запросов в одной записи журнала медленных апдейтов
+
     @staticmethod
     def db_config():
         return {
@@ -18,3 +70,20 @@ class Settings:
             "password": Settings.DB_PASS,
         }
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    # Черновики анкет (core/storage.py): 'sqlite' — файл БД SQLite в режиме WAL,
+    # 'files' — каталог DRAFTS_PATH с отдельным JSON-файлом на пользователя
+    DRAFTS_BACKEND = 'sqlite'
+    DRAFTS_PATH = os.path.join(BASE_DIR, 'barber_drafts.sqlite3')
+    # Старое хранилище; переносится в пустое новое один раз (отметка — DRAFTS_PATH + .legacy_imported)
+    DRAFTS_LEGACY_JSON = os.path.join(BASE_DIR, 'barber_profiles.json')
+    # LRU-кэш черновиков в памяти (0 — без кэша) и максимальная задержка записи на диск, сек.
+    DRAFTS_CACHE_SIZE = 1000
+    DRAFTS_FLUSH_INTERVAL = 5
+
+    # Шаги диалогов (core/steps.py): ожидаемый следующий ответ пользователя
+    # сохраняется в SQLite и переживает перезапуск бота
+    NEXT_STEPS_PATH = os.path.join(BASE_DIR, 'next_steps.sqlite3')
+    NEXT_STEP_TTL = 24 * 3600          # сек., после которых незавершённый шаг считается брошенным
+    NEXT_STEP_MAX_PER_CHAT = 3         # сохранённых шагов на чат, лишние (самые старые) удаляются
+    NEXT_STEP_PURGE_INTERVAL = 3600    # сек. между удалениями брошенных шагов
@@ -1,4 +1,4 @@
-import telebot
+import copy
 import logging
 from telebot import types
 from config.settings import Settings
@@ -9,18 +9,50 @@ from config.constants import SERVICES
 from managers.admin import AdminManager
 from managers.client import ClientManager, register_client_handlers
 from managers.guide import GuideManager
+from managers.search import barber_index
+from core.context import UserContextMiddleware
+from core.scheduler import start_scheduler
+from core.dispatcher import UpdateDispatcher
+from core.webhook import WebhookServer
+from core.sender import RateLimitedTeleBot, RateLimiter
+from core.router import router
+from core import metrics, migrations
+from core.metrics import Gauge, MetricsServer
+from core.database import Database
+from core.steps import get_step_backend, next_step, step_name
 
 logger = logging.getLogger(__name__)
-bot = telebot.TeleBot(Settings.BOT_TOKEN)
+# Обработчики выполняются в потоках UpdateDispatcher, а не во встроенном пуле telebot
+bot = RateLimitedTeleBot(
+    Settings.BOT_TOKEN,
+    RateLimiter(Settings.TG_GLOBAL_RATE, Settings.TG_CHAT_RATE, Settings.TG_CHAT_BURST),
+    outbox_workers=Settings.OUTBOX_WORKERS,
+    threaded=False,
+    use_class_middlewares=True,
+    next_step_backend=get_step_backend()
+)
+get_step_backend().bind(bot)
+bot.setup_middleware(UserContextMiddleware())
+dispatcher = UpdateDispatcher(bot, Settings.BOT_WORKERS, Settings.BOT_WORKER_QUEUE_SIZE)
 storage = BarberStorage()
 
+# Шаги, которые принимают город или станцию метро, выбранные кнопкой-подсказкой
+SUGGESTION_STEPS = {
+    'city': ('main.city_selection', 'client.city_input', 'admin.city_filter'),
+    'metro': ('main.filter_metro',),
+}
+
+def awaits_suggestion(handler, kind):
+    name = step_name(handler.callback)
+    if name == 'barber.answer':
+        return handler.args[0] == kind
+    return name in SUGGESTION_STEPS[kind]
+
 def show_main_menu(user_id, message_text=None):
-    roles = DatabaseManager.get_all_roles(user_id)
-    active_role = DatabaseManager.get_active_role(user_id)
-    is_admin = DatabaseManager.is_admin(user_id)
-    is_barber_filled = DatabaseManager.barber_exists(user_id) if active_role == 'barber' else False
+    ctx = DatabaseManager.get_user_context(user_id)
+    active_role = ctx.active_role
 
-    markup = KeyboardManager.main_menu(active_role, len(roles), is_admin, is_barber_filled, user_id=user_id)
+    markup = KeyboardManager.main_menu(active_role, len(ctx.roles), ctx.is_admin, ctx.is_barber_filled, ctx.barber_status)
 
     if message_text:
         bot.send_message(user_id, message_text, reply_markup=markup)
@@ -44,24 +76,30 @@ def register_handlers():
             if not DatabaseManager.register_user(user_id, user.username, user.first_name):
                 return bot.reply_to(message, "⚠️ Ошибка регистрации")
 
-        roles = DatabaseManager.get_all_roles(user_id)
-        active_role = DatabaseManager.get_active_role(user_id)
+        ctx = DatabaseManager.get_user_context(user_id)
 
-        if active_role == 'barber':
-            barber = DatabaseManager.get_barber_by_user_id(user_id)
-            if barber:
-                status = DatabaseManager.get_barber_status(user_id)
-                if status == "banned":
-                    bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
-                    return
+        if ctx.active_role == 'barber' and ctx.barber_status == "banned":
+            bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
+            return
 
-        if not roles:
+        if not ctx.roles:
             bot.send_message(user_id, "👋 Добро пожаловать! Выберите роль:",
                              reply_markup=KeyboardManager.role_selection_keyboard())
         else:
             show_main_menu(user_id)
 
-    @bot.message_handler(func=lambda msg: msg.text in ["👤 Клиент", "✂️ Барбер"])
+    @bot.message_handler(commands=['refresh'])
+    def refresh_reference_data(message):
+        """Перечитывает справочники после правки городов, метро, категорий или стрижек в БД"""
+        user_id = message.from_user.id
+        if not DatabaseManager.is_admin(user_id):
+            return
+        if DatabaseManager.reload_reference_data() and GuideManager.reload_content(force=True):
+            bot.send_message(user_id, "✅ Справочники обновлены")
+        else:
+            bot.send_message(user_id, "❌ Не удалось обновить справочники")
+
+    @router.text("👤 Клиент", "✂️ Барбер")
     def handle_role_selection(message):
         user_id = message.from_user.id
         role = 'client' if message.text == "👤 Клиент" else 'barber'
@@ -71,31 +109,27 @@ def register_handlers():
         else:
             bot.send_message(user_id, "❌ Ошибка выбора роли")
 
-    @bot.message_handler(func=lambda msg: msg.text == "📝 Заполнить анкету барбера")
+    @router.text("📝 Заполнить анкету барбера")
     def start_barber_questionnaire(message):
         user_id = message.from_user.id
 
-        barber = DatabaseManager.get_barber_by_user_id(user_id)
-        if barber:
-            status = DatabaseManager.get_barber_status(user_id)
-            if status == "banned":
-                bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
-                return
+        ctx = DatabaseManager.get_user_context(user_id)
+        if ctx.barber_status == "banned":
+            bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
+            return
 
         bot.send_message(user_id, "Давайте заполним анкету барбера.",
                          reply_markup=KeyboardManager.barber_questionnaire_keyboard())
         BarberManager.ask_question(user_id, 'description', bot)
 
-    @bot.message_handler(func=lambda msg: msg.text == "✏️ Редактировать анкету")
+    @router.text("✏️ Редактировать анкету")
     def edit_barber_questionnaire(message):
         user_id = message.from_user.id
 
-        barber = DatabaseManager.get_barber_by_user_id(user_id)
-        if barber:
-            status = DatabaseManager.get_barber_status(user_id)
-            if status == "banned":
-                bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
-                return
+        ctx = DatabaseManager.get_user_context(user_id)
+        if ctx.barber_status == "banned":
+            bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
+            return
 
         DatabaseManager.delete_barber_data(user_id)
         storage.clear_profile(user_id)
@@ -104,34 +138,30 @@ def register_handlers():
                          reply_markup=KeyboardManager.barber_questionnaire_keyboard())
         BarberManager.ask_question(user_id, 'description', bot)
 
-    @bot.message_handler(func=lambda msg: msg.text == "💾 Сохранить")
+    @router.text("💾 Сохранить")
     def save_barber_profile(message):
         user_id = message.from_user.id
 
-        barber = DatabaseManager.get_barber_by_user_id(user_id)
-        if barber:
-            status = DatabaseManager.get_barber_status(user_id)
-            if status == "banned":
-                bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
-                return
+        ctx = DatabaseManager.get_user_context(user_id)
+        if ctx.barber_status == "banned":
+            bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
+            return
 
         BarberManager.save_profile_to_db(user_id, bot)
 
-    @bot.message_handler(func=lambda msg: msg.text in ["➕ Добавить роль", "🔄 Сменить роль"])
+    @router.text("➕ Добавить роль", "🔄 Сменить роль")
     def handle_role_management(message):
         user_id = message.from_user.id
 
-        barber = DatabaseManager.get_barber_by_user_id(user_id)
-        if barber:
-            status = DatabaseManager.get_barber_status(user_id)
-            if status == "banned":
-                bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
-                return
+        ctx = DatabaseManager.get_user_context(user_id)
+        if ctx.barber_status == "banned":
+            bot.send_message(user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
+            return
         action = message.text
 
-        roles = DatabaseManager.get_all_roles(user_id)
-        active_role = DatabaseManager.get_active_role(user_id)
-        is_admin = DatabaseManager.is_admin(user_id)
+        roles = ctx.roles
+        active_role = ctx.active_role
+        is_admin = ctx.is_admin
 
         if action == "➕ Добавить роль":
             available_roles = DatabaseManager.get_available_roles(user_id)
@@ -150,7 +180,7 @@ def register_handlers():
             markup = KeyboardManager.switch_role_keyboard(roles, active_role, is_admin)
             bot.send_message(user_id, "Выберите роль для переключения:", reply_markup=markup)
 
-    @bot.message_handler(func=lambda msg: "Добавить роль" in msg.text or "Переключиться" in msg.text)
+    @router.text_matching(lambda text: "Добавить роль" in text or "Переключиться" in text)
     def handle_role_action(message):
         user_id = message.from_user.id
 
@@ -183,30 +213,30 @@ def register_handlers():
 
 
 
-    @bot.message_handler(func=lambda msg: msg.text in SERVICES.values())
+    @router.text(*SERVICES.values())
     def handle_service_selection(message):
         user_id = message.from_user.id
         BarberManager.ask_for_service_price(user_id, bot, message.text)
 
-    @bot.message_handler(func=lambda msg: msg.text == "✅ Продолжить")
+    @router.text("✅ Продолжить")
     def handle_service_continue(message):
         user_id = message.from_user.id
         idx = QUESTION_ORDER.index('services')
         next_key = QUESTION_ORDER[idx + 1]
         BarberManager.ask_question(user_id, next_key, bot)
 
-    @bot.message_handler(func=lambda msg: msg.text == "❌ Отменить заполнение")
+    @router.text("❌ Отменить заполнение")
     def cancel_questionnaire(message):
         user_id = message.from_user.id
         storage.clear_profile(user_id)
         show_main_menu(user_id, "❌ Заполнение анкеты отменено")
 
-    @bot.message_handler(func=lambda msg: msg.text == "❌ Отмена")
+    @router.text("❌ Отмена")
     def cancel_action(message):
         user_id = message.from_user.id
         show_main_menu(user_id)
 
-    @bot.message_handler(func=lambda msg: msg.text == "📍 Выбрать город")
+    @router.text("📍 Выбрать город")
     def choose_city(message):
         user_id = message.from_user.id
         cities = DatabaseManager.get_all_cities()
@@ -217,6 +247,7 @@ def register_handlers():
         bot.send_message(user_id, "Выберите город:", reply_markup=markup)
         bot.register_next_step_handler_by_chat_id(user_id, save_city_selection)
 
+    @next_step("main.city_selection")
     def save_city_selection(message):
         user_id = message.from_user.id
         city_name = message.text.strip()
@@ -225,58 +256,58 @@ def register_handlers():
             return
         city_id = DatabaseManager.get_city_id_by_name(city_name)
         if not city_id:
-            bot.send_message(user_id, "❌ Город не найден. Попробуйте снова.")
+            suggestions = DatabaseManager.reference_data().suggest_cities(city_name)
+            bot.send_message(
+                user_id,
+                "❌ Город не найден. Возможно, вы имели в виду:" if suggestions else "❌ Город не найден. Попробуйте снова.",
+                reply_markup=KeyboardManager.suggestions_keyboard('city', suggestions)
+            )
             return choose_city(message)
         DatabaseManager.save_user_city_selection(user_id, city_id)
         bot.send_message(user_id, f"✅ Город выбран: {city_name}", reply_markup=KeyboardManager.main_menu("client", 1, False))
         show_main_menu(user_id)
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("admin_"))
-    def handle_admin_callbacks(call):
+    # Кнопка подсказки отвечает на ожидающий шаг так, будто пользователь ввёл название сам
+    @router.callback_prefix("suggest_")
+    def handle_suggestion(call, args):
+        chat_id = call.message.chat.id
+        kind, item_id = args[0], int(args[1])
+        reference = DatabaseManager.reference_data()
+        name = reference.city_name(item_id) if kind == 'city' else reference.metro_names.get(item_id)
+
+        handlers = bot.next_step_backend.get_handlers(chat_id) or []
+        if not name or not handlers or not all(awaits_suggestion(handler, kind) for handler in handlers):
+            for handler in handlers:
+                bot.next_step_backend.register_handler(chat_id, handler)
+            return bot.answer_callback_query(call.id, "Эта подсказка уже неактуальна")
+
+        bot.answer_callback_query(call.id)
+        message = copy.copy(call.message)
+        message.from_user = call.from_user
+        message.text = name
+        for idx, handler in enumerate(handlers):
+            try:
+                handler.callback(message, *handler.args, **handler.kwargs)
+            except Exception:
+                # Шаг анкеты не должен теряться: если обработчик не успел
+                # зарегистрировать следующий шаг, ожидание ввода возвращается
+                registered = bot.next_step_backend.get_handlers(chat_id)
+                for pending in registered or handlers[idx:]:
+                    bot.next_step_backend.register_handler(chat_id, pending)
+                raise
+
+    @router.callback_prefix("admin_")
+    def handle_admin_callbacks(call, args):
         AdminManager.handle_callback(bot, call)
 
-    @bot.message_handler(func=lambda msg: msg.text == "📝 Ждущие анкеты")
+    @router.text("📝 Ждущие анкеты")
     def handle_pending_profiles(message):
         user_id = message.from_user.id
         if not DatabaseManager.is_admin(user_id):
             return bot.send_message(user_id, "❌ У вас нет прав администратора")
         AdminManager.show_pending_profiles(bot, user_id)
 
-    @bot.message_handler(func=lambda msg: msg.text == "📍 Выбрать город")
-    def client_choose_city(message):
-        user_id = message.from_user.id
-        msg = bot.send_message(
-            user_id,
-            "📍 Введите город, в котором вы хотите искать барбера:",
-            reply_markup=types.ReplyKeyboardRemove()
-        )
-        bot.register_next_step_handler(msg, handle_client_city_input)
-
-    def handle_client_city_input(message):
-        user_id = message.from_user.id
-        city_name = message.text.strip()
-
-        city_id = DatabaseManager.get_city_id_by_name(city_name)
-        if not city_id:
-            msg = bot.send_message(
-                user_id,
-                f"❌ Город '{city_name}' не найден в базе. Попробуйте ещё раз:"
-            )
-            bot.register_next_step_handler(msg, handle_client_city_input)
-            return
-
-        DatabaseManager.save_user_city_selection(user_id, city_id)
-        bot.send_message(
-            user_id,
-            f"✅ Город '{city_name}' выбран!",
-            reply_markup=KeyboardManager.main_menu(
-                "client",
-                len(DatabaseManager.get_all_roles(user_id)),
-                DatabaseManager.is_admin(user_id)
-            )
-        )
-
-    @bot.message_handler(func=lambda msg: msg.text == "🔍 Найти барбера")
+    @router.text("🔍 Найти барбера")
     def handle_find_barber(message):
         user_id = message.from_user.id
         city_id = DatabaseManager.get_user_city_selection(user_id)
@@ -288,13 +319,13 @@ def register_handlers():
         markup.add(types.KeyboardButton("❌ Отмена"))
         bot.send_message(user_id, "Выберите способ поиска барбера:", reply_markup=markup)
 
-    @bot.message_handler(func=lambda msg: msg.text == "🔎 Без фильтров")
+    @router.text("🔎 Без фильтров")
     def handle_find_barber_no_filters(message):
         user_id = message.from_user.id
         city_id = DatabaseManager.get_user_city_selection(user_id)
         ClientManager.show_active_barbers(bot, user_id, page=0, city_id=city_id)
 
-    @bot.message_handler(func=lambda msg: msg.text == "🔎 Фильтры")
+    @router.text("🔎 Фильтры")
     def handle_find_barber_filters(message):
         user_id = message.from_user.id
         city_id = DatabaseManager.get_user_city_selection(user_id)
@@ -316,21 +347,25 @@ def register_handlers():
             )
             bot.register_next_step_handler(msg, handle_filter_price)
 
+    @next_step("main.filter_metro")
     def handle_filter_metro(message):
         user_id = message.from_user.id
-        metro_input = message.text.strip().lower()
+        metro_input = message.text.strip()
 
         storage = BarberStorage()
         profile = storage.get_profile(user_id) or {}
 
-        if metro_input != 'нет':
+        if metro_input.lower() != 'нет':
             city_id = DatabaseManager.get_user_city_selection(user_id)
             metro_id = DatabaseManager.get_metro_id_by_name(city_id, metro_input)
 
             if not metro_id:
+                suggestions = DatabaseManager.reference_data().suggest_metro(city_id, metro_input)
+                hint = "Выберите похожую станцию, введите ещё раз или отправьте 'нет':" if suggestions else "Попробуйте ещё раз или отправьте 'нет':"
                 msg = bot.send_message(
                     user_id,
-                    f"❌ Станция метро '{metro_input}' не найдена. Попробуйте ещё раз или отправьте 'нет':"
+                    f"❌ Станция метро '{metro_input}' не найдена. {hint}",
+                    reply_markup=KeyboardManager.suggestions_keyboard('metro', suggestions)
                 )
                 bot.register_next_step_handler(msg, handle_filter_metro)
                 return
@@ -348,6 +383,7 @@ def register_handlers():
         )
         bot.register_next_step_handler(msg, handle_filter_price)
 
+    @next_step("main.filter_price")
     def handle_filter_price(message):
         user_id = message.from_user.id
         try:
@@ -378,6 +414,7 @@ def register_handlers():
         msg = bot.send_message(user_id, text)
         bot.register_next_step_handler(msg, handle_filter_specialization)
 
+    @next_step("main.filter_specialization")
     def handle_filter_specialization(message):
         user_id = message.from_user.id
         try:
@@ -399,7 +436,7 @@ def register_handlers():
         max_price = profile.get('filter_max_price')
         metro_id = profile.get('filter_metro_id', None)
 
-        barbers = DatabaseManager.get_filtered_barbers(
+        barbers = barber_index.search(
             city_id=city_id,
             max_price=max_price,
             specialization_num=spec_num,
@@ -439,15 +476,16 @@ def register_handlers():
             reply_markup=markup
         )
 
-    @bot.message_handler(func=lambda msg: msg.text in ["👁️ Скрыть анкету", "👁️ Показать анкету"])
+    @router.text("👁️ Скрыть анкету", "👁️ Показать анкету")
     def handle_toggle_visibility(message):
         user_id = message.from_user.id
-        current_role = DatabaseManager.get_active_role(user_id)
+        ctx = DatabaseManager.get_user_context(user_id)
+        current_role = ctx.active_role
 
-        if current_role != 'barber' or not DatabaseManager.barber_exists(user_id):
+        if current_role != 'barber' or not ctx.barber_exists:
             return
 
-        current_status = DatabaseManager.get_barber_visibility_status(user_id)
+        current_status = ctx.barber_status
 
         if current_status not in ['active', 'hidden']:
             return
@@ -462,10 +500,10 @@ def register_handlers():
                 f"✅ Ваша анкета теперь {status_text}",
                 reply_markup=KeyboardManager.main_menu(
                     active_role=current_role,
-                    roles_count=len(DatabaseManager.get_all_roles(user_id)),
-                    is_admin=DatabaseManager.is_admin(user_id),
+                    roles_count=len(ctx.roles),
+                    is_admin=ctx.is_admin,
                     is_barber_filled=True,
-                    user_id=user_id
+                    barber_status=new_status
                 )
             )
         else:
@@ -481,17 +519,82 @@ def register_handlers():
                 )
         return False
 
-    @bot.message_handler(func=lambda msg: msg.text == "👤 Моя анкета")
+    @router.text("👤 Моя анкета")
     def handle_my_profile(message):
         user_id = message.from_user.id
         BarberManager.show_my_profile(user_id, bot)
 
+def start_metrics():
+    metrics.configure(Settings.SLOW_UPDATE_THRESHOLD, Settings.SLOW_UPDATE_MAX_QUERIES)
+    metrics.instrument_api()
+    def pool_connections():
+        stats = Database.pool_stats()
+        return {('in_use',): stats['in_use'], ('idle',): stats['idle']}
+
+    metrics.registry.register(Gauge(
+        'bot_db_pool_connections', 'Соединения пула MySQL', pool_connections, ('state',)))
+    metrics.registry.register(Gauge(
+        'bot_db_pool_wait_seconds_total', 'Суммарное ожидание свободного соединения',
+        lambda: Database.pool_stats()['wait_time_total']))
+    metrics.registry.register(Gauge(
+        'bot_dispatcher_queue_depth', 'Апдейтов в очереди потока диспетчера', lambda: {
+            (str(idx),): worker['depth'] for idx, worker in enumerate(dispatcher.stats()['workers'])
+        }, ('worker',)))
+    if Settings.METRICS_PORT:
+        MetricsServer(Settings.METRICS_HOST, Settings.METRICS_PORT).start()
+
+def check_schema():
+    if Settings.DB_MIGRATE_ON_START and not migrations.migrate():
+        raise SystemExit("Миграции схемы БД не применены, подробности в логе")
+    problems = migrations.check_schema()
+    # До миграции 0003 rating бывает NULL: тогда сортировка по COALESCE, без индекса
+    DatabaseManager.set_rating_not_null(migrations.is_applied(migrations.RATING_NOT_NULL_VERSION) is True)
+    if Settings.SCHEMA_CHECK_STRICT and (problems is None or problems):
+        raise SystemExit("Схема БД устарела или не хватает индексов, подробности в логе")
+
 def start_bot():
     register_handlers()
     register_client_handlers(bot)
     GuideManager.init_handlers(bot)
+    router.install(bot)
+    start_metrics()
+    check_schema()
+    DatabaseManager.reload_reference_data()
+    GuideManager.reload_content(force=True)
+    barber_index.load()
+    start_scheduler()
     print("Бот запущен")
-    bot.polling(none_stop=True)
+    dispatcher.start()
+    try:
+        if Settings.BOT_MODE == 'webhook':
+            run_webhook()
+        else:
+            dispatcher.poll()
+    finally:
+        dispatcher.stop()
+        bot.outbox.stop()
+        storage.flush()
+
+def run_webhook():
+    server = WebhookServer(
+        dispatcher,
+        Settings.WEBHOOK_HOST,
+        Settings.WEBHOOK_PORT,
+        Settings.WEBHOOK_PATH,
+        secret_token=Settings.WEBHOOK_SECRET or None
+    )
+    if Settings.WEBHOOK_URL:
+        bot.set_webhook(
+            url=Settings.WEBHOOK_URL.rstrip('/') + Settings.WEBHOOK_PATH,
+            secret_token=Settings.WEBHOOK_SECRET or None,
+            max_connections=Settings.BOT_WORKERS
+        )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
 
 if __name__ == "__main__":
     start_bot()
\ No newline at end of file
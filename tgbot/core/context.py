@@ -0,0 +1,80 @@
+import threading
+from telebot.handler_backends import BaseMiddleware
+
+# Контексты пользователей, загруженные в рамках текущего апдейта.
+# Обработчики telebot выполняются в потоках пула, поэтому область — поток.
+_local = threading.local()
+
+
+class UserContext:
+    """Роли, админ-флаг, анкета барбера и выбранный город пользователя.
+
+    Загружается одним запросом (DatabaseManager.get_user_context) и живёт
+    до конца обработки апдейта либо до первой записи, которая его меняет.
+    """
+
+    def __init__(self, user_id, roles=None, active_role=None, barber_id=None,
+                 barber_status=None, city_id=None):
+        self.user_id = user_id
+        self.roles = roles or []
+        self.active_role = active_role
+        self.barber_id = barber_id
+        self.barber_status = barber_status
+        self.city_id = city_id
+
+    @property
+    def is_admin(self):
+        return 'admin' in self.roles
+
+    @property
+    def barber_exists(self):
+        return self.barber_id is not None
+
+    @property
+    def is_barber_filled(self):
+        """Флаг для главного меню: анкета есть и активна роль барбера"""
+        return self.active_role == 'barber' and self.barber_exists
+
+
+def begin_scope():
+    _local.contexts = {}
+
+
+def end_scope():
+    _local.contexts = None
+
+
+def get_scoped(user_id):
+    contexts = getattr(_local, 'contexts', None)
+    return contexts.get(user_id) if contexts is not None else None
+
+
+def store_scoped(context):
+    contexts = getattr(_local, 'contexts', None)
+    if contexts is not None:
+        contexts[context.user_id] = context
+
+
+def invalidate(user_id=None):
+    """Сбрасывает контекст пользователя (или все контексты, если user_id не задан)"""
+    contexts = getattr(_local, 'contexts', None)
+    if not contexts:
+        return
+    if user_id is None:
+        contexts.clear()
+    else:
+        contexts.pop(user_id, None)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Открывает область кэширования UserContext на время обработки апдейта"""
+
+    def __init__(self):
+        super().__init__()
+        self.update_types = ['message', 'callback_query']
+
+    def pre_process(self, message, data):
+        begin_scope()
+
+    def post_process(self, message, data, exception):
+        end_scope()
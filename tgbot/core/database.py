@@ -1,10 +1,192 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
 from config.settings import Settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Общий на процесс пул соединений с MySQL.
+
+    Соединения выдаются в порядке LIFO, чтобы чаще использовались «тёплые»,
+    а простаивающие дольше DB_POOL_IDLE_TIMEOUT закрывались.
+    """
+
+    def __init__(self, size, timeout, idle_timeout, ping_interval):
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._idle = deque()  # (connection, время возврата в пул)
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'health_check_failures': 0,
+        }
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    connection, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolError(f"Пул соединений исчерпан ({self.size}), ожидание {self.timeout} с")
+                waited = True
+                self._cond.wait(remaining)
+
+            wait_time = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+        try:
+            if connection is not None and not self._is_healthy(connection, released_at):
+                connection = None
+            if connection is None:
+                connection = self._open()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+        return connection
+
+    def release(self, connection):
+        try:
+            # SELECT открывает транзакцию со снимком данных — не отдаём его следующему
+            if connection.in_transaction:
+                connection.rollback()
+        except Error:
+            self._discard(connection)
+            return
+
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['opened'] = self._opened
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._opened - len(self._idle)
+        return stats
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+            self._stats['connections_closed'] += len(idle)
+            self._cond.notify_all()
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+    def _open(self):
+        connection = mysql.connector.connect(**Settings.db_config())
+        with self._cond:
+            self._stats['connections_opened'] += 1
+        metrics.record_connection()
+        return connection
+
+    def _is_healthy(self, connection, released_at):
+        if time.monotonic() - released_at < self.ping_interval:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+                self._stats['connections_closed'] += 1
+            self._close_quietly(connection)
+            return False
+
+    def _evict_idle(self):
+        # Вызывается под self._cond; самые старые соединения лежат слева
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            connection, _ = self._idle.popleft()
+            self._opened -= 1
+            self._stats['connections_closed'] += 1
+            self._close_quietly(connection)
+
+    def _discard(self, connection):
+        self._close_quietly(connection)
+        with self._cond:
+            self._opened -= 1
+            self._stats['connections_closed'] += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=Settings.DB_POOL_SIZE,
+                    timeout=Settings.DB_POOL_TIMEOUT,
+                    idle_timeout=Settings.DB_POOL_IDLE_TIMEOUT,
+                    ping_interval=Settings.DB_POOL_PING_INTERVAL
+                )
+    return _pool
+
+
+# Ошибки, после которых InnoDB откатывает транзакцию целиком и её можно повторить:
+# таймаут ожидания блокировки и взаимная блокировка (deadlock)
+RETRYABLE_ERRORS = {1205, 1213}
+
 
 class Database:
     def __init__(self):
         self.connection = None
+        # Результат последней команды изменения: id вставленной строки и число затронутых строк
+        self.lastrowid = None
+        self.rowcount = -1
+        self._depth = 0            # вложенность transaction(): 0 — вне транзакции
+        self._after_commit = []
 
     def __enter__(self):
         self.connect()
@@ -14,23 +196,166 @@ class Database:
         self.disconnect()
 
     def connect(self):
+        # Повторный вызов внутри `with Database()` не берёт второе соединение
+        if self.connection is not None:
+            return True
         try:
-            self.connection = mysql.connector.connect(
-                host=Settings.DB_HOST,
-                database=Settings.DB_NAME,
-                user=Settings.DB_USER,
-                password=Settings.DB_PASS
-            )
+            self.connection = get_pool().acquire()
             return True
         except Error as e:
-            print(f"Ошибка подключения к БД: {e}")
+            logger.error(f"Ошибка подключения к БД: {e}")
+            metrics.query_errors.inc('connect')
             return False
 
     def disconnect(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        if self.connection is not None:
+            get_pool().release(self.connection)
+            self.connection = None
+
+    @staticmethod
+    def pool_stats():
+        return get_pool().stats()
+
+    @staticmethod
+    def atomic(work, default=False, retries=None):
+        """Единица работы: work(db) на своём соединении одной транзакцией (см. run_transaction).
+
+        Возвращает результат work; default — если БД недоступна или транзакция
+        откатилась из-за ошибки MySQL.
+        """
+        with Database() as db:
+            if not db.connect():
+                return default
+            try:
+                return db.run_transaction(work, retries)
+            except Error as e:
+                logger.error(f"Транзакция откатилась: {e}")
+                return default
+
+    def run_transaction(self, work, retries=None):
+        """Выполняет work(db) в transaction() и повторяет целиком при RETRYABLE_ERRORS.
+
+        Повторяется только внешняя транзакция: внутри уже открытой ошибка пробрасывается
+        наружу, потому что InnoDB откатил всю транзакцию, а не точку сохранения.
+        """
+        retries = Settings.DB_DEADLOCK_RETRIES if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                with self.transaction():
+                    return work(self)
+            except Error as e:
+                if self._depth or e.errno not in RETRYABLE_ERRORS or attempt >= retries:
+                    raise
+                attempt += 1
+                metrics.query_errors.inc('retry')
+                logger.warning(f"Транзакция повторяется ({attempt}/{retries}): {e}")
+                time.sleep(Settings.DB_DEADLOCK_BACKOFF * attempt * random.uniform(1, 2))
+
+    @contextmanager
+    def transaction(self):
+        """Команды внутри блока — одна транзакция: commit при выходе, rollback при исключении.
+
+        Внутри блока execute/executemany не фиксируют каждую команду, а ошибку
+        MySQL пробрасывают (вместо возврата False), чтобы транзакция откатилась.
+        Вложенный блок — точка сохранения (SAVEPOINT): при исключении в нём
+        откатываются только его команды.
+        """
+        if self._depth:
+            yield from self._savepoint()
+            return
+
+        # Предыдущий SELECT мог открыть неявную транзакцию со снимком данных
+        if self.connection.in_transaction:
+            self.connection.commit()
+        self.connection.start_transaction()
+        self._depth = 1
+        self._after_commit = []
+        try:
+            yield self
+            self.connection.commit()
+        except Exception:
+            self._after_commit = []
+            self.connection.rollback()
+            raise
+        finally:
+            self._depth = 0
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def _savepoint(self):
+        name = f"sp_{self._depth}"
+        callbacks = len(self._after_commit)
+        self._command(f"SAVEPOINT {name}")
+        self._depth += 1
+        try:
+            yield self
+        except Exception:
+            self._depth -= 1
+            del self._after_commit[callbacks:]
+            try:
+                self._command(f"ROLLBACK TO SAVEPOINT {name}")
+            except Error:
+                # Транзакция уже откатилась целиком (например, deadlock) — точки сохранения нет
+                pass
+            raise
+        self._depth -= 1
+        self._command(f"RELEASE SAVEPOINT {name}")
+
+    def _command(self, statement):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    @property
+    def in_transaction(self):
+        return self._depth > 0
+
+    def after_commit(self, callback):
+        """callback() после фиксации внешней транзакции (при откате не вызывается).
+
+        Для уведомлений и сброса кэшей: они не должны видеть незафиксированные данные.
+        Вне транзакции вызывается сразу.
+        """
+        if self._depth:
+            self._after_commit.append(callback)
+        else:
+            callback()
+
+    def executemany(self, query, rows):
+        """Одна команда INSERT/UPDATE для всех строк rows (INSERT — одним многострочным запросом).
+
+        Число затронутых строк — в self.rowcount.
+        """
+        started = time.monotonic()
+        try:
+            cursor = self.connection.cursor()
+            cursor.executemany(query, rows)
+            self.rowcount = cursor.rowcount
+            self.lastrowid = cursor.lastrowid
+            cursor.close()
+            if not self._depth:
+                self.connection.commit()
+            metrics.record_query(query, time.monotonic() - started, params=rows)
+            return True
+        except Error as e:
+            metrics.record_query(query, time.monotonic() - started, failed=True, params=rows)
+            logger.error(f"Ошибка запроса: {e}\n{' '.join(query.split())[:500]}")
+            if self._depth:
+                raise
+            return False
 
     def execute(self, query, params=None, fetch_one=False):
+        """SELECT — строки (fetch_one — первая строка), иначе True; False — ошибка MySQL.
+
+        После команды изменения self.lastrowid и self.rowcount содержат id
+        вставленной строки и число затронутых строк.
+        """
+        started = time.monotonic()
         try:
             cursor = self.connection.cursor()
             cursor.execute(query, params or ())
@@ -43,10 +368,17 @@ class Database:
                 else:
                     result = cursor.fetchall()
             else:
-                self.connection.commit()
+                self.rowcount = cursor.rowcount
+                self.lastrowid = cursor.lastrowid
+                if not self._depth:
+                    self.connection.commit()
                 result = True
             cursor.close()
+            metrics.record_query(query, time.monotonic() - started, params=params)
             return result
         except Error as e:
-            print(f"Ошибка запроса: {e}")
+            metrics.record_query(query, time.monotonic() - started, failed=True, params=params)
+            logger.error(f"Ошибка запроса: {e}\n{' '.join(query.split())[:500]}")
+            if self._depth:
+                raise
             return False
@@ -0,0 +1,138 @@
+import logging
+import queue
+import threading
+import time
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def chat_key(update):
+    """Ключ упорядочивания апдейта: id чата, иначе id пользователя, иначе update_id"""
+    for field in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = getattr(update, field, None)
+        if message is not None:
+            return message.chat.id
+    callback_query = getattr(update, 'callback_query', None)
+    if callback_query is not None:
+        if callback_query.message is not None:
+            return callback_query.message.chat.id
+        return callback_query.from_user.id
+    for field in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+                  'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request'):
+        event = getattr(update, field, None)
+        user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+        if user is not None:
+            return user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """Раздаёт апдейты пулу потоков, сохраняя порядок внутри одного чата.
+
+    Апдейты чата всегда попадают в очередь одного и того же потока, поэтому
+    цепочки register_next_step_handler выполняются последовательно, а медленный
+    обработчик задерживает только чаты своего потока. Очереди ограничены:
+    при заполнении submit() блокируется, и приём новых апдейтов притормаживает.
+    Бот должен быть создан с threaded=False — обработчики выполняются в потоках
+    диспетчера.
+    """
+
+    def __init__(self, bot, workers, queue_size):
+        self.bot = bot
+        self.workers = workers
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self._stats = [
+            {'processed': 0, 'errors': 0, 'max_depth': 0, 'busy_time': 0.0}
+            for _ in range(workers)
+        ]
+        self._backpressure = {'waits': 0, 'wait_time_total': 0.0}
+        self._stop_polling = threading.Event()
+
+    def start(self):
+        for idx in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(idx,), name=f"dispatcher-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop_polling.set()
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, update):
+        idx = hash(chat_key(update)) % self.workers
+        q = self._queues[idx]
+        try:
+            q.put_nowait(update)
+        except queue.Full:
+            started = time.monotonic()
+            q.put(update)
+            with self._stats_lock:
+                self._backpressure['waits'] += 1
+                self._backpressure['wait_time_total'] += time.monotonic() - started
+        depth = q.qsize()
+        with self._stats_lock:
+            if depth > self._stats[idx]['max_depth']:
+                self._stats[idx]['max_depth'] = depth
+
+    def stats(self):
+        with self._stats_lock:
+            workers = []
+            for idx, q in enumerate(self._queues):
+                worker = dict(self._stats[idx])
+                worker['depth'] = q.qsize()
+                workers.append(worker)
+            return {'workers': workers, 'backpressure': dict(self._backpressure)}
+
+    def poll(self, interval=0, timeout=20, long_polling_timeout=20):
+        """Long polling: забирает апдейты у Telegram и раздаёт их потокам"""
+        offset = None
+        error_interval = 0.25
+        while not self._stop_polling.wait(interval):
+            try:
+                updates = self.bot.get_updates(
+                    offset=offset, timeout=timeout, long_polling_timeout=long_polling_timeout
+                )
+                error_interval = 0.25
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка получения апдейтов: {e}")
+                time.sleep(error_interval)
+                error_interval = min(error_interval * 2, 30)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                self.submit(update)
+
+    def _work(self, idx):
+        q = self._queues[idx]
+        while True:
+            update = q.get()
+            if update is _STOP:
+                break
+            started = time.monotonic()
+            failed = False
+            metrics.begin_update(update)
+            try:
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                failed = True
+                logger.exception(f"Ошибка обработки апдейта {update.update_id}: {e}")
+            finally:
+                metrics.end_update(failed)
+            with self._stats_lock:
+                stats = self._stats[idx]
+                stats['processed'] += 1
+                stats['errors'] += failed
+                stats['busy_time'] += time.monotonic() - started
@@ -0,0 +1,129 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+
+_CYR_TO_LAT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+}
+# Разные способы писать одни и те же звуки латиницей сводятся к одному
+_LATIN_FOLDS = (
+    ('shch', 'sch'), ('kh', 'h'), ('ts', 'c'), ('j', 'y'), ('w', 'v'),
+    ('yo', 'e'), ('ye', 'e'), ('ia', 'ya'), ('iu', 'yu'),
+)
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Сколько кандидатов из n-граммного индекса проверяется расстоянием Левенштейна
+_CANDIDATES = 20
+
+
+def search_key(text):
+    """Ключ сравнения: латиница, нижний регистр, слова через один пробел.
+
+    «Щёлковская», «shchelkovskaya» и «Schelkovskaja» дают один ключ.
+    """
+    text = ''.join(_CYR_TO_LAT.get(char, char) for char in text.casefold())
+    text = _NON_ALNUM.sub(' ', text).strip()
+    for source, target in _LATIN_FOLDS:
+        text = text.replace(source, target)
+    return text
+
+
+def levenshtein(a, b, max_distance):
+    """Расстояние Левенштейна или None, если оно больше max_distance.
+
+    Считается только полоса шириной 2 * max_distance + 1 вокруг диагонали.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    beyond = max_distance + 1
+    previous = [j if j <= max_distance else beyond for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [beyond] * (len(b) + 1)
+        current[0] = i if i <= max_distance else beyond
+        best = current[0]
+        for j in range(low, high + 1):
+            value = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != b[j - 1])
+            )
+            current[j] = value
+            if value < best:
+                best = value
+        if best > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameMatcher:
+    """Нечёткий поиск по справочнику названий (города, станции метро).
+
+    Совпадения ранжируются так: точное, по началу названия, с опечатками
+    (расстояние Левенштейна до трети длины запроса). Кандидатов для опечаток
+    даёт индекс триграмм, начало названия ищется двоичным поиском по
+    отсортированным ключам. Ввод латиницей сравнивается с транслитерацией.
+    """
+
+    def __init__(self, items):
+        # items: (id, name)
+        self._entries = []
+        self._trigrams = {}
+        for idx, (item_id, name) in enumerate(items):
+            key = search_key(name)
+            self._entries.append((key, item_id, name))
+            for gram in _trigrams(key):
+                self._trigrams.setdefault(gram, []).append(idx)
+        self._sorted = sorted((key, idx) for idx, (key, _, _) in enumerate(self._entries))
+        self._keys = [key for key, _ in self._sorted]
+
+    def suggest(self, query, limit=5):
+        """Список (id, name), лучшие совпадения первыми"""
+        key = search_key(query)
+        if not key:
+            return []
+
+        ranks = {}
+        pos = bisect_left(self._keys, key)
+        while pos < len(self._keys) and self._keys[pos].startswith(key) and len(ranks) < limit:
+            found = self._keys[pos]
+            ranks[self._sorted[pos][1]] = (0 if found == key else 1, len(found) - len(key))
+            pos += 1
+        # Совпадения по началу названия ранжируются выше опечаток
+        if len(ranks) >= limit:
+            return self._ranked(ranks, limit)
+
+        counts = Counter()
+        for gram in _trigrams(key):
+            counts.update(self._trigrams.get(gram, ()))
+        max_distance = max(1, len(key) // 3)
+        for idx, _ in counts.most_common(_CANDIDATES):
+            if idx in ranks:
+                continue
+            entry_key = self._entries[idx][0]
+            distance = levenshtein(key, entry_key, max_distance)
+            if distance is not None:
+                ranks[idx] = (2, distance)
+                continue
+            # Опечатка в начале длинного названия: «моск» → «москворецкая»
+            distance = levenshtein(key, entry_key[:len(key)], max_distance)
+            if distance is not None:
+                ranks[idx] = (3, distance)
+
+        return self._ranked(ranks, limit)
+
+    def _ranked(self, ranks, limit):
+        ordered = sorted(ranks, key=lambda idx: (ranks[idx], self._entries[idx][2]))
+        return [(self._entries[idx][1], self._entries[idx][2]) for idx in ordered[:limit]]
@@ -0,0 +1,354 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import apihelper
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # значения меток -> [счётчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[idx] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((label_values, list(series)) for label_values, series in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Значение читается при каждой выгрузке: read() -> число или {значения меток: число}"""
+
+    def __init__(self, name, help, read, labels=()):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labels = tuple(labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.read()
+        except Exception as e:
+            logger.error(f"Метрика {self.name} не прочитана: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+update_duration = registry.register(Histogram(
+    'bot_update_duration_seconds', 'Время обработки апдейта', ('handler',)))
+update_db_time = registry.register(Histogram(
+    'bot_update_db_seconds', 'Время в запросах к MySQL за апдейт', ('handler',)))
+update_db_queries = registry.register(Histogram(
+    'bot_update_db_queries', 'Вызовов Database.execute за апдейт', ('handler',), COUNT_BUCKETS))
+update_connections = registry.register(Histogram(
+    'bot_update_db_connections_opened', 'Новых соединений с MySQL за апдейт', ('handler',), COUNT_BUCKETS))
+update_tg_time = registry.register(Histogram(
+    'bot_update_telegram_seconds', 'Время в запросах к Telegram API за апдейт', ('handler',)))
+update_errors = registry.register(Counter(
+    'bot_update_errors_total', 'Апдейты, обработка которых завершилась исключением', ('handler',)))
+slow_updates = registry.register(Counter(
+    'bot_slow_updates_total', 'Апдейты дольше SLOW_UPDATE_THRESHOLD', ('handler',)))
+query_duration = registry.register(Histogram(
+    'bot_db_query_seconds', 'Время одного запроса Database.execute', ('statement',)))
+query_errors = registry.register(Counter(
+    'bot_db_errors_total', 'Ошибки MySQL в Database.execute и при подключении', ('stage',)))
+api_duration = registry.register(Histogram(
+    'bot_telegram_request_seconds', 'Время запроса к Telegram API', ('method',)))
+
+
+class UpdateTrace:
+    """Замеры одного апдейта; живёт в потоке, который его обрабатывает"""
+
+    def __init__(self, update_id, handler):
+        self.update_id = update_id
+        self.handler = handler
+        self.started = time.monotonic()
+        self.db_time = 0.0
+        self.queries = []       # (текст запроса, секунды)
+        self.connections = 0
+        self.tg_time = 0.0
+        self.tg_calls = 0
+        self.duration = None
+
+
+_local = threading.local()
+_slow_threshold = None
+_slow_max_queries = 20
+
+
+def configure(slow_threshold, slow_max_queries=20):
+    """slow_threshold — сек., после которых апдейт попадает в журнал медленных (None — не писать)"""
+    global _slow_threshold, _slow_max_queries
+    _slow_threshold = slow_threshold
+    _slow_max_queries = slow_max_queries
+
+
+def handler_name(func):
+    return getattr(func, '__qualname__', repr(func)).replace('.<locals>', '')
+
+
+def update_kind(update):
+    """Метка апдейта до выбора обработчика: команда или тип апдейта"""
+    message = update.message
+    if message is not None:
+        # Текст команды в метку не попадает: число значений меток должно быть конечным
+        return 'command' if (message.text or '').startswith('/') else 'message'
+    for field in ('callback_query', 'edited_message', 'inline_query', 'my_chat_member'):
+        if getattr(update, field, None) is not None:
+            return field
+    return 'other'
+
+
+def begin_update(update):
+    _local.trace = UpdateTrace(update.update_id, update_kind(update))
+    return _local.trace
+
+
+def set_handler(name):
+    """Уточняет метку текущего апдейта (вызывается роутером и хранилищем шагов)"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.handler = name
+
+
+def end_update(failed=False):
+    """Закрывает замер апдейта и возвращает его UpdateTrace (с полем duration)"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return None
+    _local.trace = None
+    duration = trace.duration = time.monotonic() - trace.started
+    handler = trace.handler
+    update_duration.observe(duration, handler)
+    update_db_time.observe(trace.db_time, handler)
+    update_db_queries.observe(len(trace.queries), handler)
+    update_connections.observe(trace.connections, handler)
+    update_tg_time.observe(trace.tg_time, handler)
+    if failed:
+        update_errors.inc(handler)
+    if _slow_threshold is not None and duration >= _slow_threshold:
+        slow_updates.inc(handler)
+        _log_slow(trace, duration)
+    return trace
+
+
+def _log_slow(trace, duration):
+    lines = [
+        f"Медленный апдейт {trace.update_id} ({trace.handler}): {duration:.3f} с; "
+        f"MySQL {trace.db_time:.3f} с, запросов {len(trace.queries)}, новых соединений {trace.connections}; "
+        f"Telegram {trace.tg_time:.3f} с, запросов {trace.tg_calls}"
+    ]
+    for query, elapsed in trace.queries[:_slow_max_queries]:
+        lines.append(f"    {elapsed * 1000:8.1f} мс  {query}")
+    if len(trace.queries) > _slow_max_queries:
+        lines.append(f"    ... ещё {len(trace.queries) - _slow_max_queries}")
+    logger.warning('\n'.join(lines))
+
+
+def _statement(query):
+    query = ' '.join(query.split())
+    return query.split(' ', 1)[0].lower() if query else '', query[:160]
+
+
+@contextmanager
+def capture_queries():
+    """Собирает запросы текущего потока: список (запрос, параметры, секунды).
+
+    Нужен инструментам вроде scripts/scale_benchmark.py, которым важны сами
+    запросы с параметрами (например, для EXPLAIN); в замеры апдейтов
+    параметры не попадают.
+    """
+    captured = []
+    previous = getattr(_local, 'capture', None)
+    _local.capture = captured
+    try:
+        yield captured
+    finally:
+        _local.capture = previous
+
+
+def record_query(query, elapsed, failed=False, params=None):
+    """Вызывается из Database.execute"""
+    statement, text = _statement(query)
+    query_duration.observe(elapsed, statement)
+    if failed:
+        query_errors.inc('query')
+    captured = getattr(_local, 'capture', None)
+    if captured is not None:
+        captured.append((query, params, elapsed))
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.db_time += elapsed
+        trace.queries.append((text, elapsed))
+
+
+def record_connection():
+    """Вызывается пулом при открытии нового соединения"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.connections += 1
+
+
+def record_api(method, elapsed):
+    api_duration.observe(elapsed, method)
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.tg_time += elapsed
+        trace.tg_calls += 1
+
+
+def instrument_api():
+    """Замеряет каждый HTTP-запрос telebot к Telegram через apihelper.CUSTOM_REQUEST_SENDER.
+
+    Уже установленный отправитель (например, тестовый) сохраняется и вызывается внутри.
+    """
+    sender = apihelper.CUSTOM_REQUEST_SENDER
+    if getattr(sender, 'instrumented', False):
+        return
+
+    def timed_sender(method, url, **kwargs):
+        started = time.monotonic()
+        try:
+            if sender is not None:
+                return sender(method, url, **kwargs)
+            return apihelper._get_req_session().request(method, url, **kwargs)
+        finally:
+            record_api(url.rsplit('/', 1)[-1], time.monotonic() - started)
+
+    timed_sender.instrumented = True
+    apihelper.CUSTOM_REQUEST_SENDER = timed_sender
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics для Prometheus в фоновом потоке"""
+
+    def __init__(self, host, port):
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+        thread.start()
+        logger.info(f"Метрики доступны на порту {self.port}: /metrics")
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
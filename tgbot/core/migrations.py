@@ -0,0 +1,287 @@
+"""Версионные миграции схемы MySQL и проверка индексов при запуске.
+
+Миграции — файлы sql/migrations/NNNN_описание.sql, применяются по возрастанию
+номера; применённые записываются в таблицу schema_migrations вместе с
+контрольной суммой файла. Команды в файле разделяются ';' в конце строки.
+"""
+import hashlib
+import logging
+import os
+import re
+
+from mysql.connector import Error
+
+from config.settings import Settings
+from core.database import Database
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(Settings.BASE_DIR, 'sql', 'migrations')
+_FILE_NAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Изменение уже есть в базе (таблицы создавались вручную): таблица, столбец
+# или индекс уже существуют, удаляемого индекса нет. Такая команда пропускается
+ALREADY_APPLIED_ERRORS = {1050, 1060, 1061, 1091}
+
+# Не даёт двум процессам бота применять миграции одновременно
+LOCK_NAME = 'schema_migrations'
+LOCK_TIMEOUT = 60
+
+
+class IndexSpec:
+    """Индекс, без которого запросы DatabaseManager читают таблицу целиком.
+
+    Подходит любой индекс, начинающийся с columns (имя не важно);
+    для unique — уникальный индекс ровно по columns.
+    """
+
+    def __init__(self, table, columns, unique=False):
+        self.table = table
+        self.columns = tuple(columns)
+        self.unique = unique
+
+    def satisfied_by(self, columns, unique):
+        if self.unique:
+            return unique and tuple(columns) == self.columns
+        return tuple(columns[:len(self.columns)]) == self.columns
+
+    def __str__(self):
+        kind = 'UNIQUE ' if self.unique else ''
+        return f"{kind}{self.table} ({', '.join(self.columns)})"
+
+
+# Миграция, после которой barbers.rating NOT NULL (DatabaseManager.set_rating_not_null)
+RATING_NOT_NULL_VERSION = 3
+
+# Должно совпадать с sql/migrations/0003_query_indexes.sql
+EXPECTED_INDEXES = (
+    IndexSpec('users', ('telegram_id',), unique=True),
+    IndexSpec('barbers', ('user_id',)),
+    IndexSpec('barbers', ('status', 'city_id', 'rating')),
+    IndexSpec('barbers', ('status', 'rating')),
+    IndexSpec('barbers', ('status', 'city_id', 'created_at')),
+    IndexSpec('barbers', ('status', 'created_at')),
+    IndexSpec('user_roles', ('user_id', 'role', 'is_active')),
+    IndexSpec('user_city_selections', ('user_id', 'selected_at', 'city_id')),
+    IndexSpec('barber_portfolio', ('barber_id', 'position')),
+    IndexSpec('barber_services', ('barber_id', 'category_id', 'price')),
+    IndexSpec('reviews', ('barber_id', 'client_id'), unique=True),
+    IndexSpec('favorites', ('client_id', 'barber_id'), unique=True),
+    IndexSpec('metro_stations', ('city_id', 'name')),
+    IndexSpec('haircut_guide_photos', ('haircut_id', 'is_primary')),
+)
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read()
+
+    @property
+    def checksum(self):
+        return hashlib.sha256(self.read().encode('utf-8')).hexdigest()
+
+    def statements(self):
+        """Команды файла без строк-комментариев '--'"""
+        statements = []
+        current = []
+        for line in self.read().splitlines():
+            stripped = line.strip()
+            if not stripped or stripped.startswith('--'):
+                continue
+            current.append(line)
+            if stripped.endswith(';'):
+                statements.append('\n'.join(current).strip().rstrip(';'))
+                current = []
+        if current:
+            statements.append('\n'.join(current).strip())
+        return statements
+
+    def __str__(self):
+        return f"{self.version:04d}_{self.name}"
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Файлы миграций по возрастанию номера"""
+    migrations = []
+    for file_name in os.listdir(directory):
+        match = _FILE_NAME.match(file_name)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, file_name)))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Повторяющиеся номера миграций в {directory}")
+    return migrations
+
+
+def _ensure_table(db):
+    return db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version)
+        ) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4
+        """
+    )
+
+
+def applied_versions(db):
+    """{версия: контрольная сумма} применённых миграций; None — таблицы нет или БД недоступна"""
+    rows = db.execute(
+        "SELECT version, checksum FROM schema_migrations ORDER BY version"
+    )
+    if rows is False:
+        return None
+    return dict(rows)
+
+
+def _run(db, migration):
+    cursor = db.connection.cursor()
+    try:
+        for statement in migration.statements():
+            try:
+                cursor.execute(statement)
+                if cursor.with_rows:
+                    cursor.fetchall()
+                db.connection.commit()
+            except Error as e:
+                if e.errno not in ALREADY_APPLIED_ERRORS:
+                    db.connection.rollback()
+                    logger.error(f"Миграция {migration} остановлена: {e}\n{statement}")
+                    return False
+                logger.warning(f"Миграция {migration}: уже есть в базе, пропущено ({e.msg})")
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+            (migration.version, migration.name, migration.checksum)
+        )
+        db.connection.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+def migrate(target=None):
+    """Применяет неприменённые миграции (до target включительно, None — все).
+
+    Возвращает True, если схема в актуальном состоянии. Команды DDL в MySQL
+    не откатываются: при ошибке миграция не записывается как применённая,
+    а повторный запуск пропустит уже сделанные изменения (ALREADY_APPLIED_ERRORS).
+    """
+    with Database() as db:
+        if not db.connect() or _ensure_table(db) is False:
+            logger.error("Миграции не применены: нет доступа к БД")
+            return False
+        locked = db.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT), fetch_one=True)
+        if not locked or locked[0] != 1:
+            logger.error("Миграции не применены: их уже применяет другой процесс")
+            return False
+        try:
+            applied = applied_versions(db)
+            if applied is None:
+                return False
+            for migration in discover():
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+                logger.info(f"Применяется миграция {migration}")
+                if not _run(db, migration):
+                    return False
+            return True
+        finally:
+            db.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,), fetch_one=True)
+
+
+def status():
+    """[(миграция, состояние)]: 'applied', 'pending' или 'changed' (файл изменён после применения)"""
+    with Database() as db:
+        if not db.connect() or _ensure_table(db) is False:
+            return None
+        applied = applied_versions(db)
+    if applied is None:
+        return None
+    result = []
+    for migration in discover():
+        checksum = applied.get(migration.version)
+        if checksum is None:
+            state = 'pending'
+        elif checksum != migration.checksum:
+            state = 'changed'
+        else:
+            state = 'applied'
+        result.append((migration, state))
+    return result
+
+
+def is_applied(version):
+    """True, если миграция version применена; None — БД недоступна"""
+    with Database() as db:
+        if not db.connect():
+            return None
+        applied = applied_versions(db)
+    return None if applied is None else version in applied
+
+
+def missing_indexes():
+    """Индексы из EXPECTED_INDEXES, которых нет в базе; None — БД недоступна"""
+    with Database() as db:
+        if not db.connect():
+            return None
+        rows = db.execute(
+            """
+            SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+            ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+            """
+        )
+    if rows is False:
+        return None
+
+    indexes = {}   # (таблица, индекс) -> [уникальный, [столбцы]]
+    for table, index_name, non_unique, column in rows:
+        entry = indexes.setdefault((table.lower(), index_name), [not non_unique, []])
+        entry[1].append(column.lower())
+
+    by_table = {}
+    for (table, _), (unique, columns) in indexes.items():
+        by_table.setdefault(table, []).append((tuple(columns), unique))
+
+    return [
+        spec for spec in EXPECTED_INDEXES
+        if not any(spec.satisfied_by(columns, unique) for columns, unique in by_table.get(spec.table, ()))
+    ]
+
+
+def check_schema():
+    """Проверка при запуске: неприменённые или изменённые миграции и недостающие индексы.
+
+    Пишет найденное в лог и возвращает список проблем (None — БД недоступна).
+    """
+    states = status()
+    missing = missing_indexes()
+    if states is None or missing is None:
+        logger.error("Схема БД не проверена: нет доступа к БД")
+        return None
+
+    problems = []
+    for migration, state in states:
+        if state == 'pending':
+            problems.append(f"миграция {migration} не применена (python scripts/migrate.py)")
+        elif state == 'changed':
+            problems.append(f"миграция {migration} изменена после применения")
+    for spec in missing:
+        problems.append(f"нет индекса {spec}: запросы к {spec.table} читают таблицу целиком")
+
+    for problem in problems:
+        logger.error(f"Схема БД: {problem}")
+    if not problems:
+        logger.info("Схема БД актуальна, индексы на месте")
+    return problems
@@ -0,0 +1,61 @@
+import string
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Курсор пагинации по ключу упаковывается в callback_data (лимит Telegram — 64 байта),
+# поэтому значения кодируются компактно: i — int в base36, f — число, d — дата в мкс (base36).
+# Разделители '_' и ':' не используются, т.к. по ним разбираются callback_data.
+CALLBACK_DATA_LIMIT = 64
+
+_DIGITS = string.digits + string.ascii_lowercase
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_base36(n):
+    if n == 0:
+        return '0'
+    sign = '-' if n < 0 else ''
+    n = abs(n)
+    out = []
+    while n:
+        n, rem = divmod(n, 36)
+        out.append(_DIGITS[rem])
+    return sign + ''.join(reversed(out))
+
+
+def _encode_value(value):
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"Неподдерживаемое значение курсора: {value!r}")
+    if isinstance(value, int):
+        return 'i' + _to_base36(value)
+    if isinstance(value, (float, Decimal)):
+        text = repr(float(value)) if isinstance(value, float) else str(value)
+        return 'f' + text
+    if isinstance(value, datetime):
+        delta = value.replace(tzinfo=None) - _EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+        return 'd' + _to_base36(micros)
+    raise ValueError(f"Неподдерживаемое значение курсора: {value!r}")
+
+
+def _decode_value(token):
+    kind, body = token[0], token[1:]
+    if kind == 'i':
+        return int(body, 36)
+    if kind == 'f':
+        return float(body)
+    if kind == 'd':
+        return _EPOCH + timedelta(microseconds=int(body, 36))
+    raise ValueError(f"Неизвестный тип значения курсора: {token!r}")
+
+
+def encode_cursor(values):
+    """Кодирует ключ последней/первой строки страницы в строку для callback_data"""
+    return '~'.join(_encode_value(value) for value in values)
+
+
+def decode_cursor(text):
+    """Обратное к encode_cursor; пустая строка — начало списка (None)"""
+    if not text:
+        return None
+    return tuple(_decode_value(token) for token in text.split('~'))
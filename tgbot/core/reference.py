@@ -0,0 +1,108 @@
+import threading
+from types import MappingProxyType
+
+from core.matcher import NameMatcher
+
+
+def normalize_name(name):
+    """Ключ поиска по названию: без лишних пробелов, без регистра, ё = е"""
+    return ' '.join(name.split()).casefold().replace('ё', 'е')
+
+
+class ReferenceData:
+    """Неизменяемый снимок справочников: города, станции метро, категории стрижек.
+
+    Строится из строк DatabaseManager.get_reference_rows() и целиком
+    заменяется при обновлении, поэтому читать его можно без блокировок.
+    """
+
+    def __init__(self, cities=(), metro_stations=(), categories=()):
+        # cities: (id, name, is_active); metro_stations: (id, city_id, name, is_active);
+        # categories: (id, type)
+        city_names = {}
+        city_ids = {}
+        active_cities = []
+        for city_id, name, is_active in cities:
+            city_names[city_id] = name
+            city_ids.setdefault(normalize_name(name), city_id)
+            if is_active:
+                active_cities.append((city_id, name))
+
+        metro_ids = {}
+        metro_names = {}
+        metro_by_city = {}
+        for metro_id, city_id, name, is_active in metro_stations:
+            if not is_active:
+                continue
+            metro_ids.setdefault((city_id, normalize_name(name)), metro_id)
+            metro_names[metro_id] = name
+            metro_by_city.setdefault(city_id, []).append((metro_id, name))
+
+        self.city_names = MappingProxyType(city_names)
+        self.active_cities = tuple(name for _, name in active_cities)
+        self.metro_names = MappingProxyType(metro_names)
+        self.metro_by_city = MappingProxyType({
+            city_id: tuple(stations) for city_id, stations in metro_by_city.items()
+        })
+        self._city_matcher = NameMatcher(active_cities)
+        self._metro_matchers = MappingProxyType({
+            city_id: NameMatcher(stations) for city_id, stations in metro_by_city.items()
+        })
+        self.category_ids = MappingProxyType({category_type: category_id for category_id, category_type in categories})
+        self._city_ids = MappingProxyType(city_ids)
+        self._metro_ids = MappingProxyType(metro_ids)
+
+    def city_id(self, name):
+        return self._city_ids.get(normalize_name(name))
+
+    def city_name(self, city_id):
+        return self.city_names.get(city_id)
+
+    def has_metro(self, city_id):
+        return city_id in self.metro_by_city
+
+    def metro_id(self, city_id, name):
+        return self._metro_ids.get((city_id, normalize_name(name)))
+
+    def category_id(self, category_type):
+        return self.category_ids.get(category_type)
+
+    def suggest_cities(self, query, limit=5):
+        """Похожие активные города: список (id, name)"""
+        return self._city_matcher.suggest(query, limit)
+
+    def suggest_metro(self, city_id, query, limit=5):
+        """Похожие станции метро города: список (id, name)"""
+        matcher = self._metro_matchers.get(city_id)
+        return matcher.suggest(query, limit) if matcher else []
+
+
+_snapshot = None
+_load_lock = threading.Lock()
+
+
+def get_snapshot():
+    return _snapshot
+
+
+def set_snapshot(snapshot):
+    global _snapshot
+    _snapshot = snapshot
+
+
+def get_or_load(loader):
+    """Текущий снимок; при первом обращении загружает его через loader().
+
+    loader возвращает ReferenceData или None (БД недоступна) — тогда отдаётся
+    пустой снимок, и загрузка повторится при следующем обращении.
+    """
+    snapshot = _snapshot
+    if snapshot is not None:
+        return snapshot
+    with _load_lock:
+        if _snapshot is None:
+            snapshot = loader()
+            if snapshot is None:
+                return ReferenceData()
+            set_snapshot(snapshot)
+    return _snapshot
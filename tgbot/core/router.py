@@ -0,0 +1,171 @@
+import logging
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_HANDLER = object()   # ключ обработчика в узле префиксного дерева
+
+
+class Router:
+    """Маршрутизация текстовых сообщений и callback-запросов без перебора предикатов.
+
+    Точные тексты и точные callback_data ищутся в словарях, префиксы
+    callback_data — в префиксном дереве (побеждает самый длинный префикс).
+    Предикаты для текста (text_matching) проверяются по порядку, только если
+    точного совпадения нет. Обработчик callback получает (call, args), где
+    args — части callback_data после префикса, разделённые '_'.
+
+    Все маршруты регистрируются до install(): в бот добавляется по одному
+    обработчику на сообщения и callback-запросы, конфликты логируются.
+    """
+
+    def __init__(self):
+        self._texts = {}
+        self._text_predicates = []
+        self._callbacks = {}
+        self._callback_trie = {}
+        self._problems = []
+
+    # Регистрация
+
+    def text(self, *texts):
+        def decorator(handler):
+            for text in texts:
+                if text in self._texts:
+                    self._problems.append(
+                        f"Текст {text!r}: {_name(handler)} недостижим, уже обрабатывается {_name(self._texts[text])}"
+                    )
+                    continue
+                self._texts[text] = handler
+            return handler
+        return decorator
+
+    def text_matching(self, predicate):
+        def decorator(handler):
+            self._text_predicates.append((predicate, handler))
+            return handler
+        return decorator
+
+    def callback(self, data):
+        def decorator(handler):
+            if data in self._callbacks:
+                self._problems.append(
+                    f"Callback {data!r}: {_name(handler)} недостижим, уже обрабатывается {_name(self._callbacks[data])}"
+                )
+            else:
+                self._callbacks[data] = handler
+            return handler
+        return decorator
+
+    def callback_prefix(self, prefix):
+        def decorator(handler):
+            node = self._callback_trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            if _HANDLER in node:
+                self._problems.append(
+                    f"Префикс {prefix!r}: {_name(handler)} недостижим, уже обрабатывается {_name(node[_HANDLER])}"
+                )
+            else:
+                node[_HANDLER] = handler
+            return handler
+        return decorator
+
+    # Поиск
+
+    def resolve_message(self, message):
+        text = message.text
+        if text is None:
+            return None
+        handler = self._texts.get(text)
+        if handler is not None:
+            return handler
+        for predicate, handler in self._text_predicates:
+            if predicate(text):
+                return handler
+        return None
+
+    def resolve_callback(self, data):
+        """Возвращает (handler, args) или None"""
+        if data is None:
+            return None
+        handler = self._callbacks.get(data)
+        if handler is not None:
+            return handler, []
+
+        found, found_at = None, 0
+        node = self._callback_trie
+        for idx, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if _HANDLER in node:
+                found, found_at = node[_HANDLER], idx + 1
+        if found is None:
+            return None
+        rest = data[found_at:]
+        return found, rest.split('_') if rest else []
+
+    # Подключение к боту
+
+    def install(self, bot):
+        # Предикаты telebot запоминают найденный маршрут на объекте апдейта,
+        # чтобы сам обработчик не искал его повторно
+        def match_message(message):
+            message.route = self.resolve_message(message)
+            return message.route is not None
+
+        def match_callback(call):
+            call.route = self.resolve_callback(call.data)
+            return call.route is not None
+
+        @bot.message_handler(func=match_message)
+        def route_message(message):
+            metrics.set_handler(metrics.handler_name(message.route))
+            message.route(message)
+
+        @bot.callback_query_handler(func=match_callback)
+        def route_callback(call):
+            handler, args = call.route
+            metrics.set_handler(metrics.handler_name(handler))
+            handler(call, args)
+
+        self.report()
+
+    def report(self):
+        """Логирует недостижимые и перекрытые маршруты, возвращает список проблем"""
+        problems = list(self._problems)
+        for text, handler in self._texts.items():
+            for predicate, predicate_handler in self._text_predicates:
+                if predicate_handler is not handler and predicate(text):
+                    problems.append(
+                        f"Текст {text!r} подходит и под предикат {_name(predicate_handler)}, "
+                        f"обрабатывается точным маршрутом {_name(handler)}"
+                    )
+        for data in self._callbacks:
+            resolved = self._resolve_prefix_only(data)
+            if resolved is not None:
+                problems.append(
+                    f"Callback {data!r} перекрывает префикс {_name(resolved)} — обрабатывается {_name(self._callbacks[data])}"
+                )
+        for problem in problems:
+            logger.warning(problem)
+        return problems
+
+    def _resolve_prefix_only(self, data):
+        found = None
+        node = self._callback_trie
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(_HANDLER, found)
+        return found
+
+
+def _name(handler):
+    return getattr(handler, '__qualname__', repr(handler))
+
+
+router = Router()
@@ -0,0 +1,74 @@
+import logging
+from apscheduler.schedulers.background import BackgroundScheduler
+from config.settings import Settings
+from managers.database import DatabaseManager
+from managers.search import barber_index
+from managers.guide import GuideManager
+from core.steps import get_step_backend
+
+logger = logging.getLogger(__name__)
+scheduler = BackgroundScheduler(daemon=True)
+
+
+def reconcile_barber_aggregates():
+    if DatabaseManager.reconcile_barber_aggregates():
+        logger.info("Агрегаты анкет барберов сверены")
+    else:
+        logger.error("Не удалось сверить агрегаты анкет барберов")
+
+
+def rebuild_search_index():
+    barber_index.load()
+
+
+def refresh_reference_data():
+    DatabaseManager.reload_reference_data()
+
+
+def check_guide_content():
+    GuideManager.reload_content()
+
+
+def purge_expired_steps():
+    removed = get_step_backend().purge_expired()
+    if removed:
+        logger.info(f"Удалено брошенных шагов диалогов: {removed}")
+
+
+def start_scheduler():
+    scheduler.add_job(
+        reconcile_barber_aggregates,
+        'interval',
+        seconds=Settings.AGGREGATES_RECONCILE_INTERVAL,
+        id='reconcile_barber_aggregates',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        rebuild_search_index,
+        'interval',
+        seconds=Settings.SEARCH_INDEX_REBUILD_INTERVAL,
+        id='rebuild_search_index',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        refresh_reference_data,
+        'interval',
+        seconds=Settings.REFERENCE_REFRESH_INTERVAL,
+        id='refresh_reference_data',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        check_guide_content,
+        'interval',
+        seconds=Settings.GUIDE_CHECK_INTERVAL,
+        id='check_guide_content',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        purge_expired_steps,
+        'interval',
+        seconds=Settings.NEXT_STEP_PURGE_INTERVAL,
+        id='purge_expired_steps',
+        replace_existing=True
+    )
+    scheduler.start()
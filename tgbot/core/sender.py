@@ -0,0 +1,252 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import telebot
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+NOTIFICATION = 1
+
+_STOP = (float('inf'), 0, None)
+
+# Потоки Outbox помечаются, чтобы их запросы уступали интерактивным ответам
+_thread_state = threading.local()
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Лимиты Telegram: общий (≈30 сообщений/с) и на чат (≈1 сообщение/с с небольшим запасом).
+
+    Интерактивные запросы имеют приоритет: пока хотя бы один из них ждёт,
+    уведомления токены не получают. После 429 все отправки ждут retry_after.
+    """
+
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, global_rate, chat_rate, chat_burst):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._paused_until = 0.0
+        self._interactive_waiting = 0
+        self._lock = threading.Lock()
+        self._stats = {'acquired': 0, 'throttled': 0, 'wait_time_total': 0.0, 'retry_after': 0}
+
+    def acquire(self, chat_id, interactive=True):
+        started = time.monotonic()
+        waited = False
+        with self._lock:
+            if interactive:
+                self._interactive_waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    wait = self._paused_until - now
+                    if wait <= 0 and not interactive and self._interactive_waiting:
+                        wait = 0.01
+                    if wait <= 0:
+                        chat = self._chat_bucket(chat_id, now)
+                        self._global.refill(now)
+                        wait = max(self._global.wait_time(), chat.wait_time() if chat else 0.0)
+                        if wait <= 0:
+                            self._global.tokens -= 1
+                            if chat:
+                                chat.tokens -= 1
+                            self._stats['acquired'] += 1
+                            if waited:
+                                self._stats['throttled'] += 1
+                                self._stats['wait_time_total'] += now - started
+                            return
+                waited = True
+                time.sleep(wait)
+        finally:
+            if interactive:
+                with self._lock:
+                    self._interactive_waiting -= 1
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._stats['retry_after'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _chat_bucket(self, chat_id, now):
+        # Вызывается под self._lock
+        if chat_id is None:
+            return None
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHAT_BUCKETS:
+                self._drop_full_buckets(now)
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        bucket.refill(now)
+        return bucket
+
+    def _drop_full_buckets(self, now):
+        for chat_id, bucket in list(self._chats.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._chats[chat_id]
+
+
+class RateLimitedTeleBot(telebot.TeleBot):
+    """TeleBot, который соблюдает RateLimiter и повторяет запросы после 429."""
+
+    MAX_RETRIES = 3
+
+    def __init__(self, token, limiter, outbox_workers=1, **kwargs):
+        super().__init__(token, **kwargs)
+        self.limiter = limiter
+        self.outbox = Outbox(self, outbox_workers)
+
+    def _limited(self, chat_id, method, *args, **kwargs):
+        """Вызов API после токена RateLimiter.
+
+        Интерактивные ответы намеренно отправляются синхронно в потоке
+        диспетчера: порядок альбома, текста и правок сохраняется, а обработчик
+        получает Message (message_id нужен для register_next_step_handler).
+        Если токенов чата нет, поток ждёт, поэтому TG_CHAT_BURST рассчитан на
+        обычный ответ целиком (альбом + сообщение с кнопками) с запасом на
+        повторное нажатие. Уведомления другим пользователям идут через Outbox.
+        """
+        interactive = not getattr(_thread_state, 'notification', False)
+        for attempt in range(self.MAX_RETRIES + 1):
+            self.limiter.acquire(chat_id, interactive)
+            try:
+                return method(*args, **kwargs)
+            except ApiTelegramException as e:
+                if e.error_code != 429 or attempt == self.MAX_RETRIES:
+                    raise
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                logger.warning(f"429 от Telegram, ждём {retry_after} с")
+                self.limiter.pause(retry_after)
+
+    def send_message(self, chat_id, *args, **kwargs):
+        return self._limited(chat_id, super().send_message, chat_id, *args, **kwargs)
+
+    def send_photo(self, chat_id, *args, **kwargs):
+        return self._limited(chat_id, super().send_photo, chat_id, *args, **kwargs)
+
+    def send_media_group(self, chat_id, *args, **kwargs):
+        return self._limited(chat_id, super().send_media_group, chat_id, *args, **kwargs)
+
+    def copy_message(self, chat_id, *args, **kwargs):
+        return self._limited(chat_id, super().copy_message, chat_id, *args, **kwargs)
+
+    def copy_messages(self, chat_id, *args, **kwargs):
+        return self._limited(chat_id, super().copy_messages, chat_id, *args, **kwargs)
+
+    def forward_message(self, chat_id, *args, **kwargs):
+        return self._limited(chat_id, super().forward_message, chat_id, *args, **kwargs)
+
+    def edit_message_text(self, *args, **kwargs):
+        chat_id = kwargs.get('chat_id', args[1] if len(args) > 1 else None)
+        return self._limited(chat_id, super().edit_message_text, *args, **kwargs)
+
+    def edit_message_reply_markup(self, *args, **kwargs):
+        chat_id = kwargs.get('chat_id', args[0] if args else None)
+        return self._limited(chat_id, super().edit_message_reply_markup, *args, **kwargs)
+
+
+class Outbox:
+    """Очередь исходящих сообщений: обработчик ставит отправку и сразу возвращается.
+
+    Сообщения одного чата обрабатывает один поток и уходят по порядку;
+    в очереди потока интерактивные ответы идут раньше уведомлений.
+    Методы возвращают concurrent.futures.Future с результатом вызова API.
+    """
+
+    def __init__(self, bot, workers):
+        self.bot = bot
+        self.workers = workers
+        self._queues = [queue.PriorityQueue() for _ in range(workers)]
+        self._threads = []
+        self._seq = itertools.count()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'sent': 0, 'failed': 0}
+
+    def send_message(self, chat_id, text, priority=NOTIFICATION, **kwargs):
+        return self.submit(chat_id, 'send_message', text, priority=priority, **kwargs)
+
+    def send_media_group(self, chat_id, media, priority=NOTIFICATION, **kwargs):
+        return self.submit(chat_id, 'send_media_group', media, priority=priority, **kwargs)
+
+    def submit(self, chat_id, method, *args, priority=NOTIFICATION, **kwargs):
+        self._ensure_started()
+        future = Future()
+        job = (method, chat_id, args, kwargs, future)
+        # seq сохраняет порядок сообщений с одинаковым приоритетом
+        self._queues[hash(chat_id) % self.workers].put((priority, next(self._seq), job))
+        with self._stats_lock:
+            self._stats['queued'] += 1
+        return future
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['depth'] = [q.qsize() for q in self._queues]
+        return stats
+
+    def stop(self):
+        """Отправляет оставшиеся сообщения и останавливает потоки"""
+        with self._start_lock:
+            for q in self._queues:
+                q.put(_STOP)
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for idx in range(self.workers):
+                thread = threading.Thread(target=self._work, args=(idx,), name=f"outbox-{idx}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self, idx):
+        q = self._queues[idx]
+        while True:
+            priority, _, job = q.get()
+            if job is None:
+                break
+            method, chat_id, args, kwargs, future = job
+            _thread_state.notification = priority != INTERACTIVE
+            try:
+                future.set_result(getattr(self.bot, method)(chat_id, *args, **kwargs))
+                outcome = 'sent'
+            except Exception as e:
+                logger.error(f"Не удалось отправить {method} в чат {chat_id}: {e}")
+                future.set_exception(e)
+                outcome = 'failed'
+            with self._stats_lock:
+                self._stats[outcome] += 1
@@ -0,0 +1,194 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from telebot import Handler
+from telebot.handler_backends import HandlerBackend
+
+from config.settings import Settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_steps = {}   # имя шага -> функция
+_names = {}   # функция -> имя шага
+
+# Экземпляр бота в аргументах шага сохраняется этой меткой
+_BOT_MARK = {'$': 'bot'}
+
+
+def next_step(name):
+    """Регистрирует функцию как шаг диалога, который переживает перезапуск бота.
+
+    Такую функцию можно передавать в bot.register_next_step_handler: в хранилище
+    попадут имя шага и аргументы (JSON-совместимые значения и сам бот).
+    """
+    def decorator(func):
+        _steps[name] = func
+        _names[func] = name
+        return func
+    return decorator
+
+
+def step_name(callback):
+    """Имя, под которым функция зарегистрирована через next_step, или None"""
+    return _names.get(callback)
+
+
+class PersistentStepBackend(HandlerBackend):
+    """Хранилище next-step обработчиков telebot в SQLite.
+
+    Для каждого чата хранится не больше max_per_chat последних шагов, шаг
+    старше ttl секунд считается брошенным и не выполняется. Обработчики без
+    имени (лямбды, незарегистрированные функции) и с несериализуемыми
+    аргументами остаются только в памяти процесса.
+    """
+
+    def __init__(self, path: str, ttl: float, max_per_chat: int):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_per_chat = max_per_chat
+        self.bot = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS next_steps ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "chat_id INTEGER NOT NULL, "
+            "step TEXT NOT NULL, "
+            "args TEXT NOT NULL, "
+            "expires_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS next_steps_chat ON next_steps (chat_id, id)")
+        # Чаты с сохранёнными шагами: без них get_handlers не ходит в SQLite
+        self._pending = {
+            row[0] for row in connection.execute(
+                "SELECT DISTINCT chat_id FROM next_steps WHERE expires_at > ?", (time.time(),)
+            )
+        }
+
+    def bind(self, bot):
+        """Бот, который подставляется в аргументы восстановленных шагов"""
+        self.bot = bot
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def register_handler(self, handler_group_id, handler):
+        record = self._serialize(handler)
+        if record is None:
+            with self._lock:
+                handlers = self.handlers.setdefault(handler_group_id, [])
+                handlers.append(handler)
+                del handlers[:-self.max_per_chat]
+            return
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO next_steps (chat_id, step, args, expires_at) VALUES (?, ?, ?, ?)",
+                (handler_group_id, record[0], record[1], time.time() + self.ttl)
+            )
+            connection.execute(
+                "DELETE FROM next_steps WHERE chat_id = ? AND id NOT IN ("
+                "SELECT id FROM next_steps WHERE chat_id = ? ORDER BY id DESC LIMIT ?)",
+                (handler_group_id, handler_group_id, self.max_per_chat)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._pending.add(handler_group_id)
+
+    def clear_handlers(self, handler_group_id):
+        with self._lock:
+            self.handlers.pop(handler_group_id, None)
+            pending = handler_group_id in self._pending
+            self._pending.discard(handler_group_id)
+        if pending:
+            self._connection().execute("DELETE FROM next_steps WHERE chat_id = ?", (handler_group_id,))
+
+    def get_handlers(self, handler_group_id):
+        with self._lock:
+            handlers = self.handlers.pop(handler_group_id, None) or []
+            pending = handler_group_id in self._pending
+            self._pending.discard(handler_group_id)
+        if pending:
+            handlers = self._pop_stored(handler_group_id) + handlers
+        if handlers:
+            callback = handlers[0].callback
+            metrics.set_handler(f"step:{_names.get(callback) or metrics.handler_name(callback)}")
+        return handlers or None
+
+    def purge_expired(self):
+        """Удаляет брошенные шаги, возвращает число удалённых"""
+        cursor = self._connection().execute("DELETE FROM next_steps WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def _pop_stored(self, chat_id):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                "SELECT step, args, expires_at FROM next_steps WHERE chat_id = ? ORDER BY id", (chat_id,)
+            ).fetchall()
+            connection.execute("DELETE FROM next_steps WHERE chat_id = ?", (chat_id,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        now = time.time()
+        handlers = []
+        for step, args, expires_at in rows:
+            callback = _steps.get(step)
+            if expires_at <= now or callback is None:
+                if callback is None:
+                    logger.warning(f"Неизвестный шаг {step!r} для чата {chat_id} пропущен")
+                continue
+            args = [self.bot if arg == _BOT_MARK else arg for arg in json.loads(args)]
+            handlers.append(Handler(callback, *args))
+        return handlers
+
+    def _serialize(self, handler):
+        """(имя шага, JSON аргументов) или None, если шаг нельзя сохранить"""
+        name = _names.get(handler.callback)
+        if name is None or handler.kwargs:
+            logger.debug(f"Шаг {handler.callback!r} хранится только в памяти")
+            return None
+        args = [_BOT_MARK if arg is self.bot else arg for arg in handler.args]
+        try:
+            return name, json.dumps(args, ensure_ascii=False)
+        except (TypeError, ValueError):
+            logger.warning(f"Аргументы шага {name!r} не сериализуются, шаг хранится только в памяти")
+            return None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_step_backend() -> PersistentStepBackend:
+    """Общее на процесс хранилище next-step обработчиков"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = PersistentStepBackend(
+                    Settings.NEXT_STEPS_PATH,
+                    ttl=Settings.NEXT_STEP_TTL,
+                    max_per_chat=Settings.NEXT_STEP_MAX_PER_CHAT
+                )
+    return _backend
@@ -1,78 +1,378 @@
+import atexit
+import copy
+import itertools
 import json
+import logging
 import os
-from typing import Dict, Optional, List
+import sqlite3
+import threading
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
 
-class BarberStorage:
-    def __init__(self, file_path: str = 'barber_profiles.json'):
-        self.file_path = file_path
-        self._init_storage()
+from config.settings import Settings
 
-    def _init_storage(self):
-        """Создает файл хранилища, если его нет."""
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
+logger = logging.getLogger(__name__)
 
-    def save_profile(self, user_id: int, answers: Dict[str, any]):
+
+class DraftBackend(ABC):
+    """Хранилище черновиков анкет: одна запись на пользователя."""
+
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def put(self, user_id: int, data: Dict):
+        ...
+
+    @abstractmethod
+    def delete(self, user_id: int):
+        ...
+
+    @abstractmethod
+    def update(self, user_id: int, func: Callable[[Dict], Dict]) -> Dict:
+        """Атомарно читает запись, применяет func и сохраняет результат"""
+
+    @abstractmethod
+    def is_empty(self) -> bool:
+        ...
+
+    def flush(self, user_id: Optional[int] = None):
+        """Дописывает отложенные изменения (для backend'ов без кэша — ничего)"""
+        pass
+
+
+class SqliteDraftBackend(DraftBackend):
+    """Черновики в SQLite (WAL): запись одного пользователя — одна строка."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS drafts ("
+            "user_id INTEGER PRIMARY KEY, "
+            "data TEXT NOT NULL)"
+        )
+
+    def _connection(self):
+        # sqlite3-соединение нельзя делить между потоками — у каждого своё
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT data FROM drafts WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, user_id: int, data: Dict):
+        self._connection().execute(
+            "INSERT INTO drafts (user_id, data) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+            (user_id, json.dumps(data, ensure_ascii=False))
+        )
+
+    def delete(self, user_id: int):
+        self._connection().execute("DELETE FROM drafts WHERE user_id = ?", (user_id,))
+
+    def update(self, user_id: int, func: Callable[[Dict], Dict]) -> Dict:
+        connection = self._connection()
+        # BEGIN IMMEDIATE сразу берёт блокировку записи — параллельный update подождёт
+        connection.execute("BEGIN IMMEDIATE")
         try:
-            # Читаем существующие данные
+            data = func(self.get(user_id) or {})
+            self.put(user_id, data)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return data
+
+    def is_empty(self) -> bool:
+        return self._connection().execute("SELECT 1 FROM drafts LIMIT 1").fetchone() is None
+
+
+class FileDraftBackend(DraftBackend):
+    """Черновики в каталоге: файл на пользователя, запись через атомарный rename."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"{int(user_id)}.json")
+
+    def _lock(self, user_id: int):
+        with self._locks_guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        try:
+            with open(self._path(user_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, user_id: int, data: Dict):
+        path = self._path(user_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def delete(self, user_id: int):
+        try:
+            os.remove(self._path(user_id))
+        except FileNotFoundError:
+            pass
+
+    def update(self, user_id: int, func: Callable[[Dict], Dict]) -> Dict:
+        with self._lock(user_id):
+            data = func(self.get(user_id) or {})
+            self.put(user_id, data)
+        return data
+
+    def is_empty(self) -> bool:
+        return not any(name.endswith('.json') for name in os.listdir(self.directory))
+
+
+_MISSING = object()
+_NOT_LOADED = object()
+
+
+class CachedDraftBackend(DraftBackend):
+    """LRU-кэш горячих черновиков с отложенной записью в backend.
+
+    Чтения обслуживаются из памяти, подряд идущие записи одного пользователя
+    сливаются и сбрасываются в backend не позже чем через flush_interval секунд
+    (0 — запись сразу), по flush() и при завершении процесса; вытеснение
+    грязной записи будит поток сброса. Обращения к backend идут вне общей
+    блокировки кэша: запись помечается номером версии и считается сохранённой,
+    только если за время записи её не изменили. Рассчитан на один процесс бота.
+    """
+
+    def __init__(self, backend: DraftBackend, max_size: int, flush_interval: float):
+        self.backend = backend
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._cache = OrderedDict()   # user_id -> dict или _MISSING
+        self._dirty = {}              # user_id -> (версия, dict или _MISSING), ещё не в backend
+        self._versions = itertools.count(1)
+        self._last_version = 0
+        self._lock = threading.RLock()
+        # Сбросы идут по одному, чтобы старая версия не записалась поверх новой
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        atexit.register(self.flush)
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        return self._read(user_id, lambda data: None if data is _MISSING else copy.deepcopy(data))
+
+    def put(self, user_id: int, data: Dict):
+        data = copy.deepcopy(data)
+        with self._lock:
+            self._write(user_id, data)
+        self._after_write(user_id)
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._write(user_id, _MISSING)
+        self._after_write(user_id)
+
+    def update(self, user_id: int, func: Callable[[Dict], Dict]) -> Dict:
+        def apply(data):
+            # Вызывается под self._lock
+            data = func({} if data is _MISSING else copy.deepcopy(data))
+            self._write(user_id, copy.deepcopy(data))
+            return data
+
+        data = self._read(user_id, apply)
+        self._after_write(user_id)
+        return data
+
+    def is_empty(self) -> bool:
+        return self.backend.is_empty()
+
+    def flush(self, user_id: Optional[int] = None):
+        with self._flush_lock:
+            with self._lock:
+                pending = [
+                    (uid, version, data) for uid, (version, data) in self._dirty.items()
+                    if user_id is None or uid == user_id
+                ]
+            for uid, version, data in pending:
+                if data is _MISSING:
+                    self.backend.delete(uid)
+                else:
+                    self.backend.put(uid, data)
+                with self._lock:
+                    if self._dirty.get(uid, (None,))[0] == version:
+                        del self._dirty[uid]
+
+    def _read(self, user_id, func):
+        """func(запись) под self._lock; промах читается из backend без блокировки"""
+        while True:
+            with self._lock:
+                data = self._cached(user_id)
+                if data is not _NOT_LOADED:
+                    return func(data)
+                last_version = self._last_version
+            loaded = self.backend.get(user_id)
+            with self._lock:
+                # Запись, сделанная во время чтения, могла уже уйти в backend
+                # и быть вытесненной: тогда прочитанное устарело, читаем заново
+                if self._cached(user_id) is _NOT_LOADED and self._last_version == last_version:
+                    self._cache_put(user_id, _MISSING if loaded is None else loaded)
+
+    def _cached(self, user_id):
+        # Вызывается под self._lock
+        if user_id in self._cache:
+            self._cache.move_to_end(user_id)
+            return self._cache[user_id]
+        if user_id in self._dirty:
+            data = self._dirty[user_id][1]
+            self._cache_put(user_id, data)
+            return data
+        return _NOT_LOADED
+
+    def _write(self, user_id, data):
+        # Вызывается под self._lock
+        version = self._last_version = next(self._versions)
+        self._dirty[user_id] = (version, data)
+        self._cache_put(user_id, data)
+
+    def _cache_put(self, user_id, data):
+        # Вызывается под self._lock
+        self._cache[user_id] = data
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_size:
+            evicted, _ = self._cache.popitem(last=False)
+            # Вытесненная грязная запись остаётся в _dirty до сброса
+            if evicted in self._dirty:
+                self._wakeup.set()
+
+    def _after_write(self, user_id):
+        if self.flush_interval <= 0:
+            self.flush(user_id)
+            return
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
             try:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                data = {}
-
-            # Обновляем данные
-            data[str(user_id)] = answers
-
-            # Записываем данные
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(
-                    data,
-                    f,
-                    indent=4,
-                    ensure_ascii=False,
-                    sort_keys=True,
-                    separators=(',', ': ')
-                )
+                self.flush()
+            except Exception:
+                logger.exception("Ошибка при сбросе черновиков")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_draft_backend() -> DraftBackend:
+    """Общий на процесс backend черновиков, выбирается Settings.DRAFTS_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if Settings.DRAFTS_BACKEND == 'files':
+                    backend = FileDraftBackend(Settings.DRAFTS_PATH)
+                else:
+                    backend = SqliteDraftBackend(Settings.DRAFTS_PATH)
+                _import_legacy_json(backend, Settings.DRAFTS_LEGACY_JSON)
+                if Settings.DRAFTS_CACHE_SIZE > 0:
+                    backend = CachedDraftBackend(
+                        backend,
+                        max_size=Settings.DRAFTS_CACHE_SIZE,
+                        flush_interval=Settings.DRAFTS_FLUSH_INTERVAL
+                    )
+                _backend = backend
+    return _backend
+
+
+def _import_legacy_json(backend: DraftBackend, file_path: str):
+    """Переносит черновики из старого barber_profiles.json в пустое хранилище.
+
+    Перенос делается один раз: после него рядом с хранилищем остаётся
+    отметка, и пустое хранилище (все черновики завершены или удалены)
+    при следующем запуске не заполняется старыми черновиками снова.
+    """
+    marker_path = f"{Settings.DRAFTS_PATH}.legacy_imported"
+    if not file_path or os.path.exists(marker_path) or not os.path.exists(file_path):
+        return
+    if backend.is_empty():
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось прочитать {file_path}: {e}")
+            return
+        for user_id, answers in data.items():
+            backend.put(int(user_id), answers)
+        logger.info(f"Перенесено черновиков из {file_path}: {len(data)}")
+    with open(marker_path, 'w', encoding='utf-8') as f:
+        f.write(f"{file_path}\n")
+
+
+class BarberStorage:
+    def __init__(self, backend: Optional[DraftBackend] = None):
+        self.backend = backend or get_draft_backend()
 
+    def save_profile(self, user_id: int, answers: Dict[str, any]):
+        try:
+            self.backend.put(user_id, answers)
         except Exception as e:
             print(f"Ошибка при сохранении профиля: {e}")
             raise
 
     def get_profile(self, user_id: int) -> Dict:
-        with open(self.file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get(str(user_id), {})
+        return self.backend.get(user_id) or {}
 
     def add_work_photo(self, user_id: int, file_id: str):
         """Добавляет file_id в work_photos пользователя."""
-        profile = self.get_profile(user_id) or {}
-        if 'work_photos' not in profile or not isinstance(profile['work_photos'], list):
-            profile['work_photos'] = []
-        if file_id not in profile['work_photos']:
-            profile['work_photos'].append(file_id)
-        self.save_profile(user_id, profile)
+        def add(profile):
+            if 'work_photos' not in profile or not isinstance(profile['work_photos'], list):
+                profile['work_photos'] = []
+            if file_id not in profile['work_photos']:
+                profile['work_photos'].append(file_id)
+            return profile
+        self.backend.update(user_id, add)
 
     def remove_work_photo(self, user_id: int, file_id: str):
         """Удаляет file_id из work_photos пользователя."""
-        profile = self.get_profile(user_id) or {}
-        if 'work_photos' in profile and isinstance(profile['work_photos'], list):
-            profile['work_photos'] = [fid for fid in profile['work_photos'] if fid != file_id]
-            self.save_profile(user_id, profile)
+        def remove(profile):
+            if 'work_photos' in profile and isinstance(profile['work_photos'], list):
+                profile['work_photos'] = [fid for fid in profile['work_photos'] if fid != file_id]
+            return profile
+        self.backend.update(user_id, remove)
 
     def clear_work_photos(self, user_id: int):
         """Очищает все рабочие фото пользователя."""
-        profile = self.get_profile(user_id) or {}
-        profile['work_photos'] = []
-        self.save_profile(user_id, profile)
+        def clear(profile):
+            profile['work_photos'] = []
+            return profile
+        self.backend.update(user_id, clear)
 
     def clear_profile(self, user_id: int):
-        self._init_storage()
-        with open(self.file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        if str(user_id) in data:
-            del data[str(user_id)]
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False, sort_keys=True, separators=(',', ': '))
+        self.backend.delete(user_id)
 
+    def flush(self, user_id: Optional[int] = None):
+        """Сохраняет на диск отложенные изменения черновика (или всех черновиков)"""
+        self.backend.flush(user_id)
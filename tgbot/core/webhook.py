@@ -0,0 +1,115 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    server_version = "BarbersMapWebhook/1.0"
+
+    def do_GET(self):
+        webhook = self.server.webhook
+        if self.path != webhook.health_path:
+            return self._reply(404, {'ok': False, 'error': 'not found'})
+        self._reply(200, webhook.health())
+
+    def do_POST(self):
+        webhook = self.server.webhook
+        if self.path != webhook.path:
+            return self._reply(404, {'ok': False, 'error': 'not found'})
+        if webhook.secret_token and \
+                self.headers.get('X-Telegram-Bot-Api-Secret-Token') != webhook.secret_token:
+            return self._reply(403, {'ok': False, 'error': 'forbidden'})
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        except (ValueError, UnicodeDecodeError) as e:
+            return self._reply(400, {'ok': False, 'error': f'bad json: {e}'})
+
+        accepted = webhook.accept(payload)
+        self._reply(200, {'ok': True, 'accepted': accepted})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("webhook: " + format, *args)
+
+
+class WebhookServer:
+    """HTTP-приём апдейтов Telegram вместо long polling.
+
+    POST на path принимает один апдейт (как присылает Telegram) или JSON-массив
+    апдейтов, декодирует их в types.Update и передаёт в UpdateDispatcher —
+    параллельность обработки задаётся числом его потоков. GET на health_path
+    отдаёт состояние очередей диспетчера.
+    """
+
+    def __init__(self, dispatcher, host, port, path, secret_token=None, health_path='/health'):
+        self.dispatcher = dispatcher
+        self.path = path
+        self.health_path = health_path
+        self.secret_token = secret_token
+        self._stats_lock = threading.Lock()
+        self._received = 0
+        self._rejected = 0
+        self.httpd = ThreadingHTTPServer((host, port), _WebhookRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.webhook = self
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def accept(self, payload):
+        updates = payload if isinstance(payload, list) else [payload]
+        accepted = 0
+        for raw in updates:
+            try:
+                update = types.Update.de_json(raw)
+            except Exception as e:
+                logger.error(f"Не удалось разобрать апдейт: {e}")
+                update = None
+            if update is None:
+                with self._stats_lock:
+                    self._rejected += 1
+                continue
+            self.dispatcher.submit(update)
+            accepted += 1
+        with self._stats_lock:
+            self._received += accepted
+        return accepted
+
+    def health(self):
+        with self._stats_lock:
+            received, rejected = self._received, self._rejected
+        return {
+            'ok': True,
+            'received': received,
+            'rejected': rejected,
+            'dispatcher': self.dispatcher.stats(),
+        }
+
+    def serve_forever(self):
+        logger.info(f"Webhook слушает порт {self.port}, путь {self.path}")
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Запускает сервер в фоновом потоке (например, для локальной проверки)"""
+        thread = threading.Thread(target=self.httpd.serve_forever, name="webhook", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,39 +1,53 @@
 from telebot import types
 from managers.database import DatabaseManager
 from managers.keyboard import KeyboardManager
+from managers.media import media_cache
+from core.pagination import encode_cursor, decode_cursor
+from core.steps import next_step
 
 class AdminManager:
     @staticmethod
-    def show_pending_profiles(bot, user_id, page=0, city_id=None):
+    def show_pending_profiles(bot, user_id, page=0, city_id=None, cursor=None, backward=False):
         """Показывает список анкет как inline-кнопки с пагинацией"""
         if not DatabaseManager.is_admin(user_id):
             return bot.send_message(user_id, "❌ У вас нет прав администратора")
 
-        pending_profiles = DatabaseManager.get_pending_profiles(page, city_id=city_id)
+        pending_profiles, has_more = DatabaseManager.get_pending_profiles_page(
+            city_id, cursor=cursor, backward=backward
+        )
         if not pending_profiles:
             return bot.send_message(user_id, "✅ Нет анкет на рассмотрении.")
 
         markup = types.InlineKeyboardMarkup()
         for profile in pending_profiles:
-            full_profile = DatabaseManager.get_barber_full_data_by_user_id(profile[1])
-            metro_text = f" ({full_profile['metro_name']})" if full_profile and full_profile.get('metro_name') else ""
+            metro_text = f" ({profile.metro_name})" if profile.metro_name else ""
 
-            btn_text = f"{profile[9]}{metro_text} ({profile[3]})"
+            btn_text = f"{profile.first_name}{metro_text} ({profile.city_name})"
             markup.add(types.InlineKeyboardButton(
                 btn_text,
-                callback_data=f"admin_view_profile_{profile[0]}"
+                callback_data=f"admin_view_profile_{profile.id}"
             ))
 
+        if backward:
+            has_prev, has_next = has_more, True
+            if not has_prev:
+                page = 0
+        else:
+            has_prev, has_next = page > 0, has_more
+
+        # Курсор — (created_at, id) крайней анкеты страницы
         nav_buttons = []
-        if page > 0:
+        if has_prev:
+            first = pending_profiles[0]
             nav_buttons.append(types.InlineKeyboardButton(
                 "⬅️ Назад",
-                callback_data=f"admin_pending_prev_{page-1}_{city_id if city_id else ''}"
+                callback_data=f"admin_pending_prev_{page-1}_{city_id if city_id else ''}_{encode_cursor((first.submitted_at, first.id))}"
             ))
-        if len(pending_profiles) == 10:
+        if has_next:
+            last = pending_profiles[-1]
             nav_buttons.append(types.InlineKeyboardButton(
                 "Вперёд ➡️",
-                callback_data=f"admin_pending_next_{page+1}_{city_id if city_id else ''}"
+                callback_data=f"admin_pending_next_{page+1}_{city_id if city_id else ''}_{encode_cursor((last.submitted_at, last.id))}"
             ))
 
         if nav_buttons:
@@ -63,10 +77,11 @@ class AdminManager:
             "🏙 Введите название города для фильтрации анкет:",
             reply_markup=types.ForceReply()
         )
-        bot.register_next_step_handler(msg, lambda m: AdminManager.handle_city_filter(bot, m))
+        bot.register_next_step_handler(msg, AdminManager.handle_city_filter, bot)
 
     @staticmethod
-    def handle_city_filter(bot, message):
+    @next_step("admin.city_filter")
+    def handle_city_filter(message, bot):
         """Обрабатывает ввод города для фильтрации"""
         user_id = message.from_user.id
         city_name = message.text.strip()
@@ -77,11 +92,20 @@ class AdminManager:
                 "❌ Название города не может быть пустым. Попробуйте еще раз:",
                 reply_markup=types.ForceReply()
             )
-            bot.register_next_step_handler(msg, lambda m: AdminManager.handle_city_filter(bot, m))
+            bot.register_next_step_handler(msg, AdminManager.handle_city_filter, bot)
             return
 
         city_id = DatabaseManager.get_city_id_by_name(city_name)
         if not city_id:
+            suggestions = DatabaseManager.reference_data().suggest_cities(city_name)
+            if suggestions:
+                msg = bot.send_message(
+                    user_id,
+                    f"❌ Город '{city_name}' не найден. Возможно, вы имели в виду:",
+                    reply_markup=KeyboardManager.suggestions_keyboard('city', suggestions)
+                )
+                bot.register_next_step_handler(msg, AdminManager.handle_city_filter, bot)
+                return
             bot.send_message(
                 user_id,
                 f"❌ Город '{city_name}' не найден",
@@ -147,21 +171,17 @@ class AdminManager:
             callback_data="admin_back_to_list"
         ))
 
-        photos = DatabaseManager.get_barber_photos(barber_id)
-        if photos:
-            try:
-                media = [types.InputMediaPhoto(photos[0][0], caption=text)]
-                for photo in photos[1:]:
-                    media.append(types.InputMediaPhoto(photo[0]))
-                bot.send_media_group(user_id, media)
+        try:
+            if media_cache.send(bot, user_id, 'barber', barber_id, caption=text):
                 bot.send_message(user_id, "Выберите действие:", reply_markup=markup)
-            except Exception as e:
-                print(f"Ошибка отправки фото: {e}")
+            else:
                 bot.send_message(user_id, text, reply_markup=markup)
-        else:
+        except Exception as e:
+            print(f"Ошибка отправки фото: {e}")
             bot.send_message(user_id, text, reply_markup=markup)
     @staticmethod
-    def handle_comment_input(bot, message, barber_id):
+    @next_step("admin.comment_input")
+    def handle_comment_input(message, bot, barber_id):
         """Обрабатывает ввод комментария администратора"""
         user_id = message.from_user.id
         comment = message.text
@@ -172,15 +192,12 @@ class AdminManager:
                 "❌ Комментарий должен содержать не менее 5 символов. Попробуйте еще раз:",
                 reply_markup=types.ForceReply()
             )
-            bot.register_next_step_handler(
-                msg,
-                lambda m: AdminManager.handle_comment_input(bot, m, barber_id)
-            )
+            bot.register_next_step_handler(msg, AdminManager.handle_comment_input, bot, barber_id)
             return
 
         barber_user_id = DatabaseManager.get_barber_user_id(barber_id)
         if barber_user_id:
-            bot.send_message(
+            bot.outbox.send_message(
                 barber_user_id,
                 f"📝 Комментарий администратора к вашей анкете:\n\n{comment}"
             )
@@ -212,7 +229,11 @@ class AdminManager:
                 parts = data.split('_')
                 page = int(parts[3])
                 city_id = int(parts[4]) if len(parts) > 4 and parts[4] else None
-                AdminManager.show_pending_profiles(bot, user_id, page, city_id)
+                cursor = decode_cursor(parts[5]) if len(parts) > 5 else None
+                AdminManager.show_pending_profiles(
+                    bot, user_id, page, city_id,
+                    cursor=cursor, backward=data.startswith("admin_pending_prev_")
+                )
 
             elif data.startswith("admin_view_profile_"):
                 barber_id = int(data.split("_")[3])
@@ -225,7 +246,7 @@ class AdminManager:
                 barber_id = int(data.split("_")[2])
                 DatabaseManager.update_barber_status(barber_id, "active")
                 barber_user_id = DatabaseManager.get_barber_user_id(barber_id)
-                bot.send_message(barber_user_id, "🎉 Ваша анкета одобрена! Теперь вы видимы в поиске. Ведите /start")
+                bot.outbox.send_message(barber_user_id, "🎉 Ваша анкета одобрена! Теперь вы видимы в поиске. Ведите /start")
                 bot.answer_callback_query(call.id, "✅ Анкета одобрена")
                 AdminManager.show_pending_profiles(bot, user_id)
 
@@ -233,7 +254,7 @@ class AdminManager:
                 barber_id = int(data.split("_")[2])
                 DatabaseManager.update_barber_status(barber_id, "banned")
                 barber_user_id = DatabaseManager.get_barber_user_id(barber_id)
-                bot.send_message(barber_user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
+                bot.outbox.send_message(barber_user_id, "❌ Ваша анкета заблокирована за нарушение правил.")
                 bot.answer_callback_query(call.id, "🚫 Анкета заблокирована")
                 AdminManager.show_pending_profiles(bot, user_id)
 
@@ -244,10 +265,7 @@ class AdminManager:
                     "✏️ Введите ваш комментарий для барбера:",
                     reply_markup=types.ForceReply()
                 )
-                bot.register_next_step_handler(
-                    msg,
-                    lambda m: AdminManager.handle_comment_input(bot, m, barber_id)
-                )
+                bot.register_next_step_handler(msg, AdminManager.handle_comment_input, bot, barber_id)
                 bot.answer_callback_query(call.id, "💬 Введите комментарий")
 
             elif data == "admin_filter_by_city":
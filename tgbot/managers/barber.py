@@ -4,7 +4,9 @@ from telebot.types import ReplyKeyboardRemove, InputMediaPhoto
 from config.constants import QUESTIONS, SERVICES
 from managers.keyboard import KeyboardManager
 from core.storage import BarberStorage
+from core.steps import next_step
 from managers.database import DatabaseManager
+from managers.media import media_cache
 
 logger = logging.getLogger(__name__)
 storage = BarberStorage()
@@ -73,16 +75,11 @@ class BarberManager:
             f"━━━━━━━━━━━━━━━━━━"
         )
 
-        photos = DatabaseManager.get_barber_photos(barber_id)
-        if photos:
-            try:
-                media = [InputMediaPhoto(photo[0] if isinstance(photo, (list, tuple)) else photo) for photo in photos]
-                media[0].caption = text
-                bot.send_media_group(user_id, media)
-            except Exception as e:
-                logger.error(f"Ошибка при отправке фото: {e}")
+        try:
+            if not media_cache.send(bot, user_id, 'barber', barber_id, caption=text):
                 bot.send_message(user_id, text)
-        else:
+        except Exception as e:
+            logger.error(f"Ошибка при отправке фото: {e}")
             bot.send_message(user_id, text)
 
     @staticmethod
@@ -112,6 +109,7 @@ class BarberManager:
             bot.register_next_step_handler(msg, BarberManager.handle_answer, question_key, bot)
 
     @staticmethod
+    @next_step("barber.work_photo")
     def handle_work_photo(message: types.Message, bot, photo_count):
         user_id = message.from_user.id
         profile = storage.get_profile(user_id) or {}
@@ -159,6 +157,7 @@ class BarberManager:
             BarberManager.ask_question(user_id, 'city', bot)
 
     @staticmethod
+    @next_step("barber.answer")
     def handle_answer(message: types.Message, question_key: str, bot):
         user_id = message.from_user.id
         profile = storage.get_profile(user_id) or {}
@@ -167,7 +166,15 @@ class BarberManager:
             city_name = message.text.strip()
             city_id = DatabaseManager.get_city_id_by_name(city_name)
             if not city_id:
-                bot.send_message(user_id, f"❌ Город '{city_name}' не найден в базе. Проверьте написание или обратитесь к администратору.")
+                suggestions = DatabaseManager.reference_data().suggest_cities(city_name)
+                if suggestions:
+                    bot.send_message(
+                        user_id,
+                        f"❌ Город '{city_name}' не найден в базе. Возможно, вы имели в виду:",
+                        reply_markup=KeyboardManager.suggestions_keyboard('city', suggestions)
+                    )
+                else:
+                    bot.send_message(user_id, f"❌ Город '{city_name}' не найден в базе. Проверьте написание или обратитесь к администратору.")
                 msg = bot.send_message(user_id, QUESTIONS['city'], reply_markup=ReplyKeyboardRemove())
                 bot.register_next_step_handler(msg, BarberManager.handle_answer, 'city', bot)
                 return
@@ -197,7 +204,15 @@ class BarberManager:
             metro_name = message.text.strip()
             metro_id = DatabaseManager.get_metro_id_by_name(city_id, metro_name)
             if not metro_id:
-                bot.send_message(user_id, f"❌ Станция метро '{metro_name}' не найдена в выбранном городе. Проверьте написание или выберите другую станцию.")
+                suggestions = DatabaseManager.reference_data().suggest_metro(city_id, metro_name)
+                if suggestions:
+                    bot.send_message(
+                        user_id,
+                        f"❌ Станция метро '{metro_name}' не найдена в выбранном городе. Возможно, вы имели в виду:",
+                        reply_markup=KeyboardManager.suggestions_keyboard('metro', suggestions)
+                    )
+                else:
+                    bot.send_message(user_id, f"❌ Станция метро '{metro_name}' не найдена в выбранном городе. Проверьте написание или выберите другую станцию.")
                 BarberManager.ask_question(user_id, 'metro', bot)
                 return
 
@@ -291,6 +306,7 @@ class BarberManager:
             bot.register_next_step_handler(msg, BarberManager.save_service_price, service_name, bot)
 
     @staticmethod
+    @next_step("barber.service_price")
     def save_service_price(message: types.Message, service_name: str, bot):
         user_id = message.from_user.id
         try:
@@ -335,6 +351,8 @@ class BarberManager:
 
     @staticmethod
     def finish_questionnaire(user_id: int, bot):
+        # Конец анкеты — точка, после которой черновик не должен теряться
+        storage.flush(user_id)
         BarberManager.show_profile_for_barber(user_id, bot)
 
     @staticmethod
@@ -410,100 +428,45 @@ class BarberManager:
             bot.send_message(user_id, f"❌ Город '{city_name}' не найден в базе. Проверьте написание или обратитесь к администратору.")
             return
 
-        metro_id = profile.get('metro_id')
+        services = []
+        for service_key, price in profile.get('services', {}).items():
+            category_id = DatabaseManager.get_category_id_by_type(service_key)
+            if not category_id:
+                continue
+            services.append((category_id, SERVICES.get(service_key, f"Услуга {service_key}"), price))
+
+        # Анкета, фото и услуги пишутся одной транзакцией: при ошибке не остаётся полусохранённой анкеты
+        result = DatabaseManager.save_barber_profile(
+            user_id=user_id,
+            city_id=city_id,
+            metro_id=profile.get('metro_id'),
+            description=profile.get('description', ''),
+            experience=profile.get('experience', 0),
+            instagram=profile.get('instagram', ''),
+            whatsapp=profile.get('whatsapp', ''),
+            telegram=profile.get('telegram', ''),
+            photos=profile.get('work_photos', [])[:5],
+            services=services
+        )
 
-        user_row = DatabaseManager.get_user_by_telegram_id(user_id)
-        if not user_row:
+        if result == 'no_user':
             bot.send_message(user_id, "❌ Пользователь не найден в базе.")
             return
+        if result is None:
+            bot.send_message(user_id, "❌ Не удалось сохранить анкету в базу.")
+            return
 
-        existing_barber = DatabaseManager.get_barber_by_user_id(user_id)
-        barber_id = None
-
-        if existing_barber:
-            barber_id = existing_barber[0]
-            if not DatabaseManager.update_barber(
-                    barber_id=barber_id,
-                    city_id=city_id,
-                    metro_id=metro_id,
-                    description=profile.get('description', ''),
-                    experience=profile.get('experience', 0),
-                    instagram=profile.get('instagram', ''),
-                    whatsapp=profile.get('whatsapp', ''),
-                    telegram=profile.get('telegram', ''),
-                    status='pending'
-            ):
-                bot.send_message(user_id, "❌ Ошибка при обновлении анкеты.")
-                return
-
-            DatabaseManager.delete_barber_portfolio(barber_id)
-            DatabaseManager.delete_barber_services(barber_id)
-
-            photos = profile.get('work_photos', [])
-            for idx, file_id in enumerate(photos[:5], 1):
-                DatabaseManager.insert_barber_portfolio(barber_id, file_id, idx)
-
-            services_data = profile.get('services', {})
-            for service_key, price in services_data.items():
-                category_id = DatabaseManager.get_category_id_by_type(service_key)
-                if not category_id:
-                    continue
-                service_name = SERVICES.get(service_key, f"Услуга {service_key}")
-                DatabaseManager.insert_barber_service(
-                    barber_id=barber_id,
-                    category_id=category_id,
-                    name=service_name,
-                    price=price
-                )
-
-            storage.clear_profile(user_id)
+        storage.clear_profile(user_id)
+        if result == 'updated':
             bot.send_message(user_id, "✅ Анкета успешно обновлена!")
-
         else:
-            barber_id = DatabaseManager.insert_barber(
-                user_id=user_id,
-                city_id=city_id,
-                metro_id=metro_id,
-                description=profile.get('description', ''),
-                experience=profile.get('experience', 0),
-                instagram=profile.get('instagram', ''),
-                whatsapp=profile.get('whatsapp', ''),
-                telegram=profile.get('telegram', ''),
-                status='pending'
-            )
-
-            if not barber_id:
-                bot.send_message(user_id, "❌ Не удалось сохранить анкету в базу.")
-                return
-
-            photos = profile.get('work_photos', [])
-            for idx, file_id in enumerate(photos[:5], 1):
-                DatabaseManager.insert_barber_portfolio(barber_id, file_id, idx)
-
-            services_data = profile.get('services', {})
-            for service_key, price in services_data.items():
-                category_id = DatabaseManager.get_category_id_by_type(service_key)
-                if not category_id:
-                    continue
-                service_name = SERVICES.get(service_key, f"Услуга {service_key}")
-                DatabaseManager.insert_barber_service(
-                    barber_id=barber_id,
-                    category_id=category_id,
-                    name=service_name,
-                    price=price
-                )
-
-            storage.clear_profile(user_id)
             bot.send_message(
                 user_id,
                 "✅ Анкета успешно сохранена! Теперь вы в базе барберов.",
                 reply_markup=types.ReplyKeyboardRemove()
             )
 
-        roles = DatabaseManager.get_all_roles(user_id)
-        active_role = DatabaseManager.get_active_role(user_id)
-        is_admin = DatabaseManager.is_admin(user_id)
-        is_barber_filled = DatabaseManager.barber_exists(user_id)
+        ctx = DatabaseManager.get_user_context(user_id)
 
-        markup = KeyboardManager.main_menu(active_role, len(roles), is_admin, is_barber_filled)
+        markup = KeyboardManager.main_menu(ctx.active_role, len(ctx.roles), ctx.is_admin, ctx.barber_exists, ctx.barber_status)
         bot.send_message(user_id, "❤️", reply_markup=markup)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from managers.database import DatabaseManager
+
+
+class ProfileCard:
+    """Готовая подпись карточки анкеты; фото берутся из media_cache (managers/media.py)"""
+
+    def __init__(self, barber_id, version, text):
+        self.barber_id = barber_id
+        self.version = version
+        self.text = text
+
+
+class ProfileCardCache:
+    """LRU-кэш карточек анкет барберов для просмотра клиентом.
+
+    builder(barber_id, version) собирает карточку из БД (None — анкеты нет).
+    Изменения анкеты, статуса, услуг, фото и отзывов приходят через
+    DatabaseManager.add_barber_change_listener и увеличивают версию барбера;
+    карточка, собранная по старой версии, в кэш не попадает. Версия хранится
+    только пока карточка собирается, поэтому словарь версий ограничен числом
+    одновременных загрузок.
+    """
+
+    def __init__(self, builder, max_size):
+        self.builder = builder
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._cards = OrderedDict()   # barber_id -> ProfileCard
+        self._loading = {}            # barber_id -> [число загрузок, номер версии]
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        DatabaseManager.add_barber_change_listener(self.invalidate)
+
+    def get(self, barber_id):
+        with self._lock:
+            card = self._cards.get(barber_id)
+            if card is not None:
+                self._cards.move_to_end(barber_id)
+                self._stats['hits'] += 1
+                return card
+            self._stats['misses'] += 1
+            self._loading.setdefault(barber_id, [0, 0])[0] += 1
+            version = self._loading[barber_id][1]
+
+        try:
+            card = self.builder(barber_id, version)
+        except Exception:
+            with self._lock:
+                self._finish_loading(barber_id)
+            raise
+        with self._lock:
+            if card is not None and self._loading[barber_id][1] == version:
+                self._cards[barber_id] = card
+                self._cards.move_to_end(barber_id)
+                while len(self._cards) > self.max_size:
+                    self._cards.popitem(last=False)
+            self._finish_loading(barber_id)
+        return card
+
+    def invalidate(self, barber_id):
+        with self._lock:
+            loading = self._loading.get(barber_id)
+            if loading is not None:
+                loading[1] += 1
+            self._cards.pop(barber_id, None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._cards)
+        return stats
+
+    def _finish_loading(self, barber_id):
+        # Вызывается под self._lock: последняя загрузка убирает версию барбера
+        loading = self._loading[barber_id]
+        loading[0] -= 1
+        if not loading[0]:
+            del self._loading[barber_id]
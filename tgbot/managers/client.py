@@ -2,6 +2,12 @@ from telebot import types
 from managers.database import DatabaseManager
 from managers.keyboard import KeyboardManager
 from managers.barber import BarberStorage
+from managers.cards import ProfileCard, ProfileCardCache
+from managers.media import media_cache
+from config.settings import Settings
+from core.pagination import encode_cursor, decode_cursor
+from core.router import router
+from core.steps import next_step
 
 def plural_years(n):
     n = abs(n)
@@ -24,17 +30,14 @@ def plural_reviews(n):
 class ClientManager:
     @staticmethod
     def show_main_menu(bot, user_id):
-        roles = DatabaseManager.get_all_roles(user_id)
-        active_role = DatabaseManager.get_active_role(user_id)
-        is_admin = DatabaseManager.is_admin(user_id)
-        is_barber_filled = DatabaseManager.barber_exists(user_id) if active_role == 'barber' else False
+        ctx = DatabaseManager.get_user_context(user_id)
 
         markup = KeyboardManager.main_menu(
-            active_role,
-            len(roles),
-            is_admin,
-            is_barber_filled,
-            user_id
+            ctx.active_role,
+            len(ctx.roles),
+            ctx.is_admin,
+            ctx.is_barber_filled,
+            ctx.barber_status
         )
         bot.send_message(user_id, "Выберите действие:", reply_markup=markup)
 
@@ -50,6 +53,7 @@ class ClientManager:
         bot.register_next_step_handler(msg, ClientManager.handle_city_input, bot)
 
     @staticmethod
+    @next_step("client.city_input")
     def handle_city_input(message, bot):
         user_id = message.from_user.id
 
@@ -61,9 +65,16 @@ class ClientManager:
         city_id = DatabaseManager.get_city_id_by_name(city_name)
 
         if not city_id:
+            suggestions = DatabaseManager.reference_data().suggest_cities(city_name)
+            if suggestions:
+                bot.send_message(
+                    user_id,
+                    f"❌ Город '{city_name}' не найден. Возможно, вы имели в виду:",
+                    reply_markup=KeyboardManager.suggestions_keyboard('city', suggestions)
+                )
             msg = bot.send_message(
                 user_id,
-                f"❌ Город '{city_name}' не найден. Попробуйте ещё раз:",
+                "Выберите город из подсказок или введите ещё раз:" if suggestions else f"❌ Город '{city_name}' не найден. Попробуйте ещё раз:",
                 reply_markup=types.ReplyKeyboardMarkup(
                     resize_keyboard=True
                 ).add(types.KeyboardButton("❌ Отмена"))
@@ -75,19 +86,20 @@ class ClientManager:
         ClientManager.show_active_barbers(bot, user_id, city_id=city_id)
 
     @staticmethod
-    def show_active_barbers(bot, user_id, page=0, city_id=None):
-        barbers = DatabaseManager.get_active_barbers(page, city_id=city_id)
+    def show_active_barbers(bot, user_id, page=0, city_id=None, cursor=None, backward=False):
+        barbers, has_more = DatabaseManager.get_active_barbers_page(city_id, cursor=cursor, backward=backward)
 
         if not barbers:
+            ctx = DatabaseManager.get_user_context(user_id)
             bot.send_message(
                 user_id,
                 "❌ Нет доступных барберов, попробуйте выбрать другой город",
                 reply_markup=KeyboardManager.main_menu(
-                    DatabaseManager.get_active_role(user_id),
-                    len(DatabaseManager.get_all_roles(user_id)),
-                    DatabaseManager.is_admin(user_id),
-                    DatabaseManager.barber_exists(user_id) if DatabaseManager.get_active_role(user_id) == 'barber' else False,
-                    user_id
+                    ctx.active_role,
+                    len(ctx.roles),
+                    ctx.is_admin,
+                    ctx.is_barber_filled,
+                    ctx.barber_status
                 )
             )
             return
@@ -101,16 +113,26 @@ class ClientManager:
                 callback_data=f"client_showbarber_{barber[0]}"
             ))
 
+        if backward:
+            has_prev, has_next = has_more, True
+            if not has_prev:
+                page = 0
+        else:
+            has_prev, has_next = page > 0, has_more
+
+        # Курсор — (рейтинг, id) крайнего барбера страницы
         nav_buttons = []
-        if page > 0:
+        if has_prev:
+            first = barbers[0]
             nav_buttons.append(types.InlineKeyboardButton(
                 "⬅️ Назад",
-                callback_data=f"client_prev_{page-1}_{city_id if city_id else ''}"
+                callback_data=f"client_prev_{page-1}_{city_id if city_id else ''}_{encode_cursor((first[10], first[0]))}"
             ))
-        if len(barbers) == 10:
+        if has_next:
+            last = barbers[-1]
             nav_buttons.append(types.InlineKeyboardButton(
                 "Вперёд ➡️",
-                callback_data=f"client_next_{page+1}_{city_id if city_id else ''}"
+                callback_data=f"client_next_{page+1}_{city_id if city_id else ''}_{encode_cursor((last[10], last[0]))}"
             ))
 
         if nav_buttons:
@@ -132,20 +154,74 @@ class ClientManager:
             reply_markup=markup
         )
 
+    @staticmethod
+    def build_profile_card(barber_id, version):
+        """Собирает карточку анкеты для кэша profile_cards"""
+        profile = DatabaseManager.get_barber_by_id(barber_id)
+        if not profile:
+            return None
+
+        full_profile = DatabaseManager.get_barber_full_data_by_user_id(profile['user_id'])
+        metro_text = f"\n    🚇 Метро: {full_profile['metro_name']}" if full_profile and full_profile.get('metro_name') else ""
+
+        services = DatabaseManager.get_barber_services(barber_id)
+        services_text = "\n💰 Услуги и цены:\n" + "\n".join(
+            [f"• {s[0]}: {s[1]} руб." for s in services]
+        ) if services else ""
+
+        description = profile.get('description', '')
+        description_text = f"\n📝 Описание: {description}" if description else ""
+
+        years = profile.get('experience_years', 0)
+        years_text = f"{years} {plural_years(years)}"
+
+        text = f"""━━━━━━━━━━━━━━━━━━
+    👤 Барбер: {profile['first_name']}
+    📍 Город: {profile['city_name']} {metro_text}
+    💈 Опыт: {years_text}
+    {description_text}
+    
+    {services_text}
+    ━━━━━━━━━━━━━━━━━━"""
+        return ProfileCard(barber_id, version, text)
+
+    @staticmethod
+    def profile_card_markup(barber_id, is_favorite):
+        markup = types.InlineKeyboardMarkup(row_width=2)
+        markup.add(
+            types.InlineKeyboardButton(
+                "📝 Записаться",
+                callback_data=f"client_book_{barber_id}"
+            ),
+            types.InlineKeyboardButton(
+                "⭐ Удалить из избранного" if is_favorite else "⭐ Добавить в избранное",
+                callback_data=f"client_toggle_favorite_{barber_id}"
+            )
+        )
+        markup.add(types.InlineKeyboardButton(
+            "🔙 Назад к списку",
+            callback_data="client_back_to_list"
+        ))
+        markup.add(types.InlineKeyboardButton(
+            "🏠 В главное меню",
+            callback_data="client_back_to_menu"
+        ))
+        return markup
+
     @staticmethod
     def show_favorite_barbers(bot, user_id):
         favorites = DatabaseManager.get_favorite_barbers(user_id)
 
         if not favorites:
+            ctx = DatabaseManager.get_user_context(user_id)
             bot.send_message(
                 user_id,
                 "⭐ У вас пока нет избранных барберов.",
                 reply_markup=KeyboardManager.main_menu(
-                    DatabaseManager.get_active_role(user_id),
-                    len(DatabaseManager.get_all_roles(user_id)),
-                    DatabaseManager.is_admin(user_id),
-                    False,
-                    user_id
+                    ctx.active_role,
+                    len(ctx.roles),
+                    ctx.is_admin,
+                    False
                 )
             )
             return
@@ -170,192 +246,124 @@ class ClientManager:
             reply_markup=markup
         )
 
+profile_cards = ProfileCardCache(ClientManager.build_profile_card, Settings.PROFILE_CARD_CACHE_SIZE)
+
+
 def register_client_handlers(bot):
-    @bot.message_handler(func=lambda msg: msg.text == "⭐ Избранное")
+    @router.text("⭐ Избранное")
     def handle_favorites(message):
         ClientManager.show_favorite_barbers(bot, message.from_user.id)
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("client_"))
-    def handle_client_barber_callback(call):
-        user_id = call.from_user.id
-        data = call.data
-
-        if data == "client_back_to_menu":
-            ClientManager.show_main_menu(bot, user_id)
-            bot.answer_callback_query(call.id)
-            return
-
-        if data == "client_show_favorites":
-            ClientManager.show_favorite_barbers(bot, user_id)
-            bot.answer_callback_query(call.id)
-            return
-
-        if data.startswith("client_prev_") or data.startswith("client_next_"):
-            parts = data.split('_')
-            page = int(parts[2])
-            city_id = int(parts[3]) if len(parts) > 3 and parts[3] else None
-            ClientManager.show_active_barbers(bot, user_id, page=page, city_id=city_id)
-            bot.answer_callback_query(call.id)
-            return
-
-        elif data.startswith("client_showbarber_"):
-            barber_id = int(data.split("_")[2])
-            profile = DatabaseManager.get_barber_by_id(barber_id)
-            avg_rating, rating_count = DatabaseManager.get_barber_average_rating(barber_id)
-            rating_text = f"⭐️ Рейтинг: {avg_rating or 'нет оценок'} ({rating_count} {plural_reviews(rating_count)})\n" if rating_count else "⭐️ Рейтинг: нет оценок\n"
-
-            if profile:
-                full_profile = DatabaseManager.get_barber_full_data_by_user_id(profile['user_id'])
-                metro_text = f"\n    🚇 Метро: {full_profile['metro_name']}" if full_profile and full_profile.get('metro_name') else ""
-
-                is_favorite = DatabaseManager.is_barber_favorite(user_id, barber_id)
-
-                services = DatabaseManager.get_barber_services(barber_id)
-                services_text = "\n💰 Услуги и цены:\n" + "\n".join(
-                    [f"• {s[0]}: {s[1]} руб." for s in services]
-                ) if services else ""
-
-                description = profile.get('description', '')
-                description_text = f"\n📝 Описание: {description}" if description else ""
-
-                years = profile.get('experience_years', 0)
-                years_text = f"{years} {plural_years(years)}"
-
-                text = f"""━━━━━━━━━━━━━━━━━━
-    👤 Барбер: {profile['first_name']}
-    📍 Город: {profile['city_name']} {metro_text}
-    💈 Опыт: {years_text}
-    {description_text}
-    
-    {services_text}
-    ━━━━━━━━━━━━━━━━━━"""
+    @router.callback("client_back_to_menu")
+    def handle_back_to_menu(call, args):
+        ClientManager.show_main_menu(bot, call.from_user.id)
+        bot.answer_callback_query(call.id)
+
+    @router.callback("client_show_favorites")
+    def handle_show_favorites(call, args):
+        ClientManager.show_favorite_barbers(bot, call.from_user.id)
+        bot.answer_callback_query(call.id)
+
+    # client_prev|next_{page}_{city}_{cursor}
+    @router.callback_prefix("client_prev_")
+    @router.callback_prefix("client_next_")
+    def handle_page(call, args):
+        page = int(args[0])
+        city_id = int(args[1]) if len(args) > 1 and args[1] else None
+        cursor = decode_cursor(args[2]) if len(args) > 2 else None
+        ClientManager.show_active_barbers(
+            bot, call.from_user.id, page=page, city_id=city_id,
+            cursor=cursor, backward=call.data.startswith("client_prev_")
+        )
+        bot.answer_callback_query(call.id)
 
-                markup = types.InlineKeyboardMarkup(row_width=2)
-                markup.add(
-                    types.InlineKeyboardButton(
-                        "📝 Записаться",
-                        callback_data=f"client_book_{barber_id}"
-                    ),
-                    types.InlineKeyboardButton(
-                        "⭐ Удалить из избранного" if is_favorite else "⭐ Добавить в избранное",
-                        callback_data=f"client_toggle_favorite_{barber_id}"
-                    )
-                )
-                markup.add(types.InlineKeyboardButton(
-                    "🔙 Назад к списку",
-                    callback_data="client_back_to_list"
-                ))
-                markup.add(types.InlineKeyboardButton(
-                    "🏠 В главное меню",
-                    callback_data="client_back_to_menu"
-                ))
-
-                photos = DatabaseManager.get_barber_photos(profile['id'])
-                if photos:
-                    try:
-                        media = []
-                        for idx, photo in enumerate(photos):
-                            if idx == 0:
-                                media.append(types.InputMediaPhoto(photo[0], caption=text))
-                            else:
-                                media.append(types.InputMediaPhoto(photo[0]))
-                        bot.send_media_group(user_id, media)
-                        bot.send_message(user_id, "Выберите действие:", reply_markup=markup)
-                    except Exception:
-                        bot.send_message(user_id, text, reply_markup=markup)
+    @router.callback_prefix("client_showbarber_")
+    def handle_show_barber(call, args):
+        user_id = call.from_user.id
+        barber_id = int(args[0])
+        card = profile_cards.get(barber_id)
+
+        if card:
+            # Избранное зависит от клиента, поэтому не кэшируется
+            is_favorite = DatabaseManager.is_barber_favorite(user_id, barber_id)
+            markup = ClientManager.profile_card_markup(barber_id, is_favorite)
+            try:
+                if media_cache.send(bot, user_id, 'barber', barber_id, caption=card.text):
+                    bot.send_message(user_id, "Выберите действие:", reply_markup=markup)
                 else:
-                    bot.send_message(user_id, text, reply_markup=markup)
-            else:
-                bot.send_message(user_id, "❌ Анкета не найдена.")
-            bot.answer_callback_query(call.id)
-            return
-
-        elif data == "client_back_to_list":
-            city_id = DatabaseManager.get_user_city_selection(user_id)
-            ClientManager.show_active_barbers(bot, user_id, city_id=city_id)
-            bot.answer_callback_query(call.id)
-            return
+                    bot.send_message(user_id, card.text, reply_markup=markup)
+            except Exception:
+                bot.send_message(user_id, card.text, reply_markup=markup)
+        else:
+            bot.send_message(user_id, "❌ Анкета не найдена.")
+        bot.answer_callback_query(call.id)
+
+    @router.callback("client_back_to_list")
+    def handle_back_to_list(call, args):
+        user_id = call.from_user.id
+        city_id = DatabaseManager.get_user_city_selection(user_id)
+        ClientManager.show_active_barbers(bot, user_id, city_id=city_id)
+        bot.answer_callback_query(call.id)
 
-        elif data.startswith("client_book_"):
-            barber_id = int(data.split("_")[2])
-            profile = DatabaseManager.get_barber_by_id(barber_id)
+    @router.callback_prefix("client_book_")
+    def handle_book(call, args):
+        user_id = call.from_user.id
+        barber_id = int(args[0])
+        profile = DatabaseManager.get_barber_by_id(barber_id)
 
-            if profile:
-                contacts_text = f"""📱 Контакты барбера:
+        if profile:
+            contacts_text = f"""📱 Контакты барбера:
     • Instagram: {profile['instagram'] or 'не указан'}
     • WhatsApp: {profile['whatsapp'] or 'не указан'}
     • Telegram: {profile['telegram'] or 'не указан'}
     
     Свяжитесь с барбером для записи!"""
 
-                markup = types.InlineKeyboardMarkup()
-                markup.add(types.InlineKeyboardButton(
-                    "🔙 Назад к анкете",
-                    callback_data=f"client_showbarber_{barber_id}"
-                ))
+            markup = types.InlineKeyboardMarkup()
+            markup.add(types.InlineKeyboardButton(
+                "🔙 Назад к анкете",
+                callback_data=f"client_showbarber_{barber_id}"
+            ))
 
-                bot.send_message(
-                    user_id,
-                    contacts_text,
-                    reply_markup=markup
-                )
-            else:
-                bot.send_message(user_id, "❌ Барбер не найден")
-            bot.answer_callback_query(call.id)
-            return
+            bot.send_message(
+                user_id,
+                contacts_text,
+                reply_markup=markup
+            )
+        else:
+            bot.send_message(user_id, "❌ Барбер не найден")
+        bot.answer_callback_query(call.id)
 
-        elif data.startswith("client_toggle_favorite_"):
-            barber_id = int(data.split("_")[3])
-            was_favorite = DatabaseManager.is_barber_favorite(user_id, barber_id)
-            success = DatabaseManager.toggle_favorite(user_id, barber_id)
-
-            if success:
-                action = "удален из избранного" if was_favorite else "добавлен в избранное"
-                bot.answer_callback_query(
-                    call.id,
-                    f"✅ Барбер {action}",
-                    show_alert=True
-                )
+    @router.callback_prefix("client_toggle_favorite_")
+    def handle_toggle_favorite(call, args):
+        user_id = call.from_user.id
+        barber_id = int(args[0])
+        was_favorite = DatabaseManager.is_barber_favorite(user_id, barber_id)
+        success = DatabaseManager.toggle_favorite(user_id, barber_id)
+
+        if success:
+            action = "удален из избранного" if was_favorite else "добавлен в избранное"
+            bot.answer_callback_query(
+                call.id,
+                f"✅ Барбер {action}",
+                show_alert=True
+            )
 
-                try:
-                    if was_favorite:
-                        new_text = "⭐ Добавить в избранное"
-                    else:
-                        new_text = "⭐ Удалить из избранного"
-
-                    markup = types.InlineKeyboardMarkup(row_width=2)
-                    markup.add(
-                        types.InlineKeyboardButton(
-                            "📝 Записаться",
-                            callback_data=f"client_book_{barber_id}"
-                        ),
-                        types.InlineKeyboardButton(
-                            new_text,
-                            callback_data=f"client_toggle_favorite_{barber_id}"
-                        )
-                    )
-                    markup.add(types.InlineKeyboardButton(
-                        "🔙 Назад к списку",
-                        callback_data="client_back_to_list"
-                    ))
-                    markup.add(types.InlineKeyboardButton(
-                        "🏠 В главное меню",
-                        callback_data="client_back_to_menu"
-                    ))
-
-                    bot.edit_message_reply_markup(
-                        chat_id=call.message.chat.id,
-                        message_id=call.message.message_id,
-                        reply_markup=markup
-                    )
-                except Exception as e:
-                    print(f"Ошибка при обновлении кнопки: {e}")
-            else:
-                bot.answer_callback_query(call.id, "❌ Ошибка при изменении избранного")
-            return
+            try:
+                markup = ClientManager.profile_card_markup(barber_id, not was_favorite)
+
+                bot.edit_message_reply_markup(
+                    chat_id=call.message.chat.id,
+                    message_id=call.message.message_id,
+                    reply_markup=markup
+                )
+            except Exception as e:
+                print(f"Ошибка при обновлении кнопки: {e}")
+        else:
+            bot.answer_callback_query(call.id, "❌ Ошибка при изменении избранного")
 
-    @bot.callback_query_handler(func=lambda call: call.data == "client_back_to_search")
-    def handle_back_to_search(call):
+    @router.callback("client_back_to_search")
+    def handle_back_to_search(call, args):
         user_id = call.from_user.id
         city_id = DatabaseManager.get_user_city_selection(user_id)
         ClientManager.show_active_barbers(bot, user_id, city_id=city_id)
@@ -1,6 +1,28 @@
 from core.database import Database
+from core import context
+from core.context import UserContext
+from core import reference
+from core.reference import ReferenceData
+from config.constants import SPECIALIZATION_FILTERS
 import logging
 
+
+class PendingProfile:
+    """Анкета в списке модерации"""
+
+    def __init__(self, id, user_id, username, first_name, city_name, metro_name,
+                 experience_years, photos_count, submitted_at):
+        self.id = id
+        self.user_id = user_id
+        self.username = username
+        self.first_name = first_name
+        self.city_name = city_name
+        self.metro_name = metro_name
+        self.experience_years = experience_years
+        self.photos_count = photos_count or 0
+        self.submitted_at = submitted_at
+
+
 class DatabaseManager:
 
 
@@ -9,6 +31,64 @@ class DatabaseManager:
 
     logger = logging.getLogger(__name__)
 
+    # Колбэки вида listener(barber_id), вызываются после изменения анкеты,
+    # её статуса, услуг, портфолио или отзывов (см. managers/search.py, managers/cards.py)
+    barber_change_listeners = []
+
+    # Ключ сортировки активных барберов. Пока миграция 0003 не применена, rating
+    # может быть NULL и сортировка идёт по COALESCE — без индекса, через filesort.
+    # После неё столбец NOT NULL, и запросы сортируют по нему самому, что
+    # позволяет MySQL читать страницу по idx_barbers_status_*_rating (см. set_rating_not_null)
+    rating_sort_key = "COALESCE(barbers.rating, 0)"
+
+    @staticmethod
+    def set_rating_not_null(not_null):
+        """Вызывается при запуске после проверки схемы (core/bot.py, check_schema)"""
+        DatabaseManager.rating_sort_key = "barbers.rating" if not_null else "COALESCE(barbers.rating, 0)"
+
+    @staticmethod
+    def add_barber_change_listener(listener):
+        DatabaseManager.barber_change_listeners.append(listener)
+
+    @staticmethod
+    def notify_barber_changed(barber_id):
+        if barber_id is None:
+            return
+        for listener in DatabaseManager.barber_change_listeners:
+            try:
+                listener(barber_id)
+            except Exception as e:
+                DatabaseManager.logger.error(f"Ошибка обработчика изменения барбера {barber_id}: {e}")
+
+    @staticmethod
+    def query_reference_data():
+        """Читает города, станции метро и категории стрижек; None — если БД недоступна"""
+        with Database() as db:
+            if db.connect():
+                cities = db.execute("SELECT id, name, is_active FROM cities ORDER BY id")
+                metro_stations = db.execute(
+                    "SELECT id, city_id, name, is_active FROM metro_stations ORDER BY id"
+                )
+                categories = db.execute("SELECT id, type FROM haircut_categories")
+                if cities is not False and metro_stations is not False and categories is not False:
+                    return ReferenceData(cities, metro_stations, categories)
+        return None
+
+    @staticmethod
+    def reload_reference_data():
+        """Перечитывает справочники; при ошибке остаётся прежний снимок"""
+        snapshot = DatabaseManager.query_reference_data()
+        if snapshot is None:
+            DatabaseManager.logger.error("Не удалось обновить справочники")
+            return False
+        reference.set_snapshot(snapshot)
+        return True
+
+    @staticmethod
+    def reference_data():
+        """Снимок справочников в памяти: поиск городов, метро и категорий без запросов к БД"""
+        return reference.get_or_load(DatabaseManager.query_reference_data)
+
     @staticmethod
     def check_user(user_id):
         with Database() as db:
@@ -22,6 +102,7 @@ class DatabaseManager:
 
     @staticmethod
     def register_user(user_id, username, first_name):
+        context.invalidate(user_id)
         with Database() as db:
             if db.connect():
                 return db.execute(
@@ -41,41 +122,87 @@ class DatabaseManager:
                 return result
 
     @staticmethod
-    def get_all_roles(user_id):
-        with Database() as db:
-            if db.connect():
-                results = db.execute(
-                    "SELECT role FROM user_roles WHERE user_id = %s",
-                    (user_id,)
-                )
-                return [role[0] for role in results] if results else []
+    def get_user_context(user_id):
+        """Роли, активная роль, анкета барбера и город пользователя одним запросом.
 
-    @staticmethod
-    def get_active_role(user_id):
+        В рамках одного апдейта результат кэшируется (см. core/context.py).
+        """
+        cached = context.get_scoped(user_id)
+        if cached is not None:
+            return cached
+
+        result = None
         with Database() as db:
             if db.connect():
                 result = db.execute(
-                    "SELECT role FROM user_roles WHERE user_id = %s AND is_active = 1",
+                    """
+                    SELECT
+                        GROUP_CONCAT(ur.role) AS roles,
+                        MAX(CASE WHEN ur.is_active = 1 THEN ur.role END) AS active_role,
+                        b.id AS barber_id,
+                        b.status AS barber_status,
+                        (SELECT ucs.city_id FROM user_city_selections ucs
+                         WHERE ucs.user_id = u.telegram_id
+                         ORDER BY ucs.selected_at DESC LIMIT 1) AS city_id
+                    FROM
+                        users u
+                    LEFT JOIN
+                        user_roles ur ON ur.user_id = u.telegram_id
+                    LEFT JOIN
+                        barbers b ON b.user_id = u.telegram_id
+                    WHERE
+                        u.telegram_id = %s
+                    GROUP BY
+                        u.telegram_id, b.id, b.status
+                    """,
                     (user_id,),
                     fetch_one=True
                 )
-                return result[0] if result else None
+
+        if result:
+            user_context = UserContext(
+                user_id,
+                roles=result[0].split(',') if result[0] else [],
+                active_role=result[1],
+                barber_id=result[2],
+                barber_status=result[3],
+                city_id=result[4]
+            )
+        else:
+            user_context = UserContext(user_id)
+
+        # Ошибку запроса (False) не кэшируем
+        if result is not False:
+            context.store_scoped(user_context)
+        return user_context
+
+    @staticmethod
+    def get_all_roles(user_id):
+        return list(DatabaseManager.get_user_context(user_id).roles)
+
+    @staticmethod
+    def get_active_role(user_id):
+        return DatabaseManager.get_user_context(user_id).active_role
 
     @staticmethod
     def save_user_role(user_id, role):
-        with Database() as db:
-            if db.connect():
-                if DatabaseManager.user_has_role(user_id, role):
-                    return DatabaseManager.switch_active_role(user_id, role)
-                else:
-                    db.execute(
-                        "UPDATE user_roles SET is_active = 0 WHERE user_id = %s",
-                        (user_id,)
-                    )
-                    return db.execute(
-                        "INSERT INTO user_roles (user_id, role, is_active) VALUES (%s, %s, 1)",
-                        (user_id, role)
-                    )
+        """Добавляет пользователю роль (если её нет) и делает её активной"""
+        context.invalidate(user_id)
+
+        def work(db):
+            db.execute("UPDATE user_roles SET is_active = 0 WHERE user_id = %s", (user_id,))
+            db.execute(
+                "UPDATE user_roles SET is_active = 1 WHERE user_id = %s AND role = %s",
+                (user_id, role)
+            )
+            if not db.rowcount:
+                db.execute(
+                    "INSERT INTO user_roles (user_id, role, is_active) VALUES (%s, %s, 1)",
+                    (user_id, role)
+                )
+            return True
+
+        return Database.atomic(work)
 
     @staticmethod
     def user_has_role(user_id, role):
@@ -90,27 +217,20 @@ class DatabaseManager:
 
     @staticmethod
     def switch_active_role(user_id, new_role):
-        with Database() as db:
-            if db.connect():
-                db.execute(
-                    "UPDATE user_roles SET is_active = 0 WHERE user_id = %s",
-                    (user_id,)
-                )
-                return db.execute(
-                    "UPDATE user_roles SET is_active = 1 WHERE user_id = %s AND role = %s",
-                    (user_id, new_role)
-                )
+        context.invalidate(user_id)
+
+        def work(db):
+            db.execute("UPDATE user_roles SET is_active = 0 WHERE user_id = %s", (user_id,))
+            return db.execute(
+                "UPDATE user_roles SET is_active = 1 WHERE user_id = %s AND role = %s",
+                (user_id, new_role)
+            )
+
+        return Database.atomic(work)
 
     @staticmethod
     def is_admin(user_id):
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT 1 FROM user_roles WHERE user_id = %s AND role = 'admin'",
-                    (user_id,),
-                    fetch_one=True
-                )
-                return bool(result)
+        return DatabaseManager.get_user_context(user_id).is_admin
 
     @staticmethod
     def get_available_roles(user_id):
@@ -133,7 +253,7 @@ class DatabaseManager:
                         barbers.instagram, 
                         barbers.whatsapp, 
                         barbers.telegram,
-                        (SELECT COUNT(*) FROM barber_portfolio WHERE barber_portfolio.barber_id = barbers.id) AS photos_count,
+                        barbers.photos_count,
                         users.first_name
                     FROM 
                         barbers
@@ -149,78 +269,176 @@ class DatabaseManager:
                     query += " AND barbers.city_id = %s"
                     params.append(city_id)
 
-                query += " LIMIT %s OFFSET %s"
+                query += " ORDER BY barbers.created_at, barbers.id LIMIT %s OFFSET %s"
                 params.extend([per_page, offset])
 
                 return db.execute(query, tuple(params))
         return []
 
     @staticmethod
-    def barber_exists(user_id):
+    def get_pending_profiles_page(city_id=None, cursor=None, backward=False, per_page=10):
+        """Анкеты на модерацию с пагинацией по ключу (created_at, id).
+
+        cursor — (created_at, id) крайней строки соседней страницы, None — начало списка.
+        backward=True — страница перед cursor.
+        Возвращает (profiles, has_more): список PendingProfile и флаг, есть ли ещё
+        анкеты в направлении движения. Метро, город, число фото и время подачи
+        приходят тем же запросом.
+        """
         with Database() as db:
             if db.connect():
-                result = db.execute(
-                    "SELECT id FROM barbers WHERE user_id = %s",
-                    (user_id,),
-                    fetch_one=True
-                )
-                return bool(result)
+                query = """
+                    SELECT 
+                        barbers.id, 
+                        barbers.user_id, 
+                        users.username, 
+                        users.first_name,
+                        cities.name AS city_name, 
+                        metro_stations.name AS metro_name,
+                        barbers.experience_years, 
+                        barbers.photos_count,
+                        barbers.created_at
+                    FROM 
+                        barbers
+                    JOIN 
+                        users ON barbers.user_id = users.telegram_id
+                    JOIN 
+                        cities ON barbers.city_id = cities.id
+                    LEFT JOIN
+                        metro_stations ON barbers.metro_id = metro_stations.id
+                    WHERE 
+                        barbers.status = 'pending'
+                """
+                params = []
+                if city_id:
+                    query += " AND barbers.city_id = %s"
+                    params.append(city_id)
+
+                if cursor:
+                    created_at, barber_id = cursor
+                    op = '<' if backward else '>'
+                    query += f"""
+                        AND (barbers.created_at {op} %s
+                             OR (barbers.created_at = %s AND barbers.id {op} %s))
+                    """
+                    params.extend([created_at, created_at, barber_id])
+
+                order = 'DESC' if backward else 'ASC'
+                query += f" ORDER BY barbers.created_at {order}, barbers.id {order} LIMIT %s"
+                params.append(per_page + 1)
+
+                rows = db.execute(query, tuple(params)) or []
+                has_more = len(rows) > per_page
+                rows = rows[:per_page]
+                if backward:
+                    rows.reverse()
+                return [PendingProfile(*row) for row in rows], has_more
+        return [], False
+
+    @staticmethod
+    def barber_exists(user_id):
+        return DatabaseManager.get_user_context(user_id).barber_exists
 
     @staticmethod
     def get_barber_by_user_id(user_id):
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT id FROM barbers WHERE user_id = %s",
-                    (user_id,),
-                    fetch_one=True
-                )
-                return result
+        barber_id = DatabaseManager.get_user_context(user_id).barber_id
+        return (barber_id,) if barber_id is not None else None
 
     @staticmethod
     def insert_barber(user_id, city_id, metro_id, description, experience, instagram, whatsapp, telegram, status):
         """Добавляет нового барбера в базу со статусом pending"""
-        try:
-            with Database() as db:
-                if db.connect():
-                    db.execute(
-                        "INSERT INTO barbers (user_id, city_id, metro_id, description, "
-                        "experience_years, instagram, whatsapp, telegram, status) "
-                        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                        (user_id, city_id, metro_id, description,
-                         experience, instagram, whatsapp, telegram, status)
-                    )
-                    result = db.execute("SELECT LAST_INSERT_ID()", fetch_one=True)
-                    return result[0] if result else None
-        except Exception as e:
-            logger.error(f"Error inserting barber: {e}")
-            return None
-
-    @staticmethod
-    def update_barber(barber_id, city_id, metro_id, description, experience, instagram, whatsapp, telegram, status):
-        """Обновляет данные барбера со статусом pending"""
-        try:
-            with Database() as db:
-                if db.connect():
-                    affected_rows = db.execute(
-                        "UPDATE barbers SET city_id = %s, metro_id = %s, description = %s, "
-                        "experience_years = %s, instagram = %s, whatsapp = %s, telegram = %s, status = %s "
-                        "WHERE id = %s",
-                        (city_id, metro_id, description, experience,
-                         instagram, whatsapp, telegram, status, barber_id)
-                    )
-                    return affected_rows > 0
-        except Exception as e:
-            logger.error(f"Error updating barber: {e}")
-            return False
+        context.invalidate(user_id)
+        with Database() as db:
+            if db.connect():
+                if not db.execute(
+                    "INSERT INTO barbers (user_id, city_id, metro_id, description, "
+                    "experience_years, instagram, whatsapp, telegram, status) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    (user_id, city_id, metro_id, description,
+                     experience, instagram, whatsapp, telegram, status)
+                ):
+                    return None
+                barber_id = db.lastrowid
+                DatabaseManager.notify_barber_changed(barber_id)
+                return barber_id
+        return None
+
+    @staticmethod
+    def save_barber_profile(user_id, city_id, metro_id, description, experience,
+                            instagram, whatsapp, telegram, photos, services):
+        """Создаёт или перезаписывает анкету барбера одной транзакцией и отправляет её на модерацию.
+
+        photos — file_id фото работ по порядку, services — (category_id, название, цена).
+        Все команды идут через одно соединение; при ошибке транзакция откатывается
+        и в БД остаётся прежняя анкета.
+        Возвращает 'created', 'updated', 'no_user' (пользователя нет в users) или None при ошибке.
+        """
+        context.invalidate(user_id)
+        fields = (city_id, metro_id, description, experience, instagram, whatsapp, telegram, len(photos))
+
+        def work(db):
+            # Блокировка строки пользователя не даёт двум сохранениям создать две анкеты
+            row = db.execute(
+                """
+                SELECT u.telegram_id, b.id
+                FROM users u
+                LEFT JOIN barbers b ON b.user_id = u.telegram_id
+                WHERE u.telegram_id = %s
+                FOR UPDATE
+                """,
+                (user_id,),
+                fetch_one=True
+            )
+            if not row:
+                return 'no_user'
+
+            barber_id = row[1]
+            if barber_id is not None:
+                db.execute(
+                    "UPDATE barbers SET city_id = %s, metro_id = %s, description = %s, "
+                    "experience_years = %s, instagram = %s, whatsapp = %s, telegram = %s, "
+                    "photos_count = %s, status = 'pending' WHERE id = %s",
+                    fields + (barber_id,)
+                )
+                db.execute("DELETE FROM barber_portfolio WHERE barber_id = %s", (barber_id,))
+                db.execute("DELETE FROM barber_services WHERE barber_id = %s", (barber_id,))
+            else:
+                db.execute(
+                    "INSERT INTO barbers (user_id, city_id, metro_id, description, experience_years, "
+                    "instagram, whatsapp, telegram, photos_count, status) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending')",
+                    (user_id,) + fields
+                )
+                barber_id = db.lastrowid
+
+            if photos:
+                db.executemany(
+                    "INSERT INTO barber_portfolio (barber_id, photo_url, position) VALUES (%s, %s, %s)",
+                    [(barber_id, file_id, position) for position, file_id in enumerate(photos, 1)]
+                )
+            if services:
+                db.executemany(
+                    "INSERT INTO barber_services (barber_id, category_id, name, price) "
+                    "VALUES (%s, %s, %s, %s)",
+                    [(barber_id, category_id, name, price) for category_id, name, price in services]
+                )
+
+            db.after_commit(lambda: DatabaseManager.notify_barber_changed(barber_id))
+            return 'updated' if row[1] is not None else 'created'
+
+        return Database.atomic(work, default=None)
+
     @staticmethod
     def update_barber_status(barber_id, status):
+        context.invalidate()
         with Database() as db:
             if db.connect():
-                return db.execute(
+                result = db.execute(
                     "UPDATE barbers SET status = %s WHERE id = %s",
                     (status, barber_id)
                 )
+                DatabaseManager.notify_barber_changed(barber_id)
+                return result
 
     @staticmethod
     def get_barber_user_id(barber_id):
@@ -236,45 +454,49 @@ class DatabaseManager:
     @staticmethod
     def delete_barber_data(user_id):
         """Сбрасывает анкету барбера к начальному состоянию, сохраняя user_id и рейтинг"""
-        with Database() as db:
-            if db.connect():
-                # Проверяем существование анкеты
-                barber = db.execute(
-                    "SELECT id FROM barbers WHERE user_id = %s",
-                    (user_id,),
-                    fetch_one=True
-                )
-                if not barber:
-                    return False
-
-                barber_id = barber[0]
-
-                # Удаляем связанные данные (услуги и фото)
-                db.execute("DELETE FROM barber_services WHERE barber_id = %s", (barber_id,))
-                db.execute("DELETE FROM barber_portfolio WHERE barber_id = %s", (barber_id,))
-
-                # Обновляем основную анкету, сохраняя рейтинг
-                db.execute(
-                    """
-                    UPDATE barbers 
-                    SET 
-                        city_id = NULL,
-                        metro_id = NULL,
-                        description = NULL,
-                        experience_years = NULL,
-                        instagram = NULL,
-                        whatsapp = NULL,
-                        telegram = NULL,
-                        status = 'pending',
-                        
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                    """,
-                    (barber_id,)
-                )
+        context.invalidate(user_id)
+
+        def work(db):
+            # Проверяем существование анкеты
+            barber = db.execute(
+                "SELECT id FROM barbers WHERE user_id = %s FOR UPDATE",
+                (user_id,),
+                fetch_one=True
+            )
+            if not barber:
+                return False
+
+            barber_id = barber[0]
+
+            # Удаляем связанные данные (услуги и фото)
+            db.execute("DELETE FROM barber_services WHERE barber_id = %s", (barber_id,))
+            db.execute("DELETE FROM barber_portfolio WHERE barber_id = %s", (barber_id,))
+
+            # Обновляем основную анкету, сохраняя рейтинг
+            db.execute(
+                """
+                UPDATE barbers 
+                SET 
+                    city_id = NULL,
+                    metro_id = NULL,
+                    description = NULL,
+                    experience_years = NULL,
+                    instagram = NULL,
+                    whatsapp = NULL,
+                    telegram = NULL,
+                    status = 'pending',
+                    photos_count = 0,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """,
+                (barber_id,)
+            )
+
+            db.after_commit(lambda: DatabaseManager.notify_barber_changed(barber_id))
+            return True
+
+        return Database.atomic(work)
 
-                return True
-        return False
     @staticmethod
     def get_barber_full_data_by_user_id(user_id):
         """Возвращает полные данные барбера, включая метро (если есть)"""
@@ -295,7 +517,7 @@ class DatabaseManager:
                         barbers.description,
                         metro_stations.name AS metro_name,
                         barbers.metro_id,
-                        (SELECT COUNT(*) FROM barber_portfolio WHERE barber_id = barbers.id) AS photos_count
+                        barbers.photos_count
                     FROM 
                         barbers
                     JOIN 
@@ -327,92 +549,84 @@ class DatabaseManager:
                         'photos_count': result[12] or 0                     # Количество фото
                     }
         return None
+
     @staticmethod
     def get_barber_photos(barber_id):
+        """file_id фото портфолио по порядку; None — если БД недоступна"""
         with Database() as db:
             if db.connect():
-                return db.execute(
+                result = db.execute(
                     "SELECT photo_url FROM barber_portfolio WHERE barber_id = %s ORDER BY position",
                     (barber_id,)
                 )
-        return []
+                return None if result is False else result
+        return None
 
     @staticmethod
     def insert_barber_portfolio(barber_id, photo_url, position):
-        with Database() as db:
-            if db.connect():
-                return db.execute(
-                    """
-                    INSERT INTO barber_portfolio (barber_id, photo_url, position)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (barber_id, photo_url, position)
-                )
+        def work(db):
+            db.execute(
+                """
+                INSERT INTO barber_portfolio (barber_id, photo_url, position)
+                VALUES (%s, %s, %s)
+                """,
+                (barber_id, photo_url, position)
+            )
+            db.execute(
+                "UPDATE barbers SET photos_count = photos_count + 1 WHERE id = %s",
+                (barber_id,)
+            )
+            db.after_commit(lambda: DatabaseManager.notify_barber_changed(barber_id))
+            return True
+
+        return Database.atomic(work)
 
     @staticmethod
     def delete_barber_portfolio(barber_id):
-        with Database() as db:
-            if db.connect():
-                return db.execute(
-                    "DELETE FROM barber_portfolio WHERE barber_id = %s",
-                    (barber_id,)
-                )
+        def work(db):
+            db.execute("DELETE FROM barber_portfolio WHERE barber_id = %s", (barber_id,))
+            db.execute("UPDATE barbers SET photos_count = 0 WHERE id = %s", (barber_id,))
+            db.after_commit(lambda: DatabaseManager.notify_barber_changed(barber_id))
+            return True
+
+        return Database.atomic(work)
 
     @staticmethod
     def get_city_id_by_name(city_name):
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT id FROM cities WHERE LOWER(name) = %s",
-                    (city_name.lower(),),
-                    fetch_one=True
-                )
-                return result[0] if result else None
+        return DatabaseManager.reference_data().city_id(city_name)
 
     @staticmethod
     def get_category_id_by_type(category_type):
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT id FROM haircut_categories WHERE type = %s",
-                    (category_type,),
-                    fetch_one=True
-                )
-                return result[0] if result else None
+        return DatabaseManager.reference_data().category_id(category_type)
 
     @staticmethod
     def insert_barber_service(barber_id, category_id, name, price):
         with Database() as db:
             if db.connect():
-                return db.execute(
+                result = db.execute(
                     """
                     INSERT INTO barber_services (barber_id, category_id, name, price)
                     VALUES (%s, %s, %s, %s)
                     """,
                     (barber_id, category_id, name, price)
                 )
+                DatabaseManager.notify_barber_changed(barber_id)
+                return result
 
     @staticmethod
     def delete_barber_services(barber_id):
         with Database() as db:
             if db.connect():
-                return db.execute(
+                result = db.execute(
                     "DELETE FROM barber_services WHERE barber_id = %s",
                     (barber_id,)
                 )
+                DatabaseManager.notify_barber_changed(barber_id)
+                return result
 
     @staticmethod
     def is_user_banned(user_id):
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT status FROM barbers WHERE user_id = %s",
-                    (user_id,),
-                    fetch_one=True
-                )
-                if result and result[0] == "banned":
-                    return True
-        return False
+        return DatabaseManager.get_user_context(user_id).barber_status == "banned"
 
     @staticmethod
     def get_barber_by_id(barber_id):
@@ -429,7 +643,7 @@ class DatabaseManager:
                         barbers.instagram, 
                         barbers.whatsapp, 
                         barbers.telegram,
-                        (SELECT COUNT(*) FROM barber_portfolio WHERE barber_portfolio.barber_id = barbers.id) AS photos_count,
+                        barbers.photos_count,
                         users.first_name,
                         barbers.description
                     FROM 
@@ -474,43 +688,31 @@ class DatabaseManager:
 
     @staticmethod
     def get_barber_status(user_id):
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT status FROM barbers WHERE user_id = %s",
-                    (user_id,),
-                    fetch_one=True
-                )
-                return result[0] if result else None
-        return None
+        return DatabaseManager.get_user_context(user_id).barber_status
 
     @staticmethod
     def get_all_cities():
-        with Database() as db:
-            if db.connect():
-                results = db.execute(
-                    "SELECT name FROM cities WHERE is_active = 1"
-                )
-                return [row[0] for row in results] if results else []
+        return list(DatabaseManager.reference_data().active_cities)
 
     @staticmethod
     def save_user_city_selection(user_id, city_id):
-        with Database() as db:
-            if db.connect():
-                db.execute(
-                    "DELETE FROM user_city_selections WHERE user_id = %s",
-                    (user_id,)
-                )
-                return db.execute(
-                    "INSERT INTO user_city_selections (user_id, city_id) VALUES (%s, %s)",
-                    (user_id, city_id)
-                )
+        context.invalidate(user_id)
+
+        def work(db):
+            db.execute("DELETE FROM user_city_selections WHERE user_id = %s", (user_id,))
+            return db.execute(
+                "INSERT INTO user_city_selections (user_id, city_id) VALUES (%s, %s)",
+                (user_id, city_id)
+            )
+
+        return Database.atomic(work)
 
     @staticmethod
     def get_active_barbers(page=0, per_page=10, city_id=None):
         with Database() as db:
             if db.connect():
                 offset = page * per_page
+                rating = DatabaseManager.rating_sort_key
                 query = """
                     SELECT 
                         barbers.id, 
@@ -521,7 +723,7 @@ class DatabaseManager:
                         barbers.instagram, 
                         barbers.whatsapp, 
                         barbers.telegram,
-                        (SELECT COUNT(*) FROM barber_portfolio WHERE barber_portfolio.barber_id = barbers.id) AS photos_count,
+                        barbers.photos_count,
                         users.first_name
                     FROM 
                         barbers
@@ -536,81 +738,131 @@ class DatabaseManager:
                 if city_id:
                     query += " AND barbers.city_id = %s"
                     params.append(city_id)
-                query += " LIMIT %s OFFSET %s"
+                query += f" ORDER BY {rating} DESC, barbers.id LIMIT %s OFFSET %s"
                 params.extend([per_page, offset])
                 return db.execute(query, tuple(params))
         return []
 
     @staticmethod
-    def get_user_city_selection(user_id):
+    def get_active_barbers_page(city_id=None, cursor=None, backward=False, per_page=10):
+        """Активные барберы с пагинацией по ключу (rating DESC, id).
+
+        cursor — (rating, id) крайней строки соседней страницы, None — начало списка.
+        backward=True — страница перед cursor.
+        Возвращает (rows, has_more): has_more — есть ли ещё строки в направлении движения.
+        В конце каждой строки — рейтинг (ключ для следующего курсора).
+        """
         with Database() as db:
             if db.connect():
-                result = db.execute(
-                    "SELECT city_id FROM user_city_selections WHERE user_id = %s ORDER BY selected_at DESC LIMIT 1",
-                    (user_id,),
-                    fetch_one=True
-                )
-                return result[0] if result else None
-        return None
+                rating = DatabaseManager.rating_sort_key
+                query = f"""
+                    SELECT 
+                        barbers.id, 
+                        barbers.user_id, 
+                        users.username, 
+                        cities.name AS city_name, 
+                        barbers.experience_years, 
+                        barbers.instagram, 
+                        barbers.whatsapp, 
+                        barbers.telegram,
+                        barbers.photos_count,
+                        users.first_name,
+                        {rating} AS sort_rating
+                    FROM 
+                        barbers
+                    JOIN 
+                        users ON barbers.user_id = users.telegram_id
+                    JOIN 
+                        cities ON barbers.city_id = cities.id
+                    WHERE 
+                        barbers.status = 'active'
+                """
+                params = []
+                if city_id:
+                    query += " AND barbers.city_id = %s"
+                    params.append(city_id)
+
+                # Вперёд: рейтинг ниже или тот же рейтинг и id больше; назад — наоборот
+                if cursor:
+                    cursor_rating, barber_id = cursor
+                    rating_op, id_op = ('>', '<') if backward else ('<', '>')
+                    query += f"""
+                        AND ({rating} {rating_op} %s
+                             OR ({rating} = %s AND barbers.id {id_op} %s))
+                    """
+                    params.extend([cursor_rating, cursor_rating, barber_id])
+
+                if backward:
+                    query += f" ORDER BY {rating} ASC, barbers.id DESC LIMIT %s"
+                else:
+                    query += f" ORDER BY {rating} DESC, barbers.id ASC LIMIT %s"
+                params.append(per_page + 1)
+
+                rows = db.execute(query, tuple(params)) or []
+                has_more = len(rows) > per_page
+                rows = rows[:per_page]
+                if backward:
+                    rows.reverse()
+                return rows, has_more
+        return [], False
+
+    @staticmethod
+    def get_user_city_selection(user_id):
+        return DatabaseManager.get_user_context(user_id).city_id
 
     @staticmethod
     def toggle_barber_visibility(user_id):
         """Переключает статус видимости анкеты барбера"""
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT status FROM barbers WHERE user_id = %s",
-                    (user_id,),
-                    fetch_one=True
-                )
-                if not result:
-                    return None
-                current_status = result[0]
-                new_status = 'hidden' if current_status == 'active' else 'active'
-                db.execute(
-                    "UPDATE barbers SET status = %s WHERE user_id = %s",
-                    (new_status, user_id)
-                )
-                return new_status
-        return None
+        context.invalidate(user_id)
+
+        def work(db):
+            result = db.execute(
+                "SELECT id, status FROM barbers WHERE user_id = %s FOR UPDATE",
+                (user_id,),
+                fetch_one=True
+            )
+            if not result:
+                return None
+            barber_id, current_status = result
+            new_status = 'hidden' if current_status == 'active' else 'active'
+            db.execute(
+                "UPDATE barbers SET status = %s WHERE id = %s",
+                (new_status, barber_id)
+            )
+            db.after_commit(lambda: DatabaseManager.notify_barber_changed(barber_id))
+            return new_status
+
+        return Database.atomic(work, default=None)
 
     @staticmethod
     def get_barber_visibility_status(user_id):
         """Возвращает текущий статус видимости анкеты"""
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT status FROM barbers WHERE user_id = %s",
-                    (user_id,),
-                    fetch_one=True
-                )
-                return result[0] if result else None
-        return None
+        return DatabaseManager.get_user_context(user_id).barber_status
 
     @staticmethod
     def update_barber_status_by_user_id(user_id, new_status):
         """Обновляет статус анкеты барбера по user_id"""
-        with Database() as db:
-            if db.connect():
-                return db.execute(
-                    "UPDATE barbers SET status = %s WHERE user_id = %s",
-                    (new_status, user_id)
-                )
-        return False
+        context.invalidate(user_id)
+
+        def work(db):
+            barber = db.execute(
+                "SELECT id FROM barbers WHERE user_id = %s FOR UPDATE",
+                (user_id,),
+                fetch_one=True
+            )
+            result = db.execute(
+                "UPDATE barbers SET status = %s WHERE user_id = %s",
+                (new_status, user_id)
+            )
+            db.after_commit(lambda: DatabaseManager.notify_barber_changed(barber[0] if barber else None))
+            return result
+
+        return Database.atomic(work)
 
     @staticmethod
     def get_filtered_barbers(city_id, max_price=None, specialization_num=None, metro_id=None):
         """Возвращает отфильтрованных барберов с возможностью фильтрации по метро"""
-        spec_map = {
-            1: ['beard'],
-            2: ['long'],
-            3: ['short'],
-            4: ['beard', 'short'],
-            5: ['beard', 'long'],
-            6: ['long', 'short'],
-            7: ['beard', 'long', 'short'],
-        }
-        specs = spec_map.get(specialization_num, []) if specialization_num else []
+        specs = SPECIALIZATION_FILTERS.get(specialization_num, []) if specialization_num else []
 
         with Database() as db:
             if db.connect():
@@ -618,7 +870,7 @@ class DatabaseManager:
                     SELECT 
                         b.id, b.user_id, u.username, c.name AS city_name, 
                         b.experience_years, b.instagram, b.whatsapp, b.telegram,
-                        (SELECT COUNT(*) FROM barber_portfolio WHERE barber_id = b.id) AS photos_count,
+                        b.photos_count,
                         u.first_name,
                         m.name as metro_name
                     FROM 
@@ -660,45 +912,98 @@ class DatabaseManager:
         return []
 
     @staticmethod
-    def get_haircuts_by_category(category_id):
+    def get_search_index_data(barber_ids=None):
+        """Данные для поискового индекса (managers/search.py).
+
+        Возвращает (barbers, prices): barbers — активные барберы в формате
+        get_filtered_barbers + city_id и metro_id в конце; prices — (barber_id, тип категории,
+        минимальная цена). barber_ids ограничивает выборку указанными барберами.
+        """
         with Database() as db:
             if db.connect():
-                return db.execute(
-                    "SELECT id, name FROM haircut_guide WHERE category_id = %s",
-                    (category_id,)
+                id_filter = ""
+                params = ()
+                if barber_ids:
+                    id_filter = f" AND b.id IN ({','.join(['%s'] * len(barber_ids))})"
+                    params = tuple(barber_ids)
+
+                barbers = db.execute(
+                    """
+                    SELECT 
+                        b.id, b.user_id, u.username, c.name AS city_name, 
+                        b.experience_years, b.instagram, b.whatsapp, b.telegram,
+                        b.photos_count,
+                        u.first_name,
+                        m.name AS metro_name,
+                        b.city_id,
+                        b.metro_id
+                    FROM 
+                        barbers b
+                    JOIN 
+                        users u ON b.user_id = u.telegram_id
+                    JOIN 
+                        cities c ON b.city_id = c.id
+                    LEFT JOIN
+                        metro_stations m ON b.metro_id = m.id
+                    WHERE 
+                        b.status = 'active'
+                    """ + id_filter,
+                    params
                 )
-        return []
+                prices = db.execute(
+                    """
+                    SELECT bs.barber_id, hc.type, MIN(bs.price)
+                    FROM barber_services bs
+                    JOIN haircut_categories hc ON bs.category_id = hc.id
+                    JOIN barbers b ON bs.barber_id = b.id
+                    WHERE b.status = 'active'
+                    """ + id_filter + """
+                    GROUP BY bs.barber_id, hc.type
+                    """,
+                    params
+                )
+                if barbers is not False and prices is not False:
+                    return barbers, prices
+        return None
 
     @staticmethod
-    def get_haircut_details(haircut_id):
+    def get_guide_rows():
+        """Справочник стрижек целиком: (категории, стрижки, фото); None — если БД недоступна"""
         with Database() as db:
             if db.connect():
-                result = db.execute(
-                    """SELECT hg.name, hg.description, hg.styling_tips, hc.type 
+                categories = db.execute("SELECT id, type FROM haircut_categories ORDER BY id")
+                haircuts = db.execute(
+                    """SELECT hg.id, hc.type, hg.name, hg.description, hg.styling_tips
                     FROM haircut_guide hg
                     JOIN haircut_categories hc ON hg.category_id = hc.id
-                    WHERE hg.id = %s""",
-                    (haircut_id,),
-                    fetch_one=True
+                    ORDER BY hg.id"""
                 )
-                if result:
-                    return {
-                        'name': result[0],
-                        'description': result[1],
-                        'styling_tips': result[2],
-                        'category_type': result[3]
-                    }
+                photos = db.execute(
+                    "SELECT haircut_id, photo_url FROM haircut_guide_photos "
+                    "ORDER BY haircut_id, is_primary DESC, id"
+                )
+                if categories is not False and haircuts is not False and photos is not False:
+                    return categories, haircuts, photos
         return None
 
     @staticmethod
-    def get_haircut_photos(haircut_id):
+    def get_guide_fingerprint():
+        """Контрольная сумма таблиц справочника стрижек: меняется при любой правке строк"""
         with Database() as db:
             if db.connect():
-                return db.execute(
-                    "SELECT photo_url FROM haircut_guide_photos WHERE haircut_id = %s",
-                    (haircut_id,)
+                result = db.execute(
+                    """SELECT
+                        (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', id, type))), 0)
+                         FROM haircut_categories),
+                        (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', id, category_id, name, description, styling_tips))), 0)
+                         FROM haircut_guide),
+                        (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', id, haircut_id, photo_url, is_primary))), 0)
+                         FROM haircut_guide_photos)""",
+                    fetch_one=True
                 )
-        return []
+                if result:
+                    return tuple(int(value) for value in result)
+        return None
 
     @staticmethod
     def is_barber_favorite(client_id, barber_id):
@@ -716,21 +1021,20 @@ class DatabaseManager:
     @staticmethod
     def toggle_favorite(client_id, barber_id):
         """Добавляет/удаляет барбера из избранного"""
-        with Database() as db:
-            if db.connect():
-                if DatabaseManager.is_barber_favorite(client_id, barber_id):
-                    # Удаляем из избранного
-                    return db.execute(
-                        "DELETE FROM favorites WHERE client_id = %s AND barber_id = %s",
-                        (client_id, barber_id)
-                    )
-                else:
-                    # Добавляем в избранное
-                    return db.execute(
-                        "INSERT INTO favorites (client_id, barber_id) VALUES (%s, %s)",
-                        (client_id, barber_id)
-                    )
-        return False
+        def work(db):
+            # Удаляем из избранного; если удалять было нечего — добавляем
+            db.execute(
+                "DELETE FROM favorites WHERE client_id = %s AND barber_id = %s",
+                (client_id, barber_id)
+            )
+            if db.rowcount:
+                return True
+            return db.execute(
+                "INSERT INTO favorites (client_id, barber_id) VALUES (%s, %s)",
+                (client_id, barber_id)
+            )
+
+        return Database.atomic(work)
 
     @staticmethod
     def get_favorite_barbers(user_id):
@@ -750,9 +1054,9 @@ class DatabaseManager:
                     b.experience_years,
                     b.status,
                     u.first_name as barber_first_name,
-                    (SELECT COUNT(*) FROM barber_portfolio WHERE barber_id = b.id) AS photos_count,
-                    (SELECT AVG(rating) FROM reviews WHERE barber_id = b.id) AS avg_rating,
-                    (SELECT COUNT(*) FROM reviews WHERE barber_id = b.id) AS reviews_count
+                    b.photos_count,
+                    b.avg_rating,
+                    b.reviews_count
                 FROM 
                     barbers b
                 JOIN 
@@ -787,47 +1091,88 @@ class DatabaseManager:
                         'reviews_count': row[13]
                     } for row in results]
         return []
+
     @staticmethod
     def add_review(barber_id, client_id, rating, comment=None):
-        with Database() as db:
-            if db.connect():
-                db.execute(
-                    "INSERT INTO reviews (barber_id, client_id, rating, comment) VALUES (%s, %s, %s, %s)",
-                    (barber_id, client_id, rating, comment)
-                )
-                # После добавления отзыва обновляем средний рейтинг
-                DatabaseManager.update_barber_average_rating(barber_id)
-                return True
-        return False
+        """Отзыв клиента о барбере; повторный отзыв того же клиента заменяет прежний
+        (уникальный ключ reviews (barber_id, client_id), см. add_barber_rating)"""
+        return DatabaseManager.add_barber_rating(barber_id, client_id, rating, comment)
 
     @staticmethod
     def update_barber_average_rating(barber_id):
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT AVG(rating) FROM reviews WHERE barber_id = %s",
-                    (barber_id,),
-                    fetch_one=True
-                )
-                avg_rating = float(result[0]) if result and result[0] is not None else 0.0
-                db.execute(
-                    "UPDATE barbers SET rating = %s WHERE id = %s",
-                    (avg_rating, barber_id)
-                )
-                return avg_rating
-        return 0.0
+        """Пересчитывает avg_rating/reviews_count (и rating) барбера по его отзывам"""
+        return Database.atomic(
+            lambda db: DatabaseManager._refresh_barber_rating(db, barber_id),
+            default=0.0
+        )
+
+    @staticmethod
+    def _refresh_barber_rating(db, barber_id):
+        """Пересчёт рейтинга внутри уже открытой транзакции db; возвращает avg_rating"""
+        # В UPDATE MySQL присваивания выполняются слева направо,
+        # поэтому rating получает уже новое значение avg_rating
+        db.execute(
+            """
+            UPDATE barbers SET
+                reviews_count = (SELECT COUNT(*) FROM reviews WHERE barber_id = %s),
+                avg_rating = (SELECT ROUND(AVG(rating), 2) FROM reviews WHERE barber_id = %s),
+                rating = COALESCE(avg_rating, 0)
+            WHERE id = %s
+            """,
+            (barber_id, barber_id, barber_id)
+        )
+        db.after_commit(lambda: DatabaseManager.notify_barber_changed(barber_id))
+        result = db.execute(
+            "SELECT avg_rating FROM barbers WHERE id = %s",
+            (barber_id,),
+            fetch_one=True
+        )
+        return float(result[0]) if result and result[0] is not None else 0.0
 
     @staticmethod
     def add_barber_rating(barber_id, client_id, rating, comment=None):
+        def work(db):
+            db.execute(
+                """
+                INSERT INTO reviews (barber_id, client_id, rating, comment)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE rating=%s, comment=%s
+                """,
+                (barber_id, client_id, rating, comment, rating, comment)
+            )
+            DatabaseManager._refresh_barber_rating(db, barber_id)
+            return True
+
+        return Database.atomic(work)
+
+    @staticmethod
+    def reconcile_barber_aggregates():
+        """Исправляет расхождения photos_count/reviews_count/avg_rating с исходными таблицами"""
         with Database() as db:
             if db.connect():
                 return db.execute(
                     """
-                    INSERT INTO reviews (barber_id, client_id, rating, comment)
-                    VALUES (%s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE rating=%s, comment=%s
-                    """,
-                    (barber_id, client_id, rating)
+                    UPDATE barbers b
+                    LEFT JOIN (
+                        SELECT barber_id, COUNT(*) AS cnt
+                        FROM barber_portfolio
+                        GROUP BY barber_id
+                    ) p ON p.barber_id = b.id
+                    LEFT JOIN (
+                        SELECT barber_id, COUNT(*) AS cnt, ROUND(AVG(rating), 2) AS avg_rating
+                        FROM reviews
+                        GROUP BY barber_id
+                    ) r ON r.barber_id = b.id
+                    SET
+                        b.photos_count = COALESCE(p.cnt, 0),
+                        b.reviews_count = COALESCE(r.cnt, 0),
+                        b.avg_rating = r.avg_rating,
+                        b.rating = COALESCE(r.avg_rating, 0)
+                    WHERE
+                        b.photos_count <> COALESCE(p.cnt, 0)
+                        OR b.reviews_count <> COALESCE(r.cnt, 0)
+                        OR NOT (b.avg_rating <=> r.avg_rating)
+                    """
                 )
         return False
 
@@ -836,46 +1181,37 @@ class DatabaseManager:
         with Database() as db:
             if db.connect():
                 result = db.execute(
-                    "SELECT AVG(rating), COUNT(*) FROM reviews WHERE barber_id = %s",
+                    "SELECT avg_rating, reviews_count FROM barbers WHERE id = %s",
                     (barber_id,),
                     fetch_one=True
                 )
                 if result:
                     avg, count = result
-                    return (round(avg, 2) if avg else None, count)
+                    return (round(avg, 2) if count and avg is not None else None, count or 0)
         return (None, 0)
 
     @staticmethod
     def get_barber_rating(barber_id):
         """Получает средний рейтинг барбера по отзывам"""
-        cursor = None
-        try:
-            cursor = DatabaseManager.connection.cursor()
-            cursor.execute("SELECT AVG(rating) FROM reviews WHERE barber_id = %s", (barber_id,))
-            result = cursor.fetchone()
-            return float(result[0]) if result and result[0] is not None else None
-        except Exception as e:
-            logger.error(f"Ошибка при получении рейтинга: {str(e)}")
-            return None
-        finally:
-            if cursor:
-                cursor.close()
+        with Database() as db:
+            if db.connect():
+                result = db.execute(
+                    "SELECT AVG(rating) FROM reviews WHERE barber_id = %s",
+                    (barber_id,),
+                    fetch_one=True
+                )
+                if result is False:
+                    DatabaseManager.logger.error(f"Не удалось получить рейтинг барбера {barber_id}")
+                    return None
+                return float(result[0]) if result and result[0] is not None else None
+        return None
 
     @staticmethod
     def get_city_name_by_id(city_id):
         """
         Возвращает название города по его city_id.
         """
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT name FROM cities WHERE id = ?",
-                    (city_id,)
-                )
-                if result and len(result) > 0:
-                    # Если используете fetchone, то result[0] — кортеж (name,)
-                    return result[0][0]
-        return None
+        return DatabaseManager.reference_data().city_name(city_id)
 
     @staticmethod
     def get_barber_portfolio(barber_id):
@@ -903,30 +1239,12 @@ class DatabaseManager:
     @staticmethod
     def city_has_metro(city_id):
         """Проверяет наличие метро в городе"""
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT COUNT(*) FROM metro_stations "
-                    "WHERE city_id = %s AND is_active = 1",
-                    (city_id,),
-                    fetch_one=True
-                )
-                return result[0] > 0 if result else False
-        return False
+        return DatabaseManager.reference_data().has_metro(city_id)
 
     @staticmethod
     def get_metro_id_by_name(city_id, metro_name):
         """Ищет ID станции метро по названию"""
-        with Database() as db:
-            if db.connect():
-                result = db.execute(
-                    "SELECT id FROM metro_stations "
-                    "WHERE city_id = %s AND name = %s AND is_active = 1",
-                    (city_id, metro_name),
-                    fetch_one=True
-                )
-                return result[0] if result else None
-        return None
+        return DatabaseManager.reference_data().metro_id(city_id, metro_name)
 
     # В классе DatabaseManager добавим:
     @staticmethod
@@ -1,29 +1,135 @@
+import logging
+import threading
+from types import MappingProxyType
 from telebot import types
 from managers.database import DatabaseManager
-from managers.keyboard import KeyboardManager
+from managers.keyboard import KeyboardManager, FrozenMarkup
 from config.constants import HAIRCUT_TYPES
+from core.router import router
+from managers.media import media_cache
+
+logger = logging.getLogger(__name__)
+
+
+class GuideHaircut:
+    """Готовая карточка стрижки: подпись, кнопка «Назад» и file_id фото"""
+
+    def __init__(self, haircut_id, category_type, name, styling_tips, photos):
+        self.id = haircut_id
+        self.category_type = category_type
+        self.name = name
+        self.photos = tuple(photos)
+        self.text = (
+            f"✂️ <b>{name}</b>\n\n"
+            f"<b>Советы по укладке:</b>\n{styling_tips or 'Нет советов'}"
+        )
+        markup = types.InlineKeyboardMarkup()
+        markup.add(types.InlineKeyboardButton(
+            "🔙 Назад",
+            callback_data=f"guide_category_{category_type}"
+        ))
+        self.markup = FrozenMarkup(markup)
+
+
+class GuideContent:
+    """Неизменяемый снимок справочника стрижек с готовыми клавиатурами.
+
+    Строится из DatabaseManager.get_guide_rows() и целиком заменяется при
+    обновлении, поэтому просмотр справочника не обращается к БД.
+    fingerprint — контрольная сумма таблиц, по которой снимок был собран.
+    """
+
+    def __init__(self, categories=(), haircuts=(), photos=(), fingerprint=None):
+        # categories: (id, type); haircuts: (id, category_type, name, description, styling_tips);
+        # photos: (haircut_id, file_id)
+        self.fingerprint = fingerprint
+        self.category_types = frozenset(category_type for _, category_type in categories)
+        self.categories_markup = KeyboardManager.get_guide_categories()
+
+        photos_by_haircut = {}
+        for haircut_id, file_id in photos:
+            photos_by_haircut.setdefault(haircut_id, []).append(file_id)
+
+        by_id = {}
+        by_category = {}
+        for haircut_id, category_type, name, _, styling_tips in haircuts:
+            by_id[haircut_id] = GuideHaircut(
+                haircut_id, category_type, name, styling_tips, photos_by_haircut.get(haircut_id, ())
+            )
+            by_category.setdefault(category_type, []).append((haircut_id, name))
+
+        self.haircuts = MappingProxyType(by_id)
+        self.haircuts_markups = MappingProxyType({
+            category_type: KeyboardManager.get_haircuts_keyboard(items)
+            for category_type, items in by_category.items()
+        })
+
+    def haircut(self, haircut_id):
+        return self.haircuts.get(haircut_id)
+
+    def photos(self, haircut_id):
+        haircut = self.haircuts.get(haircut_id)
+        return haircut.photos if haircut else ()
+
+
+_content = None
+_content_lock = threading.Lock()
+
 
 class GuideManager:
+    @staticmethod
+    def content():
+        """Текущий снимок справочника; при первом обращении загружает его из БД"""
+        content = _content
+        if content is None:
+            GuideManager.reload_content(force=True)
+            content = _content
+        return content if content is not None else GuideContent()
+
+    @staticmethod
+    def reload_content(force=False):
+        """Перечитывает справочник, если он изменился в БД (force — в любом случае).
+
+        Новый снимок подменяет старый одной операцией присваивания. False —
+        БД недоступна, тогда остаётся прежний снимок.
+        """
+        global _content
+        with _content_lock:
+            # Сумма считается до чтения строк: правка между запросами
+            # даст другую сумму, и снимок перечитается при следующей проверке
+            fingerprint = DatabaseManager.get_guide_fingerprint()
+            if fingerprint is None:
+                logger.error("Не удалось проверить справочник стрижек")
+                return False
+            if not force and _content is not None and _content.fingerprint == fingerprint:
+                return True
+            rows = DatabaseManager.get_guide_rows()
+            if rows is None:
+                logger.error("Не удалось обновить справочник стрижек")
+                return False
+            _content = GuideContent(*rows, fingerprint=fingerprint)
+            media_cache.invalidate('haircut')
+        logger.info(f"Справочник стрижек загружен: {len(_content.haircuts)} стрижек")
+        return True
+
     @staticmethod
     def show_categories(bot, chat_id):
-        markup = KeyboardManager.get_guide_categories()
         bot.send_message(
             chat_id,
             "📚 Выберите категорию стрижек:",
-            reply_markup=markup
+            reply_markup=GuideManager.content().categories_markup
         )
 
     @staticmethod
     def show_haircuts(bot, chat_id, category_type):
-        category_id = DatabaseManager.get_category_id_by_type(category_type)
-        if not category_id:
+        content = GuideManager.content()
+        if category_type not in content.category_types:
             return bot.send_message(chat_id, "❌ Категория не найдена")
 
-        haircuts = DatabaseManager.get_haircuts_by_category(category_id)
-        if not haircuts:
+        markup = content.haircuts_markups.get(category_type)
+        if markup is None:
             return bot.send_message(chat_id, "❌ В этой категории пока нет стрижек")
 
-        markup = KeyboardManager.get_haircuts_keyboard(haircuts)
         bot.send_message(
             chat_id,
             f"✂️ Выберите стрижку из категории '{HAIRCUT_TYPES.get(category_type, '')}':",
@@ -32,50 +138,39 @@ class GuideManager:
 
     @staticmethod
     def show_haircut_details(bot, chat_id, haircut_id):
-        haircut = DatabaseManager.get_haircut_details(haircut_id)
+        haircut = GuideManager.content().haircut(haircut_id)
         if not haircut:
             return bot.send_message(chat_id, "❌ Стрижка не найдена")
 
-        photos = DatabaseManager.get_haircut_photos(haircut_id)
-        text = (
-            f"✂️ <b>{haircut['name']}</b>\n\n"
-           
-            f"<b>Советы по укладке:</b>\n{haircut['styling_tips'] or 'Нет советов'}"
-        )
-
-        markup = types.InlineKeyboardMarkup()
-        markup.add(types.InlineKeyboardButton(
-            "🔙 Назад",
-            callback_data=f"guide_category_{haircut['category_type']}"
-        ))
-
-        if photos:
-            try:
-                media = [types.InputMediaPhoto(photos[0][0], caption=text, parse_mode='HTML')]
-                for photo in photos[1:]:
-                    media.append(types.InputMediaPhoto(photo[0]))
-                bot.send_media_group(chat_id, media)
-                bot.send_message(chat_id, "Выберите действие:", reply_markup=markup)
-            except Exception as e:
-                print(f"Ошибка отправки фото: {e}")
-                bot.send_message(chat_id, text, reply_markup=markup, parse_mode='HTML')
-        else:
-            bot.send_message(chat_id, text, reply_markup=markup, parse_mode='HTML')
+        try:
+            if media_cache.send(bot, chat_id, 'haircut', haircut_id, caption=haircut.text, parse_mode='HTML'):
+                bot.send_message(chat_id, "Выберите действие:", reply_markup=haircut.markup)
+            else:
+                bot.send_message(chat_id, haircut.text, reply_markup=haircut.markup, parse_mode='HTML')
+        except Exception as e:
+            print(f"Ошибка отправки фото: {e}")
+            bot.send_message(chat_id, haircut.text, reply_markup=haircut.markup, parse_mode='HTML')
 
     @staticmethod
     def init_handlers(bot):
-        @bot.message_handler(func=lambda msg: msg.text == "📚 Справочник")
+        @router.text("📚 Справочник")
         def handle_guide(message):
             GuideManager.show_categories(bot, message.chat.id)
 
-        @bot.callback_query_handler(func=lambda call: call.data.startswith("guide_"))
-        def handle_guide_callback(call):
-            if call.data.startswith("guide_category_"):
-                category_type = call.data.split("_")[2]
-                GuideManager.show_haircuts(bot, call.message.chat.id, category_type)
-            elif call.data.startswith("guide_haircut_"):
-                haircut_id = int(call.data.split("_")[2])
-                GuideManager.show_haircut_details(bot, call.message.chat.id, haircut_id)
-            elif call.data == "guide_back_to_categories":
-                GuideManager.show_categories(bot, call.message.chat.id)
-            bot.answer_callback_query(call.id)
\ No newline at end of file
+        @router.callback_prefix("guide_category_")
+        def handle_guide_category(call, args):
+            GuideManager.show_haircuts(bot, call.message.chat.id, args[0])
+            bot.answer_callback_query(call.id)
+
+        @router.callback_prefix("guide_haircut_")
+        def handle_guide_haircut(call, args):
+            GuideManager.show_haircut_details(bot, call.message.chat.id, int(args[0]))
+            bot.answer_callback_query(call.id)
+
+        @router.callback("guide_back_to_categories")
+        def handle_guide_back(call, args):
+            GuideManager.show_categories(bot, call.message.chat.id)
+            bot.answer_callback_query(call.id)
+
+
+media_cache.register_loader('haircut', lambda haircut_id: GuideManager.content().photos(haircut_id))
@@ -1,19 +1,52 @@
+import functools
 from telebot import types
 from config.constants import SERVICES, HAIRCUT_TYPES
-from managers.database import DatabaseManager
+
+
+class FrozenMarkup(types.JsonSerializable):
+    """Клавиатура, сериализованная в JSON один раз.
+
+    telebot вызывает to_json() у reply_markup при каждой отправке; готовая
+    строка избавляет от повторной сборки и сериализации кнопок.
+    """
+
+    def __init__(self, markup):
+        self._json = markup.to_json()
+
+    def to_json(self):
+        return self._json
+
+
+def frozen_markup(builder):
+    """Запоминает клавиатуру для каждого набора аргументов (они должны быть хешируемыми)"""
+    @functools.lru_cache(maxsize=None)
+    @functools.wraps(builder)
+    def wrapper(*args):
+        return FrozenMarkup(builder(*args))
+    return wrapper
+
 
 class KeyboardManager:
     @staticmethod
-    def main_menu(active_role: str, roles_count: int, is_admin: bool, is_barber_filled: bool = False, user_id: int = None):
+    def main_menu(active_role: str, roles_count: int, is_admin: bool, is_barber_filled: bool = False,
+                  barber_status: str = None):
+        """Главное меню; barber_status (из UserContext) определяет кнопку «Скрыть/Показать анкету»"""
+        visibility = barber_status if barber_status in ('active', 'hidden') else None
+        return KeyboardManager._main_menu(
+            active_role, roles_count > 1, bool(is_admin), bool(is_barber_filled), visibility
+        )
+
+    @staticmethod
+    @frozen_markup
+    def _main_menu(active_role, has_several_roles, is_admin, is_barber_filled, visibility):
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
 
         if active_role == 'barber':
             if is_barber_filled:
                 markup.add(types.KeyboardButton("👤 Моя анкета"))  # Добавлена кнопка "Моя анкета"
                 markup.add(types.KeyboardButton("✏️ Редактировать анкету"))
-                current_status = DatabaseManager.get_barber_visibility_status(user_id)
-                if current_status in ['active', 'hidden']:
-                    btn_text = "👁️ Скрыть анкету" if current_status == 'active' else "👁️ Показать анкету"
+                if visibility:
+                    btn_text = "👁️ Скрыть анкету" if visibility == 'active' else "👁️ Показать анкету"
                     markup.add(types.KeyboardButton(btn_text))
             else:
                 markup.add(types.KeyboardButton("📝 Заполнить анкету барбера"))
@@ -28,9 +61,9 @@ class KeyboardManager:
             markup.add(types.KeyboardButton("📝 Ждущие анкеты"))
 
         role_buttons = []
-        if roles_count > 1:
+        if has_several_roles:
             role_buttons.append(types.KeyboardButton("🔄 Сменить роль"))
-        if roles_count < 2 or is_admin:
+        if not has_several_roles or is_admin:
             role_buttons.append(types.KeyboardButton("➕ Добавить роль"))
 
         if role_buttons:
@@ -39,6 +72,7 @@ class KeyboardManager:
         return markup
 
     @staticmethod
+    @frozen_markup
     def profile_management_keyboard():
         """Клавиатура для управления анкетой (редактировать/удалить)"""
         markup = types.InlineKeyboardMarkup()
@@ -50,6 +84,7 @@ class KeyboardManager:
         return markup
 
     @staticmethod
+    @frozen_markup
     def confirm_delete_keyboard():
         """Клавиатура подтверждения удаления анкеты"""
         markup = types.InlineKeyboardMarkup()
@@ -60,12 +95,14 @@ class KeyboardManager:
         return markup
 
     @staticmethod
+    @frozen_markup
     def admin_main_keyboard():
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         markup.add(types.KeyboardButton("📝 Ждущие анкеты"))
         return markup
 
     @staticmethod
+    @frozen_markup
     def role_selection_keyboard():
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         markup.add(
@@ -76,6 +113,11 @@ class KeyboardManager:
 
     @staticmethod
     def available_roles_keyboard(available_roles: list, is_admin: bool):
+        return KeyboardManager._available_roles_keyboard(tuple(available_roles), bool(is_admin))
+
+    @staticmethod
+    @frozen_markup
+    def _available_roles_keyboard(available_roles, is_admin):
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         for role in available_roles:
             if role == 'client':
@@ -91,6 +133,11 @@ class KeyboardManager:
 
     @staticmethod
     def switch_role_keyboard(roles: list, active_role: str, is_admin: bool):
+        return KeyboardManager._switch_role_keyboard(tuple(roles), active_role, bool(is_admin))
+
+    @staticmethod
+    @frozen_markup
+    def _switch_role_keyboard(roles, active_role, is_admin):
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         for role in roles:
             if role == 'client' and role != active_role:
@@ -105,12 +152,14 @@ class KeyboardManager:
         return markup
 
     @staticmethod
+    @frozen_markup
     def barber_questionnaire_keyboard():
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         markup.add(types.KeyboardButton("❌ Отменить заполнение"))
         return markup
 
     @staticmethod
+    @frozen_markup
     def specialization_keyboard(selected_specialization=None):
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         for service in SERVICES.values():
@@ -120,9 +169,11 @@ class KeyboardManager:
 
     @staticmethod
     def services_keyboard(selected_services=None):
-        if selected_services is None:
-            selected_services = []
+        return KeyboardManager._services_keyboard(frozenset(selected_services or ()))
 
+    @staticmethod
+    @frozen_markup
+    def _services_keyboard(selected_services):
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         available_services = [val for key, val in SERVICES.items() if key not in selected_services]
 
@@ -142,6 +193,7 @@ class KeyboardManager:
         return markup
 
     @staticmethod
+    @frozen_markup
     def finish_questionnaire_keyboard():
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         markup.add(types.KeyboardButton("✏️ Редактировать анкету"))
@@ -149,6 +201,7 @@ class KeyboardManager:
         return markup
 
     @staticmethod
+    @frozen_markup
     def client_main_menu():
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
         buttons = [
@@ -161,6 +214,7 @@ class KeyboardManager:
         return markup
 
     @staticmethod
+    @frozen_markup
     def get_guide_categories():
         markup = types.InlineKeyboardMarkup()
         for category_type, name in HAIRCUT_TYPES.items():
@@ -182,10 +236,21 @@ class KeyboardManager:
             "🔙 Назад",
             callback_data=back_callback
         ))
+        return FrozenMarkup(markup)
+
+    @staticmethod
+    def suggestions_keyboard(kind, suggestions):
+        """Inline-кнопки «Возможно, вы имели в виду»: kind — 'city' или 'metro', suggestions — (id, name)"""
+        if not suggestions:
+            return None
+        markup = types.InlineKeyboardMarkup()
+        for item_id, name in suggestions:
+            markup.add(types.InlineKeyboardButton(name, callback_data=f"suggest_{kind}_{item_id}"))
         return markup
 
     # В классе KeyboardManager добавим метод:
     @staticmethod
+    @frozen_markup
     def admin_filters():
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
         markup.add("📋 Список анкет", "🔍 Фильтр по городу")
@@ -0,0 +1,191 @@
+import logging
+import threading
+from collections import OrderedDict
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+from config.settings import Settings
+from managers.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class MediaBundle:
+    """Фото одного альбома (портфолио барбера, стрижка из справочника).
+
+    Хранит file_id фото и для каждой подписи готовый список InputMediaPhoto.
+    Отправленный альбом запоминается только для чата, который его получил
+    (chat_id, подпись) -> message_ids: повторный показ в том же чате копирует
+    его сообщения одним copy_messages. Другим чатам альбом собирается из
+    file_id, поэтому показ не зависит от чужой переписки.
+    """
+
+    MAX_CAPTIONS = 4
+    MAX_SENT = 64
+
+    def __init__(self, version, file_ids):
+        self.version = version
+        self.file_ids = tuple(file_ids)
+        self._media = OrderedDict()   # (caption, parse_mode) -> [InputMediaPhoto]
+        self._sent = OrderedDict()    # (chat_id, caption, parse_mode) -> message_ids
+        self._lock = threading.Lock()
+
+    def media(self, caption=None, parse_mode=None):
+        key = (caption, parse_mode)
+        with self._lock:
+            media = self._media.get(key)
+            if media is None:
+                media = [types.InputMediaPhoto(file_id) for file_id in self.file_ids]
+                media[0].caption = caption
+                media[0].parse_mode = parse_mode
+                self._media[key] = media
+                while len(self._media) > self.MAX_CAPTIONS:
+                    self._media.popitem(last=False)
+            else:
+                self._media.move_to_end(key)
+            return media
+
+    def sent_album(self, chat_id, caption=None, parse_mode=None):
+        with self._lock:
+            return self._sent.get((chat_id, caption, parse_mode))
+
+    def remember_album(self, chat_id, caption, parse_mode, message_ids):
+        key = (chat_id, caption, parse_mode)
+        with self._lock:
+            self._sent[key] = list(message_ids)
+            self._sent.move_to_end(key)
+            while len(self._sent) > self.MAX_SENT:
+                self._sent.popitem(last=False)
+
+    def forget_album(self, chat_id, caption=None, parse_mode=None):
+        with self._lock:
+            self._sent.pop((chat_id, caption, parse_mode), None)
+
+
+class MediaCache:
+    """LRU-кэш альбомов по ключу (тип сущности, id) с номером версии.
+
+    Фото загружаются функцией, зарегистрированной для типа сущности
+    (register_loader). invalidate() увеличивает версию, и альбом, собранный
+    по старой версии, в кэш не попадает. Версия хранится только пока альбом
+    загружается, поэтому словарь версий не растёт вместе с числом сущностей.
+    Для анкет барберов инвалидация приходит через
+    DatabaseManager.add_barber_change_listener.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._loaders = {}
+        self._bundles = OrderedDict()   # (entity, entity_id) -> MediaBundle
+        self._loading = {}              # (entity, entity_id) -> [число загрузок, номер версии]
+        self._generations = {}          # entity -> номер версии всех альбомов типа
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'copied': 0, 'sent': 0}
+
+    def register_loader(self, entity, loader):
+        """loader(entity_id) -> список file_id; None — фото не удалось прочитать"""
+        self._loaders[entity] = loader
+
+    def get(self, entity, entity_id):
+        key = (entity, entity_id)
+        with self._lock:
+            bundle = self._bundles.get(key)
+            if bundle is not None:
+                self._bundles.move_to_end(key)
+                self._stats['hits'] += 1
+                return bundle
+            self._stats['misses'] += 1
+            self._loading.setdefault(key, [0, 0])[0] += 1
+            version = self._version(key)
+
+        try:
+            file_ids = self._loaders[entity](entity_id)
+        except Exception:
+            with self._lock:
+                self._finish_loading(key)
+            raise
+        # Ошибка чтения не кэшируется: иначе альбом считался бы пустым до инвалидации
+        bundle = MediaBundle(version, file_ids or ())
+        if file_ids is None:
+            logger.warning(f"Не удалось загрузить фото {entity} {entity_id}")
+        with self._lock:
+            if file_ids is not None and self._version(key) == version:
+                self._bundles[key] = bundle
+                self._bundles.move_to_end(key)
+                while len(self._bundles) > self.max_size:
+                    self._bundles.popitem(last=False)
+            self._finish_loading(key)
+        return bundle
+
+    def invalidate(self, entity, entity_id=None):
+        """Сбрасывает альбом сущности; entity_id=None — все альбомы этого типа"""
+        with self._lock:
+            if entity_id is None:
+                self._generations[entity] = self._generations.get(entity, 0) + 1
+                for key in [key for key in self._bundles if key[0] == entity]:
+                    del self._bundles[key]
+                return
+            key = (entity, entity_id)
+            loading = self._loading.get(key)
+            if loading is not None:
+                loading[1] += 1
+            self._bundles.pop(key, None)
+
+    def send(self, bot, chat_id, entity, entity_id, caption=None, parse_mode=None):
+        """Отправляет альбом сущности; False — если фото нет.
+
+        Если этот чат уже получал такой же альбом (той же версии, с той же
+        подписью), его сообщения копируются; иначе альбом отправляется по
+        кэшированным file_id.
+        """
+        bundle = self.get(entity, entity_id)
+        if not bundle.file_ids:
+            return False
+
+        message_ids = bundle.sent_album(chat_id, caption, parse_mode)
+        if message_ids is not None:
+            try:
+                copies = bot.copy_messages(chat_id, chat_id, message_ids)
+                bundle.remember_album(chat_id, caption, parse_mode, [message.message_id for message in copies])
+                self._count('copied')
+                return True
+            except ApiTelegramException as e:
+                # Пользователь мог удалить сообщения альбома
+                logger.info(f"Не удалось скопировать альбом {entity} {entity_id}: {e}")
+                bundle.forget_album(chat_id, caption, parse_mode)
+
+        messages = bot.send_media_group(chat_id, bundle.media(caption, parse_mode))
+        bundle.remember_album(chat_id, caption, parse_mode, [message.message_id for message in messages])
+        self._count('sent')
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._bundles)
+        return stats
+
+    def _version(self, key):
+        # Вызывается под self._lock
+        loading = self._loading.get(key)
+        return self._generations.get(key[0], 0), loading[1] if loading else 0
+
+    def _finish_loading(self, key):
+        # Вызывается под self._lock: последняя загрузка ключа убирает его версию
+        loading = self._loading[key]
+        loading[0] -= 1
+        if not loading[0]:
+            del self._loading[key]
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def _barber_photos(barber_id):
+    rows = DatabaseManager.get_barber_photos(barber_id)
+    return None if rows is None else [row[0] for row in rows]
+
+
+media_cache = MediaCache(Settings.MEDIA_CACHE_SIZE)
+media_cache.register_loader('barber', _barber_photos)
+DatabaseManager.add_barber_change_listener(lambda barber_id: media_cache.invalidate('barber', barber_id))
@@ -0,0 +1,136 @@
+import logging
+import threading
+from config.constants import CATEGORY_TYPES, SPECIALIZATION_FILTERS
+from managers.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Бит категории услуг в маске барбера
+CATEGORY_BITS = {category: 1 << idx for idx, category in enumerate(CATEGORY_TYPES)}
+
+
+class BarberSearchIndex:
+    """Индекс активных барберов в памяти: город → метро → барбер.
+
+    Для каждого барбера хранится строка в формате get_filtered_barbers, маска
+    категорий услуг и минимальная цена по каждой категории. Изменения анкет
+    приходят через DatabaseManager.add_barber_change_listener: барбер помечается
+    устаревшим и перечитывается одним запросом при следующем поиске.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cities = {}       # city_id -> {metro_id -> {barber_id: (row, mask, prices)}}
+        self._locations = {}    # barber_id -> (city_id, metro_id)
+        self._dirty = set()
+        self._loaded = False
+        DatabaseManager.add_barber_change_listener(self.mark_dirty)
+
+    def load(self):
+        """Полностью перестраивает индекс.
+
+        Пометки, сделанные до запроса, покрывает новый снимок; пометки,
+        пришедшие во время запроса, остаются в _dirty для следующего поиска.
+        """
+        with self._lock:
+            covered, self._dirty = self._dirty, set()
+        data = DatabaseManager.get_search_index_data()
+        if data is None:
+            logger.error("Не удалось загрузить поисковый индекс барберов")
+            with self._lock:
+                self._dirty.update(covered)
+            return False
+
+        with self._lock:
+            self._cities = {}
+            self._locations = {}
+            self._apply(*data)
+            self._loaded = True
+        logger.info(f"Поисковый индекс загружен: {len(self._locations)} барберов")
+        return True
+
+    def mark_dirty(self, barber_id):
+        with self._lock:
+            self._dirty.add(barber_id)
+
+    def search(self, city_id, max_price=None, specialization_num=None, metro_id=None):
+        """Аналог DatabaseManager.get_filtered_barbers без обращения к БД"""
+        if not self._loaded and not self.load():
+            return DatabaseManager.get_filtered_barbers(city_id, max_price, specialization_num, metro_id)
+        self._refresh_dirty()
+
+        specs = SPECIALIZATION_FILTERS.get(specialization_num, []) if specialization_num else []
+        # Как и в SQL-версии, фильтр по услугам применяется только вместе с ценой
+        check_services = bool(specs) and max_price is not None
+        required = 0
+        for category in specs:
+            required |= CATEGORY_BITS[category]
+
+        with self._lock:
+            city = self._cities.get(city_id, {})
+            if metro_id:
+                groups = [city.get(metro_id, {})]
+            else:
+                groups = list(city.values())
+
+            results = []
+            for group in groups:
+                for row, mask, prices in group.values():
+                    if check_services:
+                        if mask & required != required:
+                            continue
+                        if any(prices[category] > max_price for category in specs):
+                            continue
+                    results.append(row)
+
+        results.sort(key=lambda row: row[0])
+        return results
+
+    def _refresh_dirty(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            barber_ids = list(self._dirty)
+            self._dirty.clear()
+
+        data = DatabaseManager.get_search_index_data(barber_ids)
+        with self._lock:
+            if data is None:
+                # Повторим при следующем поиске
+                self._dirty.update(barber_ids)
+                return
+            for barber_id in barber_ids:
+                self._remove(barber_id)
+            self._apply(*data)
+
+    def _apply(self, barbers, prices):
+        # Вызывается под self._lock
+        barber_prices = {}
+        for barber_id, category, price in prices or []:
+            if category in CATEGORY_BITS:
+                barber_prices.setdefault(barber_id, {})[category] = price
+
+        for barber in barbers or []:
+            barber_id, city_id, metro_id = barber[0], barber[11], barber[12]
+            prices_by_category = barber_prices.get(barber_id, {})
+            mask = 0
+            for category in prices_by_category:
+                mask |= CATEGORY_BITS[category]
+            self._remove(barber_id)
+            self._cities.setdefault(city_id, {}).setdefault(metro_id, {})[barber_id] = (
+                barber[:11], mask, prices_by_category
+            )
+            self._locations[barber_id] = (city_id, metro_id)
+
+    def _remove(self, barber_id):
+        # Вызывается под self._lock
+        location = self._locations.pop(barber_id, None)
+        if location is None:
+            return
+        city_id, metro_id = location
+        group = self._cities.get(city_id, {}).get(metro_id)
+        if group is not None:
+            group.pop(barber_id, None)
+
+
+barber_index = BarberSearchIndex()
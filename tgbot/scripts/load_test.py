@@ -0,0 +1,459 @@
+"""Нагрузочный прогон обработчиков бота на синтетических апдейтах.
+
+Сценарии (/start и выбор роли, анкета барбера с 5 фото, поиск клиента с
+фильтрами и листанием, избранное, справочник, модерация) собираются из
+telebot.types.Update и проходят через настоящие обработчики
+register_handlers, register_client_handlers и GuideManager.init_handlers.
+Запросы к Telegram уходят в FakeTelegram, который отвечает правдоподобными
+объектами и запоминает inline-кнопки, чтобы сценарий мог «нажать» их дальше.
+
+Нужна отдельная MySQL-база со схемой из sql/migrations (python scripts/migrate.py
+--database ...) и заполненными городами: скрипт пишет в неё пользователей и
+анкеты (id пользователей начиная с --user-base).
+
+    python scripts/load_test.py --database BarbersMap_load --seed-barbers 500 --sessions 300
+
+Отчёт: апдейтов в секунду, p50/p99 времени и запросов к БД по обработчикам.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot import apihelper, types  # noqa: E402
+
+from config.settings import Settings  # noqa: E402
+
+logger = logging.getLogger('load_test')
+
+_update_ids = itertools.count(1)
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, result):
+        self._json = {'ok': True, 'result': result}
+        self.text = json.dumps(self._json, ensure_ascii=False)
+
+    def json(self):
+        return self._json
+
+
+class FakeTelegram:
+    """Транспорт telebot без сети: apihelper.CUSTOM_REQUEST_SENDER.
+
+    Считает вызовы методов API и хранит последние inline-клавиатуры каждого
+    чата (message_id, [callback_data]).
+    """
+
+    KEEP_KEYBOARDS = 5
+
+    def __init__(self):
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+        self._keyboards = defaultdict(list)
+        self._lock = threading.Lock()
+        self.bot_user = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+
+    def install(self):
+        apihelper.CUSTOM_REQUEST_SENDER = self
+
+    def __call__(self, method, url, params=None, files=None, **kwargs):
+        name = url.rsplit('/', 1)[-1]
+        params = params or {}
+        with self._lock:
+            self.calls[name] += 1
+
+        if name in ('sendMessage', 'sendPhoto', 'copyMessage', 'forwardMessage',
+                    'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'):
+            return FakeResponse(self._message(params))
+        if name == 'sendMediaGroup':
+            count = len(json.loads(params.get('media', '[]')))
+            return FakeResponse([self._message(params) for _ in range(count)])
+        if name in ('copyMessages', 'forwardMessages'):
+            count = len(json.loads(params.get('message_ids', '[]')))
+            return FakeResponse([{'message_id': next(self._message_ids)} for _ in range(count)])
+        if name == 'getMe':
+            return FakeResponse(self.bot_user)
+        return FakeResponse(True)
+
+    def _message(self, params):
+        chat_id = int(params.get('chat_id') or 0)
+        message_id = int(params.get('message_id') or 0) or next(self._message_ids)
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': self.bot_user,
+            'text': params.get('text') or params.get('caption') or '',
+        }
+        markup = params.get('reply_markup')
+        if markup:
+            markup = json.loads(markup)
+            if 'inline_keyboard' in markup:
+                data = [button['callback_data'] for row in markup['inline_keyboard']
+                        for button in row if 'callback_data' in button]
+                with self._lock:
+                    keyboards = self._keyboards[chat_id]
+                    keyboards.append((message_id, data))
+                    del keyboards[:-self.KEEP_KEYBOARDS]
+                message['reply_markup'] = markup
+        return message
+
+    def find_callback(self, chat_id, prefix):
+        """(message_id, callback_data) самой свежей кнопки с таким префиксом или None"""
+        with self._lock:
+            keyboards = list(self._keyboards.get(chat_id, ()))
+        for message_id, data in reversed(keyboards):
+            found = [item for item in data if item.startswith(prefix)]
+            if found:
+                return message_id, random.choice(found)
+        return None
+
+
+def _user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"Load{user_id}", 'username': f"load{user_id}"}
+
+
+def text_update(user_id, text):
+    return types.Update.de_json({
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_update_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': _user(user_id),
+            'text': text,
+        },
+    })
+
+
+def photo_update(user_id, file_id):
+    return types.Update.de_json({
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_update_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': _user(user_id),
+            'photo': [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 1280}],
+        },
+    })
+
+
+def callback_update(user_id, message_id, data):
+    return types.Update.de_json({
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': _user(1),
+                'text': '',
+            },
+        },
+    })
+
+
+# Сценарии: генераторы апдейтов. Между yield обработчик уже отработал,
+# поэтому сценарий может искать кнопки из ответа в FakeTelegram.
+
+def barber_session(user_id, tg, city):
+    from config.constants import SERVICES
+    yield text_update(user_id, '/start')
+    yield text_update(user_id, "✂️ Барбер")
+    yield text_update(user_id, "📝 Заполнить анкету барбера")
+    yield text_update(user_id, f"Привет! Я барбер {user_id}, стригу быстро и аккуратно.")
+    for idx in range(5):
+        yield photo_update(user_id, f"load-photo-{user_id}-{idx}")
+    yield text_update(user_id, city['name'])
+    if city['metro']:
+        yield text_update(user_id, random.choice(city['metro']))
+    yield text_update(user_id, str(random.randint(1, 15)))
+    for service in random.sample(list(SERVICES.values()), 2):
+        yield text_update(user_id, service)
+        yield text_update(user_id, str(random.randrange(500, 3000, 100)))
+    yield text_update(user_id, "✅ Продолжить")
+    yield text_update(user_id, f"@load{user_id}")
+    yield text_update(user_id, "+70000000000")
+    yield text_update(user_id, f"@load{user_id}")
+    yield text_update(user_id, "💾 Сохранить")
+    yield text_update(user_id, "👤 Моя анкета")
+
+
+def client_session(user_id, tg, city):
+    yield text_update(user_id, '/start')
+    yield text_update(user_id, "👤 Клиент")
+    yield text_update(user_id, "📍 Выбрать город")
+    yield text_update(user_id, city['name'])
+    yield text_update(user_id, "🔍 Найти барбера")
+    yield text_update(user_id, "🔎 Без фильтров")
+    for _ in range(random.randint(0, 3)):
+        found = tg.find_callback(user_id, 'client_next_')
+        if found is None:
+            break
+        yield callback_update(user_id, *found)
+    for _ in range(random.randint(1, 3)):
+        found = tg.find_callback(user_id, 'client_showbarber_')
+        if found is None:
+            break
+        yield callback_update(user_id, *found)
+        found = tg.find_callback(user_id, 'client_toggle_favorite_')
+        if found is not None and random.random() < 0.5:
+            yield callback_update(user_id, *found)
+    yield text_update(user_id, "⭐ Избранное")
+
+    yield text_update(user_id, "🔎 Фильтры")
+    if city['metro']:
+        yield text_update(user_id, random.choice(city['metro'] + ['нет']))
+    yield text_update(user_id, str(random.randrange(1000, 5000, 500)))
+    yield text_update(user_id, str(random.randint(1, 7)))
+    found = tg.find_callback(user_id, 'client_showbarber_')
+    if found is not None:
+        yield callback_update(user_id, *found)
+
+
+def guide_session(user_id, tg, city):
+    from config.constants import HAIRCUT_TYPES
+    yield text_update(user_id, '/start')
+    yield text_update(user_id, "📚 Справочник")
+    for category_type in random.sample(list(HAIRCUT_TYPES), 2):
+        found = tg.find_callback(user_id, f"guide_category_{category_type}")
+        if found is None:
+            break
+        yield callback_update(user_id, *found)
+        found = tg.find_callback(user_id, 'guide_haircut_')
+        if found is not None:
+            yield callback_update(user_id, *found)
+        found = tg.find_callback(user_id, 'guide_category_')
+        if found is not None:
+            yield callback_update(user_id, found[0], 'guide_back_to_categories')
+
+
+def admin_session(user_id, tg, city):
+    yield text_update(user_id, '/start')
+    yield text_update(user_id, "📝 Ждущие анкеты")
+    for _ in range(random.randint(1, 3)):
+        found = tg.find_callback(user_id, 'admin_view_profile_')
+        if found is None:
+            break
+        yield callback_update(user_id, *found)
+        found = tg.find_callback(user_id, 'admin_approve_')
+        if found is not None:
+            yield callback_update(user_id, *found)
+    found = tg.find_callback(user_id, 'admin_pending_next_')
+    if found is not None:
+        yield callback_update(user_id, *found)
+
+
+SCENARIOS = {
+    'barber': barber_session,
+    'client': client_session,
+    'guide': guide_session,
+    'admin': admin_session,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = Counter()
+
+    def add(self, trace, failed):
+        with self._lock:
+            self.durations[trace.handler].append(trace.duration)
+            self.queries[trace.handler].append(len(trace.queries))
+            if failed:
+                self.errors[trace.handler] += 1
+
+    @property
+    def total(self):
+        return sum(len(values) for values in self.durations.values())
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_session(bot, metrics, tg, recorder, scenario, user_id, city):
+    for update in SCENARIOS[scenario](user_id, tg, city):
+        failed = False
+        metrics.begin_update(update)
+        try:
+            bot.process_new_updates([update])
+        except Exception as e:
+            failed = True
+            logger.error(f"{scenario} {user_id}: ошибка обработки апдейта: {e}")
+        finally:
+            recorder.add(metrics.end_update(failed), failed)
+
+
+def seed_barbers(count, user_base, cities):
+    """Активные анкеты с 5 фото и двумя услугами; уже существующие пропускаются"""
+    from config.constants import SERVICES
+    from managers.database import DatabaseManager
+
+    created = 0
+    for idx in range(count):
+        user_id = user_base + idx
+        if DatabaseManager.get_barber_by_user_id(user_id):
+            continue
+        if not DatabaseManager.check_user(user_id):
+            DatabaseManager.register_user(user_id, f"seed{user_id}", f"Seed{idx}")
+        DatabaseManager.save_user_role(user_id, 'barber')
+        city = cities[idx % len(cities)]
+        metro_id = random.choice(city['metro_ids']) if city['metro_ids'] else None
+        barber_id = DatabaseManager.insert_barber(
+            user_id, city['id'], metro_id, f"Seed barber {idx}", random.randint(1, 20),
+            f"@seed{user_id}", '', f"@seed{user_id}", 'active'
+        )
+        if not barber_id:
+            continue
+        for position in range(1, 6):
+            DatabaseManager.insert_barber_portfolio(barber_id, f"seed-photo-{user_id}-{position}", position)
+        for service_key in random.sample(list(SERVICES), 2):
+            DatabaseManager.insert_barber_service(
+                barber_id, DatabaseManager.get_category_id_by_type(service_key),
+                SERVICES[service_key], random.randrange(500, 3000, 100)
+            )
+        created += 1
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help="имя тестовой базы MySQL (не рабочей!)")
+    parser.add_argument('--seed-barbers', type=int, default=200, help="сколько активных анкет подготовить")
+    parser.add_argument('--sessions', type=int, default=200, help="число сценариев")
+    parser.add_argument('--concurrency', type=int, default=Settings.BOT_WORKERS, help="параллельных сценариев")
+    parser.add_argument('--mix', default='client=6,barber=2,guide=1,admin=1', help="доли сценариев")
+    parser.add_argument('--cities', type=int, default=3, help="в скольких городах идут сценарии")
+    parser.add_argument('--user-base', type=int, default=9_000_000_000, help="первый id синтетических пользователей")
+    parser.add_argument('--rate-limits', action='store_true', help="оставить лимиты отправки core/sender.py")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.database == Settings.DB_NAME:
+        parser.error(f"--database совпадает с рабочей базой {Settings.DB_NAME}")
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='tgbot-load-')
+    Settings.DB_NAME = args.database
+    Settings.BOT_TOKEN = '0:load-test'
+    Settings.DRAFTS_PATH = os.path.join(workdir, 'drafts.sqlite3')
+    Settings.DRAFTS_LEGACY_JSON = os.path.join(workdir, 'barber_profiles.json')
+    Settings.NEXT_STEPS_PATH = os.path.join(workdir, 'next_steps.sqlite3')
+    if not args.rate_limits:
+        Settings.TG_GLOBAL_RATE = Settings.TG_CHAT_RATE = Settings.TG_CHAT_BURST = 10 ** 6
+
+    tg = FakeTelegram()
+    tg.install()
+
+    # Модули бота читают Settings при импорте
+    from core import metrics
+    from core.bot import bot, register_handlers
+    from core.router import router
+    from managers.client import register_client_handlers
+    from managers.database import DatabaseManager
+    from managers.guide import GuideManager
+    from managers.search import barber_index
+
+    metrics.instrument_api()
+    register_handlers()
+    register_client_handlers(bot)
+    GuideManager.init_handlers(bot)
+    router.install(bot)
+
+    if not DatabaseManager.reload_reference_data():
+        sys.exit("Не удалось прочитать справочники из тестовой базы")
+    reference = DatabaseManager.reference_data()
+    cities = []
+    for city_name in reference.active_cities[:args.cities]:
+        city_id = reference.city_id(city_name)
+        stations = reference.metro_by_city.get(city_id, ())
+        cities.append({
+            'id': city_id,
+            'name': city_name,
+            'metro': [name for _, name in stations],
+            'metro_ids': [metro_id for metro_id, _ in stations],
+        })
+    if not cities:
+        sys.exit("В тестовой базе нет активных городов")
+
+    started = time.monotonic()
+    created = seed_barbers(args.seed_barbers, args.user_base, cities)
+    print(f"Анкет добавлено: {created} за {time.monotonic() - started:.1f} с")
+
+    admin_id = args.user_base + args.seed_barbers
+    if not DatabaseManager.check_user(admin_id):
+        DatabaseManager.register_user(admin_id, 'load_admin', 'LoadAdmin')
+    if not DatabaseManager.user_has_role(admin_id, 'admin'):
+        DatabaseManager.save_user_role(admin_id, 'admin')
+
+    GuideManager.reload_content(force=True)
+    barber_index.load()
+
+    weights = dict(item.split('=') for item in args.mix.split(','))
+    scenarios = random.choices(list(weights), [float(value) for value in weights.values()], k=args.sessions)
+    # Каждый запуск — новые пользователи, чтобы /start проходил регистрацию
+    first_user = admin_id + 1 + int(time.time()) % 1_000_000 * 1000
+    jobs = []
+    for idx, scenario in enumerate(scenarios):
+        user_id = admin_id if scenario == 'admin' else first_user + idx
+        jobs.append((scenario, user_id, random.choice(cities)))
+
+    recorder = Recorder()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        # Сценарии администратора идут от одного пользователя — по очереди
+        admin_lock = threading.Lock()
+
+        def run(job):
+            scenario, user_id, city = job
+            if scenario == 'admin':
+                with admin_lock:
+                    run_session(bot, metrics, tg, recorder, scenario, user_id, city)
+            else:
+                run_session(bot, metrics, tg, recorder, scenario, user_id, city)
+
+        list(pool.map(run, jobs))
+    elapsed = time.monotonic() - started
+    bot.outbox.stop()
+
+    print(f"\nСценариев: {len(jobs)} ({', '.join(f'{k}={v}' for k, v in Counter(scenarios).items())}), "
+          f"параллельно: {args.concurrency}")
+    print(f"Апдейтов: {recorder.total} за {elapsed:.2f} с — {recorder.total / elapsed:.1f} апд/с")
+    print(f"\n{'обработчик':<60} {'n':>6} {'p50 мс':>8} {'p99 мс':>8} {'запр/апд':>9} {'ошибок':>7}")
+    for handler in sorted(recorder.durations, key=lambda name: -sum(recorder.durations[name])):
+        durations = recorder.durations[handler]
+        queries = recorder.queries[handler]
+        print(
+            f"{handler[:60]:<60} {len(durations):>6} "
+            f"{percentile(durations, 0.5) * 1000:>8.1f} {percentile(durations, 0.99) * 1000:>8.1f} "
+            f"{sum(queries) / len(queries):>9.1f} {recorder.errors[handler]:>7}"
+        )
+    print("\nЗапросы к Telegram API: " + ', '.join(f"{name}={count}" for name, count in tg.calls.most_common()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Применение миграций схемы MySQL (sql/migrations) и проверка индексов.
+
+    python scripts/migrate.py                # применить все неприменённые
+    python scripts/migrate.py --status       # список миграций и их состояние
+    python scripts/migrate.py --check        # код 1, если есть неприменённые миграции или нет индексов
+    python scripts/migrate.py --database BarbersMap_bench   # другая база (например, для нагрузочных тестов)
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Settings  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help="имя базы вместо Settings.DB_NAME")
+    parser.add_argument('--target', type=int, help="применить миграции до этого номера включительно")
+    parser.add_argument('--status', action='store_true', help="показать состояние миграций")
+    parser.add_argument('--check', action='store_true', help="проверить миграции и индексы, ничего не меняя")
+    args = parser.parse_args()
+
+    if args.database:
+        Settings.DB_NAME = args.database
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    from core import migrations
+
+    if args.status:
+        states = migrations.status()
+        if states is None:
+            sys.exit("Нет доступа к БД")
+        for migration, state in states:
+            print(f"{state:<8} {migration}")
+        return
+
+    if args.check:
+        problems = migrations.check_schema()
+        sys.exit(1 if problems is None or problems else 0)
+
+    if not migrations.migrate(args.target):
+        sys.exit(1)
+    missing = migrations.missing_indexes()
+    for spec in missing or ():
+        print(f"Нет индекса {spec}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""Отправляет записанные апдейты Telegram на локальный webhook бота.
+
+Использование:
+    python scripts/replay_updates.py updates.json [http://127.0.0.1:8443/webhook] [--secret TOKEN]
+
+Файл — один апдейт или JSON-массив апдейтов (отправляется одним пакетом).
+"""
+import argparse
+import json
+
+import requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка записанных апдейтов на webhook")
+    parser.add_argument('file')
+    parser.add_argument('url', nargs='?', default='http://127.0.0.1:8443/webhook')
+    parser.add_argument('--secret', default='')
+    args = parser.parse_args()
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+    response = requests.post(args.url, json=payload, headers=headers, timeout=30)
+    print(response.status_code, response.text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+"""Наполнение тестовой базы и замер запросов DatabaseManager на разных объёмах.
+
+Скрипт применяет к отдельной MySQL-базе миграции из sql/migrations и
+дозаполняет её до каждого масштаба из --scales (число анкет барберов;
+остальные таблицы — пропорционально), затем вызывает методы чтения
+DatabaseManager: каждый запрос прогоняется через EXPLAIN, вызов метода —
+через замер времени.
+
+Распределения: популярность городов по закону Ципфа, статусы анкет
+80% active / 10% pending / 7% hidden / 3% banned, оценки смещены к 4–5,
+число отзывов на анкету — экспоненциальное.
+
+    python scripts/scale_benchmark.py --database BarbersMap_bench --scales 1000,10000,100000,1000000
+
+В отчёте помечаются полные просмотры таблиц, коррелированные подзапросы,
+filesort/временные таблицы и методы, время которых растёт вместе с объёмом.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.constants import SERVICES  # noqa: E402
+from config.settings import Settings  # noqa: E402
+
+logger = logging.getLogger('scale_benchmark')
+
+BATCH = 2000
+USER_BASE = 8_000_000_000
+STATUSES = (('active', 80), ('pending', 10), ('hidden', 7), ('banned', 3))
+RATINGS = ((5, 50), (4, 30), (3, 12), (2, 5), (1, 3))
+# Порог строк в EXPLAIN, после которого полный просмотр считается проблемой
+SCAN_ROWS = 1000
+
+
+class Seeder:
+    """Дозаполняет таблицы до заданного числа анкет; уже созданные строки не трогает"""
+
+    def __init__(self, db, args):
+        self.db = db
+        self.args = args
+        self.rng = random.Random(args.seed)
+
+    def _cursor(self):
+        return self.db.connection.cursor()
+
+    def _scalar(self, query, params=()):
+        cursor = self._cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        cursor.fetchall()
+        cursor.close()
+        return row[0] if row else None
+
+    def _rows(self, query, params=()):
+        cursor = self._cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    def _insert(self, query, rows):
+        cursor = self._cursor()
+        for start in range(0, len(rows), BATCH):
+            cursor.executemany(query, rows[start:start + BATCH])
+            self.db.connection.commit()
+        cursor.close()
+
+    def reference(self):
+        """Города, станции метро и справочник стрижек — если их меньше, чем нужно"""
+        cities = self._rows("SELECT id FROM cities WHERE is_active = 1 ORDER BY id")
+        missing = self.args.cities - len(cities)
+        if missing > 0:
+            self._insert(
+                "INSERT INTO cities (name, is_active) VALUES (%s, 1)",
+                [(f"Бенчмарк-город {idx}",) for idx in range(len(cities), len(cities) + missing)]
+            )
+        self.cities = [row[0] for row in self._rows("SELECT id FROM cities WHERE is_active = 1 ORDER BY id")]
+        self.city_weights = [1 / (rank + 1) ** 1.1 for rank in range(len(self.cities))]
+
+        metro_rows = []
+        for city_id in self.cities[:self.args.metro_cities]:
+            if not self._scalar("SELECT COUNT(*) FROM metro_stations WHERE city_id = %s", (city_id,)):
+                metro_rows.extend((city_id, f"Станция {city_id}-{idx}") for idx in range(self.args.stations))
+        if metro_rows:
+            self._insert("INSERT INTO metro_stations (city_id, name, is_active) VALUES (%s, %s, 1)", metro_rows)
+        self.metro = {}
+        for metro_id, city_id in self._rows("SELECT id, city_id FROM metro_stations WHERE is_active = 1"):
+            self.metro.setdefault(city_id, []).append(metro_id)
+
+        self.categories = dict(self._rows("SELECT type, id FROM haircut_categories"))
+        if not self._scalar("SELECT COUNT(*) FROM haircut_guide"):
+            self._insert(
+                "INSERT INTO haircut_guide (category_id, name, description, styling_tips) VALUES (%s, %s, %s, %s)",
+                [(category_id, f"Стрижка {category_type} {idx}", "Описание", "Советы")
+                 for category_type, category_id in self.categories.items() for idx in range(20)]
+            )
+            self._insert(
+                "INSERT INTO haircut_guide_photos (haircut_id, photo_url, is_primary) VALUES (%s, %s, %s)",
+                [(haircut_id, f"bench-guide-{haircut_id}-{idx}", int(idx == 0))
+                 for (haircut_id,) in self._rows("SELECT id FROM haircut_guide") for idx in range(3)]
+            )
+
+    def barbers_count(self):
+        return self._scalar("SELECT COUNT(*) FROM barbers WHERE user_id >= %s", (USER_BASE,)) or 0
+
+    def grow(self, target):
+        """Добавляет анкеты (и их клиентов, фото, услуги, отзывы, избранное) до target штук"""
+        existing = self.barbers_count()
+        if existing >= target:
+            return 0
+        count = target - existing
+        rng = self.rng
+        now = datetime.now()
+        clients_per_barber = self.args.clients_per_barber
+
+        first_barber_id = (self._scalar("SELECT COALESCE(MAX(id), 0) FROM barbers") or 0) + 1
+        barber_users = [USER_BASE + 2 * (existing + idx) for idx in range(count)]
+        client_users = [USER_BASE + 2 * (existing * clients_per_barber + idx) + 1
+                        for idx in range(count * clients_per_barber)]
+
+        self._insert(
+            "INSERT IGNORE INTO users (telegram_id, username, first_name) VALUES (%s, %s, %s)",
+            [(user_id, f"bench{user_id}", f"Bench{user_id % 100000}") for user_id in barber_users + client_users]
+        )
+        self._insert(
+            "INSERT INTO user_roles (user_id, role, is_active) VALUES (%s, %s, 1)",
+            [(user_id, 'barber') for user_id in barber_users] + [(user_id, 'client') for user_id in client_users]
+        )
+
+        barbers = []
+        status_names, status_weights = zip(*STATUSES)
+        cities = rng.choices(self.cities, self.city_weights, k=count)
+        statuses = rng.choices(status_names, status_weights, k=count)
+        for idx, user_id in enumerate(barber_users):
+            city_id = cities[idx]
+            stations = self.metro.get(city_id)
+            metro_id = rng.choice(stations) if stations and rng.random() < 0.7 else None
+            created_at = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            barbers.append((
+                first_barber_id + idx, user_id, city_id, metro_id, f"Барбер {user_id}",
+                rng.randint(1, 20), f"@bench{user_id}", '', f"@bench{user_id}", statuses[idx], created_at
+            ))
+        self._insert(
+            "INSERT INTO barbers (id, user_id, city_id, metro_id, description, experience_years, "
+            "instagram, whatsapp, telegram, status, created_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            barbers
+        )
+        barber_ids = [row[0] for row in barbers]
+        barber_city = {row[0]: row[2] for row in barbers}
+
+        self._insert(
+            "INSERT INTO barber_portfolio (barber_id, photo_url, position) VALUES (%s, %s, %s)",
+            [(barber_id, f"bench-photo-{barber_id}-{position}", position)
+             for barber_id in barber_ids for position in range(1, 6)]
+        )
+        services = []
+        for barber_id in barber_ids:
+            for service_key in rng.sample(list(SERVICES), rng.randint(1, len(SERVICES))):
+                price = int(round(rng.lognormvariate(math.log(1500), 0.4), -2))
+                services.append((barber_id, self.categories.get(service_key), SERVICES[service_key], price))
+        self._insert(
+            "INSERT INTO barber_services (barber_id, category_id, name, price) VALUES (%s, %s, %s, %s)",
+            services
+        )
+
+        self._insert(
+            "INSERT INTO user_city_selections (user_id, city_id) VALUES (%s, %s)",
+            [(user_id, city_id) for user_id, city_id in
+             zip(client_users, rng.choices(self.cities, self.city_weights, k=len(client_users)))]
+        )
+
+        ratings, rating_weights = zip(*RATINGS)
+        reviews = set()
+        for barber_id in barber_ids:
+            for _ in range(int(rng.expovariate(1 / self.args.reviews_per_barber))):
+                reviews.add((barber_id, rng.choice(client_users)))
+        self._insert(
+            "INSERT IGNORE INTO reviews (barber_id, client_id, rating, comment) VALUES (%s, %s, %s, %s)",
+            [(barber_id, client_id, rng.choices(ratings, rating_weights)[0], None)
+             for barber_id, client_id in reviews]
+        )
+
+        favorites = set()
+        for client_id in client_users:
+            for _ in range(rng.randint(0, 2 * self.args.favorites_per_client)):
+                favorites.add((client_id, rng.choice(barber_ids)))
+        self._insert("INSERT IGNORE INTO favorites (client_id, barber_id) VALUES (%s, %s)", list(favorites))
+
+        logger.info(
+            f"+{count} анкет: городов {len(set(barber_city.values()))}, услуг {len(services)}, "
+            f"отзывов {len(reviews)}, избранного {len(favorites)}"
+        )
+        return count
+
+    def sample(self):
+        """Аргументы для методов чтения: типичные id из заполненных данных"""
+        city_id = self.cities[0]
+        barber = self._rows(
+            "SELECT id, user_id FROM barbers WHERE status = 'active' AND city_id = %s AND user_id >= %s "
+            "ORDER BY id DESC LIMIT 1", (city_id, USER_BASE)
+        )[0]
+        client = self._rows(
+            "SELECT client_id FROM favorites WHERE client_id >= %s ORDER BY client_id DESC LIMIT 1", (USER_BASE,)
+        )
+        stations = self.metro.get(city_id) or [None]
+        return {
+            'city_id': city_id,
+            'metro_id': stations[0],
+            'barber_id': barber[0],
+            'barber_user_id': barber[1],
+            'client_id': client[0][0] if client else barber[1] + 1,
+        }
+
+
+def benchmarks(DatabaseManager, sample):
+    """(имя, вызов) для методов чтения DatabaseManager"""
+    s = sample
+    first_page, _ = DatabaseManager.get_active_barbers_page(s['city_id'])
+    active_cursor = (first_page[-1][10], first_page[-1][0]) if first_page else None
+    pending_page, _ = DatabaseManager.get_pending_profiles_page()
+    pending_cursor = (pending_page[-1].submitted_at, pending_page[-1].id) if pending_page else None
+    return [
+        ('query_reference_data', lambda: DatabaseManager.query_reference_data()),
+        ('get_guide_rows', lambda: DatabaseManager.get_guide_rows()),
+        ('get_guide_fingerprint', lambda: DatabaseManager.get_guide_fingerprint()),
+        ('check_user', lambda: DatabaseManager.check_user(s['client_id'])),
+        ('get_user_by_telegram_id', lambda: DatabaseManager.get_user_by_telegram_id(s['client_id'])),
+        ('get_user_context', lambda: DatabaseManager.get_user_context(s['barber_user_id'])),
+        ('user_has_role', lambda: DatabaseManager.user_has_role(s['client_id'], 'client')),
+        ('get_barber_by_user_id', lambda: DatabaseManager.get_barber_by_user_id(s['barber_user_id'])),
+        ('get_barber_user_id', lambda: DatabaseManager.get_barber_user_id(s['barber_id'])),
+        ('get_barber_full_data_by_user_id',
+         lambda: DatabaseManager.get_barber_full_data_by_user_id(s['barber_user_id'])),
+        ('get_barber_by_id', lambda: DatabaseManager.get_barber_by_id(s['barber_id'])),
+        ('get_barber_photos', lambda: DatabaseManager.get_barber_photos(s['barber_id'])),
+        ('get_barber_portfolio', lambda: DatabaseManager.get_barber_portfolio(s['barber_id'])),
+        ('get_barber_services', lambda: DatabaseManager.get_barber_services(s['barber_id'])),
+        ('get_barber_average_rating', lambda: DatabaseManager.get_barber_average_rating(s['barber_id'])),
+        ('get_barber_rating', lambda: DatabaseManager.get_barber_rating(s['barber_id'])),
+        ('is_barber_favorite', lambda: DatabaseManager.is_barber_favorite(s['client_id'], s['barber_id'])),
+        ('get_favorite_barbers', lambda: DatabaseManager.get_favorite_barbers(s['client_id'])),
+        ('get_pending_profiles (OFFSET, стр. 50)', lambda: DatabaseManager.get_pending_profiles(page=50)),
+        ('get_pending_profiles_page', lambda: DatabaseManager.get_pending_profiles_page()),
+        ('get_pending_profiles_page (курсор)',
+         lambda: DatabaseManager.get_pending_profiles_page(cursor=pending_cursor)),
+        ('get_active_barbers (OFFSET, стр. 50)',
+         lambda: DatabaseManager.get_active_barbers(page=50, city_id=s['city_id'])),
+        ('get_active_barbers_page', lambda: DatabaseManager.get_active_barbers_page(s['city_id'])),
+        ('get_active_barbers_page (курсор)',
+         lambda: DatabaseManager.get_active_barbers_page(s['city_id'], cursor=active_cursor)),
+        ('get_filtered_barbers', lambda: DatabaseManager.get_filtered_barbers(
+            s['city_id'], max_price=2000, specialization_num=7, metro_id=s['metro_id'])),
+        ('get_search_index_data (одна анкета)',
+         lambda: DatabaseManager.get_search_index_data([s['barber_id']])),
+        ('get_search_index_data (все)', lambda: DatabaseManager.get_search_index_data()),
+    ]
+
+
+def explain(db, query, params):
+    """Замечания по плану запроса: полные просмотры, коррелированные подзапросы, filesort"""
+    cursor = db.connection.cursor(dictionary=True)
+    try:
+        cursor.execute("EXPLAIN " + query, params or ())
+        plan = cursor.fetchall()
+    finally:
+        cursor.close()
+    examined = 0
+    notes = []
+    for row in plan:
+        rows = row.get('rows') or 0
+        examined += rows
+        table = row.get('table')
+        extra = row.get('Extra') or ''
+        if row.get('type') == 'ALL' and rows >= SCAN_ROWS:
+            notes.append(f"полный просмотр {table} (~{rows} строк)")
+        elif row.get('type') == 'index' and rows >= SCAN_ROWS:
+            notes.append(f"полный просмотр индекса {table}.{row.get('key')} (~{rows} строк)")
+        if row.get('select_type') in ('DEPENDENT SUBQUERY', 'DEPENDENT UNION'):
+            notes.append(f"коррелированный подзапрос по {table} (~{rows} строк на внешнюю строку)")
+        if 'Using filesort' in extra and rows >= SCAN_ROWS:
+            notes.append(f"filesort по {table} (~{rows} строк)")
+        if 'Using temporary' in extra:
+            notes.append(f"временная таблица ({table})")
+    return examined, notes
+
+
+def measure(db, DatabaseManager, sample, repeat):
+    results = {}
+    for name, call in benchmarks(DatabaseManager, sample):
+        # Упавший метод попадает в отчёт с ошибкой, остальные замеры продолжаются
+        try:
+            results[name] = measure_call(db, call, repeat)
+        except Exception as e:
+            logger.exception(f"{name}: замер не выполнен")
+            results[name] = {'error': f"{type(e).__name__}: {e}"}
+    return results
+
+
+def measure_call(db, call, repeat):
+    from core import metrics
+
+    with metrics.capture_queries() as captured:
+        call()
+    examined = 0
+    notes = []
+    for query, params, _ in captured:
+        if not query.lstrip().lower().startswith('select'):
+            continue
+        query_examined, query_notes = explain(db, query, params)
+        examined += query_examined
+        notes.extend(query_notes)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return {
+        'queries': len(captured),
+        'median_ms': statistics.median(timings) * 1000,
+        'max_ms': max(timings) * 1000,
+        'rows_examined': examined,
+        'notes': sorted(set(notes)),
+    }
+
+
+def growth_notes(report):
+    """Методы, время которых растёт почти пропорционально объёму (показатель степени > 0.5)"""
+    scales = sorted(report)
+    if len(scales) < 2:
+        return {}
+    first, last = scales[0], scales[-1]
+    notes = {}
+    for name, result in report[last].items():
+        base = report[first].get(name)
+        if 'error' in result or not base or 'error' in base or base['median_ms'] <= 0:
+            continue
+        exponent = math.log(max(result['median_ms'], 1e-6) / base['median_ms']) / math.log(last / first)
+        if exponent > 0.5 and result['median_ms'] > 5:
+            notes[name] = (
+                f"время растёт с объёмом: {base['median_ms']:.1f} → {result['median_ms']:.1f} мс "
+                f"(степень {exponent:.2f})"
+            )
+    return notes
+
+
+def print_report(report):
+    for scale in sorted(report):
+        print(f"\n=== {scale} анкет ===")
+        print(f"{'метод':<45} {'запр':>4} {'медиана мс':>11} {'макс мс':>9} {'строк EXPLAIN':>14}  замечания")
+        for name, result in report[scale].items():
+            if 'error' in result:
+                print(f"{name[:45]:<45} ОШИБКА: {result['error']}")
+                continue
+            print(
+                f"{name[:45]:<45} {result['queries']:>4} {result['median_ms']:>11.2f} {result['max_ms']:>9.2f} "
+                f"{result['rows_examined']:>14}  {'; '.join(result['notes'])}"
+            )
+
+    last = report[max(report)]
+    growth = growth_notes(report)
+    flagged = [name for name, result in last.items()
+               if 'error' in result or result['notes'] or name in growth]
+    print("\n=== Требуют внимания ===")
+    if not flagged:
+        print("нет")
+    for name in flagged:
+        print(f"• {name}")
+        if 'error' in last[name]:
+            print(f"    не выполнен: {last[name]['error']}")
+            continue
+        for note in last[name]['notes']:
+            print(f"    {note}")
+        if name in growth:
+            print(f"    {growth[name]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help="имя тестовой базы MySQL (не рабочей!)")
+    parser.add_argument('--scales', default='1000,10000,100000,1000000', help="числа анкет через запятую")
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--metro-cities', type=int, default=5, help="сколько самых крупных городов с метро")
+    parser.add_argument('--stations', type=int, default=40, help="станций метро в таком городе")
+    parser.add_argument('--clients-per-barber', type=int, default=3)
+    parser.add_argument('--reviews-per-barber', type=float, default=5)
+    parser.add_argument('--favorites-per-client', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=20, help="повторов замера каждого метода")
+    parser.add_argument('--json', help="сохранить отчёт в JSON-файл")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.database == Settings.DB_NAME:
+        parser.error(f"--database совпадает с рабочей базой {Settings.DB_NAME}")
+    Settings.DB_NAME = args.database
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    from core import migrations
+    from core.database import Database
+    from managers.database import DatabaseManager
+
+    if not migrations.migrate():
+        sys.exit("Не удалось применить миграции к тестовой базе")
+    DatabaseManager.set_rating_not_null(True)
+
+    scales = sorted(int(value) for value in args.scales.split(','))
+    report = {}
+    with Database() as db:
+        if not db.connect():
+            sys.exit("Нет подключения к тестовой базе")
+        seeder = Seeder(db, args)
+        seeder.reference()
+        for scale in scales:
+            started = time.monotonic()
+            added = seeder.grow(scale)
+            if added:
+                DatabaseManager.reconcile_barber_aggregates()
+                cursor = db.connection.cursor()
+                for table in ('users', 'user_roles', 'barbers', 'barber_portfolio', 'barber_services',
+                              'reviews', 'favorites', 'user_city_selections'):
+                    cursor.execute(f"ANALYZE TABLE {table}")
+                    cursor.fetchall()
+                cursor.close()
+            logger.info(f"Масштаб {scale}: добавлено {added} анкет за {time.monotonic() - started:.1f} с")
+            report[scale] = measure(db, DatabaseManager, seeder.sample(), args.repeat)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({str(scale): result for scale, result in report.items()}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+-- Исходная схема бота (до денормализованных агрегатов).
+-- IF NOT EXISTS: на базе, где таблицы создавались вручную, ничего не меняется.
+-- Индексы под запросы — в 0003_query_indexes.sql.
+
+CREATE TABLE IF NOT EXISTS users (
+    telegram_id BIGINT NOT NULL,
+    username VARCHAR(255) NULL,
+    first_name VARCHAR(255) NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (telegram_id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_roles (
+    id INT NOT NULL AUTO_INCREMENT,
+    user_id BIGINT NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    is_active TINYINT(1) NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS cities (
+    id INT NOT NULL AUTO_INCREMENT,
+    name VARCHAR(100) NOT NULL,
+    is_active TINYINT(1) NOT NULL DEFAULT 1,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS metro_stations (
+    id INT NOT NULL AUTO_INCREMENT,
+    city_id INT NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    is_active TINYINT(1) NOT NULL DEFAULT 1,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS user_city_selections (
+    id INT NOT NULL AUTO_INCREMENT,
+    user_id BIGINT NOT NULL,
+    city_id INT NOT NULL,
+    selected_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS haircut_categories (
+    id INT NOT NULL AUTO_INCREMENT,
+    type VARCHAR(20) NOT NULL,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+INSERT INTO haircut_categories (type)
+SELECT 'short' FROM DUAL WHERE NOT EXISTS (SELECT 1 FROM haircut_categories WHERE type = 'short');
+INSERT INTO haircut_categories (type)
+SELECT 'long' FROM DUAL WHERE NOT EXISTS (SELECT 1 FROM haircut_categories WHERE type = 'long');
+INSERT INTO haircut_categories (type)
+SELECT 'beard' FROM DUAL WHERE NOT EXISTS (SELECT 1 FROM haircut_categories WHERE type = 'beard');
+
+CREATE TABLE IF NOT EXISTS haircut_guide (
+    id INT NOT NULL AUTO_INCREMENT,
+    category_id INT NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT NULL,
+    styling_tips TEXT NULL,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS haircut_guide_photos (
+    id INT NOT NULL AUTO_INCREMENT,
+    haircut_id INT NOT NULL,
+    photo_url VARCHAR(255) NOT NULL,
+    is_primary TINYINT(1) NOT NULL DEFAULT 0,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS barbers (
+    id INT NOT NULL AUTO_INCREMENT,
+    user_id BIGINT NOT NULL,
+    city_id INT NULL,
+    metro_id INT NULL,
+    description TEXT NULL,
+    experience_years INT NULL,
+    instagram VARCHAR(255) NULL,
+    whatsapp VARCHAR(255) NULL,
+    telegram VARCHAR(255) NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    rating DECIMAL(3, 2) NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS barber_portfolio (
+    id INT NOT NULL AUTO_INCREMENT,
+    barber_id INT NOT NULL,
+    photo_url VARCHAR(255) NOT NULL,
+    position INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS barber_services (
+    id INT NOT NULL AUTO_INCREMENT,
+    barber_id INT NOT NULL,
+    category_id INT NULL,
+    name VARCHAR(255) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS reviews (
+    id INT NOT NULL AUTO_INCREMENT,
+    barber_id INT NOT NULL,
+    client_id BIGINT NOT NULL,
+    rating TINYINT NOT NULL,
+    comment TEXT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
+
+CREATE TABLE IF NOT EXISTS favorites (
+    id INT NOT NULL AUTO_INCREMENT,
+    client_id BIGINT NOT NULL,
+    barber_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+) ENGINE = InnoDB DEFAULT CHARSET = utf8mb4;
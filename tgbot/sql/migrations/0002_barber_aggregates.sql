@@ -0,0 +1,24 @@
+-- Денормализованные агрегаты анкеты барбера.
+-- Поддерживаются DatabaseManager при записи (портфолио, отзывы),
+-- расхождения исправляет DatabaseManager.reconcile_barber_aggregates.
+
+ALTER TABLE barbers
+    ADD COLUMN photos_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN reviews_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN avg_rating DECIMAL(3, 2) NULL;
+
+UPDATE barbers b
+LEFT JOIN (
+    SELECT barber_id, COUNT(*) AS cnt
+    FROM barber_portfolio
+    GROUP BY barber_id
+) p ON p.barber_id = b.id
+LEFT JOIN (
+    SELECT barber_id, COUNT(*) AS cnt, ROUND(AVG(rating), 2) AS avg_rating
+    FROM reviews
+    GROUP BY barber_id
+) r ON r.barber_id = b.id
+SET
+    b.photos_count = COALESCE(p.cnt, 0),
+    b.reviews_count = COALESCE(r.cnt, 0),
+    b.avg_rating = r.avg_rating;
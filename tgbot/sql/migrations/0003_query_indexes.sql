@@ -0,0 +1,60 @@
+-- Индексы под запросы DatabaseManager и уникальные ключи для ON DUPLICATE KEY.
+-- Тот же набор проверяется при запуске бота (core/migrations.py, EXPECTED_INDEXES).
+-- Каждый индекс — отдельной командой: если он уже создан вручную,
+-- миграция пропускает только его (ошибка 1061).
+-- К индексам InnoDB неявно добавляется первичный ключ id, поэтому сортировки
+-- вида "..., barbers.id" тоже идут по индексу.
+
+-- Рейтинг без NULL. После этой миграции списки барберов сортируются по самому
+-- столбцу и читаются по индексам ниже; на базе без неё бот сортирует по
+-- COALESCE(rating, 0) без индекса (DatabaseManager.set_rating_not_null)
+UPDATE barbers SET rating = 0 WHERE rating IS NULL;
+ALTER TABLE barbers MODIFY rating DECIMAL(3, 2) NOT NULL DEFAULT 0;
+
+-- get_user_context, анкета по user_id
+CREATE INDEX idx_barbers_user ON barbers (user_id);
+-- get_active_barbers(_page), get_filtered_barbers: status = 'active' [AND city_id] ORDER BY rating DESC, id
+CREATE INDEX idx_barbers_status_city_rating ON barbers (status, city_id, rating DESC);
+CREATE INDEX idx_barbers_status_rating ON barbers (status, rating DESC);
+-- get_pending_profiles(_page): status = 'pending' [AND city_id] ORDER BY created_at, id
+CREATE INDEX idx_barbers_status_city_created ON barbers (status, city_id, created_at);
+CREATE INDEX idx_barbers_status_created ON barbers (status, created_at);
+
+-- user_has_role, switch_active_role, роли в get_user_context
+CREATE INDEX idx_user_roles_user ON user_roles (user_id, role, is_active);
+-- Последний выбранный город в get_user_context
+CREATE INDEX idx_city_selections_user ON user_city_selections (user_id, selected_at, city_id);
+
+-- get_barber_photos, удаление портфолио
+CREATE INDEX idx_portfolio_barber ON barber_portfolio (barber_id, position);
+-- get_barber_services, подзапрос фильтра в get_filtered_barbers, цены в get_search_index_data
+CREATE INDEX idx_services_barber ON barber_services (barber_id, category_id, price);
+
+-- Один отзыв клиента на барбера: ключ для ON DUPLICATE KEY в add_barber_rating.
+-- Из повторов остаётся последний, остальные переносятся в reviews_duplicates_archive
+-- (не удаляются безвозвратно); счётчики анкет поправит reconcile_barber_aggregates.
+-- Сколько строк будет перенесено, до миграции покажет:
+--   SELECT COUNT(DISTINCT r.id) FROM reviews r JOIN reviews newer
+--   ON newer.barber_id = r.barber_id AND newer.client_id = r.client_id AND newer.id > r.id;
+CREATE TABLE IF NOT EXISTS reviews_duplicates_archive LIKE reviews;
+INSERT IGNORE INTO reviews_duplicates_archive
+SELECT DISTINCT r.* FROM reviews r
+JOIN reviews newer ON newer.barber_id = r.barber_id AND newer.client_id = r.client_id AND newer.id > r.id;
+DELETE r FROM reviews r
+JOIN reviews_duplicates_archive archived ON archived.id = r.id;
+CREATE UNIQUE INDEX uq_reviews_barber_client ON reviews (barber_id, client_id);
+
+-- is_barber_favorite, toggle_favorite, get_favorite_barbers.
+-- Из повторов остаётся первый, остальные переносятся в favorites_duplicates_archive
+CREATE TABLE IF NOT EXISTS favorites_duplicates_archive LIKE favorites;
+INSERT IGNORE INTO favorites_duplicates_archive
+SELECT DISTINCT f.* FROM favorites f
+JOIN favorites older ON older.client_id = f.client_id AND older.barber_id = f.barber_id AND older.id < f.id;
+DELETE f FROM favorites f
+JOIN favorites_duplicates_archive archived ON archived.id = f.id;
+CREATE UNIQUE INDEX uq_favorites_client_barber ON favorites (client_id, barber_id);
+
+-- Станции города в справочниках и поиск станции по названию
+CREATE INDEX idx_metro_city ON metro_stations (city_id, name);
+-- Фото стрижек справочника
+CREATE INDEX idx_guide_photos_haircut ON haircut_guide_photos (haircut_id, is_primary);
@@ -0,0 +1,84 @@
+import random
+import threading
+import time
+
+from telebot import types
+
+from core.dispatcher import UpdateDispatcher, chat_key
+
+
+def message_update(update_id, chat_id):
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Тест'},
+            'text': f"сообщение {update_id}",
+        },
+    })
+
+
+def callback_update(update_id, user_id):
+    return types.Update.de_json({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'chat_instance': 'x',
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Тест'},
+            'data': 'client_page_1',
+        },
+    })
+
+
+class RecordingBot:
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.lock = threading.Lock()
+        self.handled = []   # (chat_id, update_id, поток)
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            # Случайная задержка перемешала бы апдейты, если бы порядок не соблюдался
+            time.sleep(random.random() / 1000)
+            with self.lock:
+                self.handled.append((chat_key(update), update.update_id, threading.current_thread().name))
+            if update.update_id in self.fail_on:
+                raise RuntimeError("обработчик упал")
+
+
+def test_chat_key():
+    assert chat_key(message_update(1, 55)) == 55
+    assert chat_key(callback_update(2, 77)) == 77
+
+
+def test_per_chat_order_and_affinity():
+    bot = RecordingBot()
+    dispatcher = UpdateDispatcher(bot, workers=4, queue_size=5)
+    dispatcher.start()
+    sent = {}
+    for update_id in range(1, 201):
+        chat_id = random.choice((10, 11, 12, 13, 14, 15))
+        sent.setdefault(chat_id, []).append(update_id)
+        dispatcher.submit(message_update(update_id, chat_id))
+    dispatcher.stop()
+
+    for chat_id, update_ids in sent.items():
+        handled = [(update_id, thread) for key, update_id, thread in bot.handled if key == chat_id]
+        assert [update_id for update_id, _ in handled] == update_ids
+        assert len({thread for _, thread in handled}) == 1
+    stats = dispatcher.stats()
+    assert sum(worker['processed'] for worker in stats['workers']) == 200
+
+
+def test_failing_update_does_not_stop_the_worker():
+    bot = RecordingBot(fail_on={2})
+    dispatcher = UpdateDispatcher(bot, workers=1, queue_size=10)
+    dispatcher.start()
+    for update_id in (1, 2, 3):
+        dispatcher.submit(message_update(update_id, 10))
+    dispatcher.stop()
+
+    assert [update_id for _, update_id, _ in bot.handled] == [1, 2, 3]
+    assert dispatcher.stats()['workers'][0]['errors'] == 1
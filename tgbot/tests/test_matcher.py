@@ -0,0 +1,33 @@
+from core.matcher import NameMatcher, search_key
+
+CITIES = [
+    (1, 'Москва'),
+    (2, 'Мурманск'),
+    (3, 'Омск'),
+    (4, 'Томск'),
+    (5, 'Санкт-Петербург'),
+    (6, 'Новосибирск'),
+]
+
+
+def test_search_key_transliterates_and_folds():
+    assert search_key('Щёлковская') == search_key('shchelkovskaya') == search_key('Schelkovskaja')
+    assert search_key('Санкт-Петербург') == 'sankt peterburg'
+
+
+def test_suggest_typo_in_cyrillic():
+    assert NameMatcher(CITIES).suggest('моска')[0] == (1, 'Москва')
+
+
+def test_suggest_latin_input():
+    assert NameMatcher(CITIES).suggest('moskva')[0] == (1, 'Москва')
+
+
+def test_suggest_prefix_ranks_above_typos():
+    matcher = NameMatcher(CITIES + [(7, 'Моршанск')])
+    assert matcher.suggest('мо')[:2] == [(1, 'Москва'), (7, 'Моршанск')]
+
+
+def test_suggest_nothing_similar():
+    assert NameMatcher(CITIES).suggest('владивосток') == []
+    assert NameMatcher(CITIES).suggest('  ') == []
@@ -0,0 +1,79 @@
+import pytest
+
+from core.migrations import EXPECTED_INDEXES, IndexSpec, Migration, discover
+
+
+def write_migration(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return path
+
+
+def test_statements_split_on_trailing_semicolon(tmp_path):
+    path = write_migration(tmp_path, '0001_test.sql', (
+        "-- комментарий; с точкой с запятой\n"
+        "CREATE TABLE t (\n"
+        "    id INT,\n"
+        "    note VARCHAR(10) DEFAULT 'a;b'\n"
+        ");\n"
+        "\n"
+        "   -- отступ перед комментарием\n"
+        "CREATE INDEX idx_t ON t (id);\n"
+        "UPDATE t SET id = 1\n"
+    ))
+    statements = Migration(1, 'test', str(path)).statements()
+
+    assert statements == [
+        "CREATE TABLE t (\n    id INT,\n    note VARCHAR(10) DEFAULT 'a;b'\n)",
+        "CREATE INDEX idx_t ON t (id)",
+        "UPDATE t SET id = 1",
+    ]
+
+
+def test_checksum_changes_with_content(tmp_path):
+    path = write_migration(tmp_path, '0001_test.sql', "SELECT 1;\n")
+    migration = Migration(1, 'test', str(path))
+    before = migration.checksum
+    path.write_text("SELECT 2;\n", encoding='utf-8')
+    assert migration.checksum != before
+
+
+def test_discover_orders_by_version(tmp_path):
+    write_migration(tmp_path, '0010_later.sql', "SELECT 1;\n")
+    write_migration(tmp_path, '0002_first.sql', "SELECT 1;\n")
+    write_migration(tmp_path, 'notes.txt', "")
+    assert [str(migration) for migration in discover(str(tmp_path))] == ['0002_first', '0010_later']
+
+
+def test_discover_rejects_duplicate_versions(tmp_path):
+    write_migration(tmp_path, '0002_a.sql', "SELECT 1;\n")
+    write_migration(tmp_path, '0002_b.sql', "SELECT 1;\n")
+    with pytest.raises(ValueError):
+        discover(str(tmp_path))
+
+
+def test_repository_migrations_parse():
+    migrations = discover()
+    assert [migration.version for migration in migrations] == [1, 2, 3]
+    for migration in migrations:
+        for statement in migration.statements():
+            assert statement and not statement.endswith(';')
+            assert not statement.lstrip().startswith('--')
+
+
+def test_expected_indexes_are_created_by_0003():
+    text = discover()[2].read()
+    for spec in EXPECTED_INDEXES:
+        if spec.table == 'users':
+            continue   # telegram_id — первичный ключ из 0001_initial_schema
+        assert f"ON {spec.table} (" in text, spec
+
+
+def test_index_spec_matching():
+    spec = IndexSpec('barbers', ('status', 'rating'))
+    assert spec.satisfied_by(['status', 'rating', 'id'], unique=False)
+    assert not spec.satisfied_by(['rating', 'status'], unique=False)
+    unique = IndexSpec('reviews', ('barber_id', 'client_id'), unique=True)
+    assert unique.satisfied_by(['barber_id', 'client_id'], unique=True)
+    assert not unique.satisfied_by(['barber_id', 'client_id'], unique=False)
+    assert not unique.satisfied_by(['barber_id', 'client_id', 'id'], unique=True)
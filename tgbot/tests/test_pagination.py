@@ -0,0 +1,36 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from core.pagination import CALLBACK_DATA_LIMIT, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    rating_key = (Decimal('4.75'), 1234567)
+    created_key = (datetime(2024, 3, 9, 18, 45, 12, 123456), 42)
+    assert decode_cursor(encode_cursor(rating_key)) == (4.75, 1234567)
+    assert decode_cursor(encode_cursor(created_key)) == created_key
+
+
+def test_empty_cursor_is_start_of_list():
+    assert decode_cursor('') is None
+
+
+@pytest.mark.parametrize('prefix, key', [
+    # Курсоры ClientManager.show_active_barbers и AdminManager.show_pending_profiles
+    ('client_next', (Decimal('4.99'), 2 ** 31 - 1)),
+    ('admin_pending_next', (datetime(2099, 12, 31, 23, 59, 59, 999999), 2 ** 31 - 1)),
+])
+def test_cursor_fits_callback_data(prefix, key):
+    cursor = encode_cursor(key)
+    data = f"{prefix}_99999_{2 ** 31 - 1}_{cursor}"
+    assert len(data.encode('utf-8')) <= CALLBACK_DATA_LIMIT
+    assert '_' not in cursor and ':' not in cursor
+    assert decode_cursor(data.split('_')[-1]) == tuple(float(v) if isinstance(v, Decimal) else v for v in key)
+
+
+@pytest.mark.parametrize('value', [None, True, 'text'])
+def test_unsupported_values(value):
+    with pytest.raises(ValueError):
+        encode_cursor((value,))
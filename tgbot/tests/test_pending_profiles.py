@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import managers.database as database_module
+from core.pagination import decode_cursor
+from managers.admin import AdminManager
+from managers.database import DatabaseManager, PendingProfile
+
+
+class FakeDatabase:
+    """Вместо MySQL: запоминает запросы и отдаёт заранее заданные строки"""
+
+    rows = []
+    queries = []
+    connections = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def connect(self):
+        FakeDatabase.connections += 1
+        return True
+
+    def execute(self, query, params=None, fetch_one=False):
+        FakeDatabase.queries.append((query, params))
+        return list(FakeDatabase.rows)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append((chat_id, text, reply_markup))
+
+
+def pending_row(idx):
+    submitted_at = datetime(2024, 5, 1, 12, 0) + timedelta(minutes=idx)
+    metro = f"Станция {idx}" if idx % 2 else None
+    return (idx, 1000 + idx, f"user{idx}", f"Мастер {idx}", "Москва", metro, 3, idx, submitted_at)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    monkeypatch.setattr(database_module, 'Database', FakeDatabase)
+    FakeDatabase.rows = [pending_row(idx) for idx in range(1, 12)]
+    FakeDatabase.queries = []
+    FakeDatabase.connections = 0
+    return FakeDatabase
+
+
+def test_page_is_loaded_with_one_query(fake_db):
+    profiles, has_more = DatabaseManager.get_pending_profiles_page(per_page=10)
+
+    assert len(fake_db.queries) == 1 and fake_db.connections == 1
+    assert has_more
+    assert len(profiles) == 10
+    assert all(isinstance(profile, PendingProfile) for profile in profiles)
+    first = profiles[0]
+    assert (first.id, first.first_name, first.city_name, first.metro_name, first.photos_count) == (
+        1, "Мастер 1", "Москва", "Станция 1", 1
+    )
+    assert profiles[1].metro_name is None
+
+
+def test_admin_list_makes_no_per_row_queries(fake_db, monkeypatch):
+    monkeypatch.setattr(DatabaseManager, 'is_admin', staticmethod(lambda user_id: True))
+    bot = FakeBot()
+
+    AdminManager.show_pending_profiles(bot, 1)
+
+    assert len(fake_db.queries) == 1
+    (_, _, markup), = bot.sent
+    buttons = [row[0] for row in markup.keyboard]
+    assert buttons[0].text == "Мастер 1 (Станция 1) (Москва)"
+    assert buttons[1].text == "Мастер 2 (Москва)"
+    # Курсор следующей страницы — (created_at, id) последней анкеты
+    next_button = markup.keyboard[10][0]
+    assert next_button.callback_data.startswith("admin_pending_next_1__")
+    assert decode_cursor(next_button.callback_data.split('_')[-1]) == (pending_row(10)[8], 10)
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from core.router import Router
+
+
+def handler(name):
+    def func(*args):
+        return name
+    func.__qualname__ = name
+    return func
+
+
+def test_exact_text_before_predicates():
+    router = Router()
+    menu, fallback = handler('menu'), handler('fallback')
+    router.text("📋 Меню")(menu)
+    router.text_matching(lambda text: text.startswith("📋"))(fallback)
+
+    assert router.resolve_message(SimpleNamespace(text="📋 Меню")) is menu
+    assert router.resolve_message(SimpleNamespace(text="📋 Другое")) is fallback
+    assert router.resolve_message(SimpleNamespace(text="привет")) is None
+    assert router.resolve_message(SimpleNamespace(text=None)) is None
+
+
+def test_callback_exact_and_longest_prefix():
+    router = Router()
+    back, admin, view = handler('back'), handler('admin'), handler('view')
+    router.callback("admin_back_to_list")(back)
+    router.callback_prefix("admin_")(admin)
+    router.callback_prefix("admin_view_profile_")(view)
+
+    assert router.resolve_callback("admin_back_to_list") == (back, [])
+    assert router.resolve_callback("admin_view_profile_42") == (view, ['42'])
+    assert router.resolve_callback("admin_pending_next_1__i1") == (admin, ['pending', 'next', '1', '', 'i1'])
+    assert router.resolve_callback("client_page_1") is None
+
+
+def test_conflicts_are_reported_and_first_registration_wins():
+    router = Router()
+    first, second = handler('first'), handler('second')
+    router.text("📍 Выбрать город")(first)
+    router.text("📍 Выбрать город")(second)
+    router.callback_prefix("guide_")(first)
+    router.callback_prefix("guide_")(second)
+
+    assert router.resolve_message(SimpleNamespace(text="📍 Выбрать город")) is first
+    problems = router.report()
+    assert len(problems) == 2
+    assert all('second недостижим' in problem for problem in problems)
+
+
+def test_overlaps_are_reported():
+    router = Router()
+    router.text("❌ Отмена")(handler('cancel'))
+    router.text_matching(lambda text: text.startswith("❌"))(handler('any_cross'))
+    router.callback("client_back")(handler('back'))
+    router.callback_prefix("client_")(handler('client'))
+
+    problems = router.report()
+    assert len(problems) == 2
+    assert "подходит и под предикат any_cross" in problems[0]
+    assert "перекрывает префикс client" in problems[1]
+
+
+def test_bot_has_no_unreachable_routes():
+    from config.settings import Settings
+    Settings.BOT_TOKEN = Settings.BOT_TOKEN or '1:test'
+    import core.bot
+    from core.router import router
+    from managers.client import register_client_handlers
+    from managers.guide import GuideManager
+
+    core.bot.register_handlers()
+    register_client_handlers(core.bot.bot)
+    GuideManager.init_handlers(core.bot.bot)
+    problems = router.report()
+    assert not [problem for problem in problems if 'недостижим' in problem]
+    # Кнопка меню «➕ Добавить роль» намеренно перекрывает предикат выбора роли
+    assert len(problems) == 1 and "'➕ Добавить роль'" in problems[0]
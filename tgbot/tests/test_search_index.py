@@ -0,0 +1,102 @@
+import pytest
+
+from managers.database import DatabaseManager
+from managers.search import BarberSearchIndex
+
+
+def barber_row(barber_id, city_id, metro_id):
+    # Формат get_search_index_data: строка get_filtered_barbers + city_id, metro_id
+    return (barber_id, 1000 + barber_id, f"user{barber_id}", f"Город {city_id}", 5, None, None, None, 3,
+            f"Мастер {barber_id}", f"Станция {metro_id}", city_id, metro_id)
+
+
+class FakeData:
+    """Активные барберы и цены «в базе»; запоминает запросы индекса"""
+
+    def __init__(self):
+        self.barbers = {}   # barber_id -> строка
+        self.prices = {}    # barber_id -> {категория: цена}
+        self.requests = []
+        self.fail = False
+        self.during_read = None
+
+    def get_search_index_data(self, barber_ids=None):
+        self.requests.append(None if barber_ids is None else sorted(barber_ids))
+        if self.during_read:
+            self.during_read()
+        if self.fail:
+            return None
+        ids = self.barbers.keys() if barber_ids is None else [i for i in barber_ids if i in self.barbers]
+        rows = [self.barbers[i] for i in ids]
+        prices = [(i, category, price) for i in ids for category, price in self.prices.get(i, {}).items()]
+        return rows, prices
+
+
+@pytest.fixture
+def data(monkeypatch):
+    data = FakeData()
+    monkeypatch.setattr(DatabaseManager, 'barber_change_listeners', [])
+    monkeypatch.setattr(DatabaseManager, 'get_search_index_data', staticmethod(data.get_search_index_data))
+    data.barbers = {1: barber_row(1, 10, 100), 2: barber_row(2, 10, 101), 3: barber_row(3, 20, 200)}
+    data.prices = {1: {'beard': 500, 'short': 900}, 2: {'short': 700}}
+    return data
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_filters_match_sql_version(data):
+    index = BarberSearchIndex()
+    assert ids(index.search(10)) == [1, 2]
+    assert ids(index.search(10, metro_id=101)) == [2]
+    # Борода и короткие стрижки не дороже 800 — только барбер 1 делает обе, но short у него 900
+    assert ids(index.search(10, max_price=1000, specialization_num=4)) == [1]
+    assert ids(index.search(10, max_price=800, specialization_num=4)) == []
+    assert ids(index.search(10, max_price=800, specialization_num=3)) == [2]
+    # Без цены фильтр по услугам не применяется
+    assert ids(index.search(10, specialization_num=1)) == [1, 2]
+    assert data.requests == [None]
+
+
+def test_changed_barber_is_refreshed_alone(data):
+    index = BarberSearchIndex()
+    index.search(10)
+
+    data.barbers[2] = barber_row(2, 20, 201)    # переехал в другой город
+    del data.barbers[1]                         # больше не активен
+    DatabaseManager.notify_barber_changed(1)
+    DatabaseManager.notify_barber_changed(2)
+
+    assert ids(index.search(10)) == []
+    assert ids(index.search(20)) == [2, 3]
+    assert data.requests == [None, [1, 2]]
+
+
+def test_failed_refresh_is_retried(data):
+    index = BarberSearchIndex()
+    index.search(10)
+    data.prices[2] = {'beard': 300}
+    DatabaseManager.notify_barber_changed(2)
+
+    data.fail = True
+    index.search(10)
+    data.fail = False
+    assert ids(index.search(10, max_price=400, specialization_num=1)) == [2]
+    assert data.requests == [None, [2], [2]]
+
+
+def test_change_during_full_load_is_not_lost(data):
+    index = BarberSearchIndex()
+
+    def change_barber():
+        # Правка анкеты, пришедшая между чтением снимка и его применением
+        data.during_read = None
+        DatabaseManager.notify_barber_changed(3)
+
+    data.during_read = change_barber
+    assert index.load()
+    data.barbers[3] = barber_row(3, 20, 202)
+
+    assert ids(index.search(20, metro_id=202)) == [3]
+    assert data.requests == [None, [3]]
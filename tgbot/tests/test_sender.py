@@ -0,0 +1,97 @@
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from core import sender
+from core.sender import RateLimitedTeleBot, RateLimiter
+
+
+class FakeClock:
+    """time.monotonic/time.sleep без реального ожидания"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sender.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(sender.time, 'sleep', clock.sleep)
+    return clock
+
+
+def too_many_requests(retry_after):
+    return ApiTelegramException('sendMessage', None, {
+        'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+        'parameters': {'retry_after': retry_after},
+    })
+
+
+def test_chat_burst_then_rate(clock):
+    limiter = RateLimiter(global_rate=30, chat_rate=1, chat_burst=3)
+    for _ in range(3):
+        limiter.acquire(1)
+    assert clock.slept == []
+
+    limiter.acquire(1)
+    assert sum(clock.slept) == pytest.approx(1.0)
+    # Другой чат не ждёт
+    waited = sum(clock.slept)
+    limiter.acquire(2)
+    assert sum(clock.slept) == waited
+    assert limiter.stats()['throttled'] == 1
+
+
+def test_pause_delays_every_chat(clock):
+    limiter = RateLimiter(global_rate=30, chat_rate=1, chat_burst=3)
+    limiter.pause(5)
+    limiter.acquire(42)
+    assert sum(clock.slept) == pytest.approx(5.0)
+    assert limiter.stats()['retry_after'] == 1
+
+
+def test_429_is_retried_after_retry_after(clock):
+    bot = RateLimitedTeleBot('1:test', RateLimiter(30, 1, 3))
+    calls = []
+
+    def method(chat_id, text):
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise too_many_requests(7)
+        return 'sent'
+
+    assert bot._limited(1, method, 1, "привет") == 'sent'
+    assert calls[1] - calls[0] == pytest.approx(7.0)
+    assert bot.limiter.stats()['retry_after'] == 1
+
+
+def test_429_gives_up_after_max_retries(clock):
+    bot = RateLimitedTeleBot('1:test', RateLimiter(30, 1, 3))
+
+    def method(chat_id):
+        raise too_many_requests(1)
+
+    with pytest.raises(ApiTelegramException):
+        bot._limited(1, method, 1)
+    assert bot.limiter.stats()['retry_after'] == bot.MAX_RETRIES
+
+
+def test_other_errors_are_not_retried(clock):
+    bot = RateLimitedTeleBot('1:test', RateLimiter(30, 1, 3))
+    calls = []
+
+    def method(chat_id):
+        calls.append(chat_id)
+        raise ApiTelegramException('sendMessage', None, {'ok': False, 'error_code': 403, 'description': 'Forbidden'})
+
+    with pytest.raises(ApiTelegramException):
+        bot._limited(1, method, 1)
+    assert calls == [1]
@@ -0,0 +1,79 @@
+import pytest
+from telebot import Handler
+
+from core import steps
+from core.steps import PersistentStepBackend, next_step
+
+BOT = object()
+
+
+@next_step("tests.answer")
+def answer_step(message, bot, question):
+    return question
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(steps.time, 'time', lambda: now[0])
+    return now
+
+
+def make_backend(tmp_path, ttl=60, max_per_chat=2):
+    backend = PersistentStepBackend(str(tmp_path / 'steps.sqlite3'), ttl=ttl, max_per_chat=max_per_chat)
+    backend.bind(BOT)
+    return backend
+
+
+def test_step_survives_restart(tmp_path, clock):
+    make_backend(tmp_path).register_handler(7, Handler(answer_step, BOT, 'city'))
+
+    restored = make_backend(tmp_path).get_handlers(7)
+    assert len(restored) == 1
+    assert restored[0].callback is answer_step
+    # Бот подставляется заново, остальные аргументы — из JSON
+    assert restored[0].args == (BOT, 'city')
+
+
+def test_get_handlers_pops(tmp_path, clock):
+    backend = make_backend(tmp_path)
+    backend.register_handler(7, Handler(answer_step, BOT, 'city'))
+    assert backend.get_handlers(7)
+    assert backend.get_handlers(7) is None
+    assert make_backend(tmp_path).get_handlers(7) is None
+
+
+def test_expired_step_is_dropped(tmp_path, clock):
+    backend = make_backend(tmp_path, ttl=60)
+    backend.register_handler(7, Handler(answer_step, BOT, 'old'))
+    clock[0] += 61
+    backend.register_handler(8, Handler(answer_step, BOT, 'fresh'))
+
+    assert backend.purge_expired() == 1
+    assert backend.get_handlers(7) is None
+    assert [handler.args[1] for handler in backend.get_handlers(8)] == ['fresh']
+
+
+def test_expired_step_is_not_run_before_purge(tmp_path, clock):
+    backend = make_backend(tmp_path, ttl=60)
+    backend.register_handler(7, Handler(answer_step, BOT, 'old'))
+    clock[0] += 61
+    assert backend.get_handlers(7) is None
+
+
+def test_only_last_steps_per_chat_are_kept(tmp_path, clock):
+    backend = make_backend(tmp_path, max_per_chat=2)
+    for question in ('one', 'two', 'three'):
+        backend.register_handler(7, Handler(answer_step, BOT, question))
+
+    assert [handler.args[1] for handler in backend.get_handlers(7)] == ['two', 'three']
+
+
+def test_unnamed_handlers_stay_in_memory(tmp_path, clock):
+    backend = make_backend(tmp_path, max_per_chat=2)
+    callbacks = [lambda message: None for _ in range(3)]
+    for callback in callbacks:
+        backend.register_handler(7, Handler(callback))
+
+    assert make_backend(tmp_path).get_handlers(7) is None
+    assert [handler.callback for handler in backend.get_handlers(7)] == callbacks[1:]
@@ -0,0 +1,115 @@
+import json
+import threading
+
+from config.settings import Settings
+from core.storage import CachedDraftBackend, DraftBackend, _import_legacy_json
+
+
+class MemoryBackend(DraftBackend):
+    def __init__(self):
+        self.data = {}
+        self.writes = []
+
+    def get(self, user_id):
+        return self.data.get(user_id)
+
+    def put(self, user_id, data):
+        self.writes.append(user_id)
+        self.data[user_id] = data
+
+    def delete(self, user_id):
+        self.data.pop(user_id, None)
+
+    def update(self, user_id, func):
+        data = func(self.get(user_id) or {})
+        self.put(user_id, data)
+        return data
+
+    def is_empty(self):
+        return not self.data
+
+
+def make_cache(max_size=2):
+    backend = MemoryBackend()
+    # flush_interval больше длительности теста: запись только при вытеснении или flush()
+    return backend, CachedDraftBackend(backend, max_size=max_size, flush_interval=3600)
+
+
+def test_writes_are_deferred_until_flush():
+    backend, cache = make_cache()
+    cache.put(1, {'name': 'Иван'})
+    cache.update(1, lambda profile: dict(profile, city='Москва'))
+    assert backend.data == {}
+
+    cache.flush()
+    assert backend.data == {1: {'name': 'Иван', 'city': 'Москва'}}
+    assert backend.writes == [1]
+
+
+def test_evicted_dirty_entry_is_flushed_once():
+    backend, cache = make_cache(max_size=1)
+    cache.put(1, {'name': 'Иван'})
+    cache.put(2, {'name': 'Пётр'})
+    # Вытесненный черновик ждёт сброса в памяти и будит поток сброса
+    assert backend.data == {}
+    assert cache._wakeup.is_set()
+    assert cache.get(1) == {'name': 'Иван'}
+
+    cache.flush()
+    assert backend.data == {1: {'name': 'Иван'}, 2: {'name': 'Пётр'}}
+    assert sorted(backend.writes) == [1, 2]
+
+
+def test_backend_io_runs_outside_cache_lock():
+    started, release = threading.Event(), threading.Event()
+
+    class SlowBackend(MemoryBackend):
+        def put(self, user_id, data):
+            started.set()
+            release.wait(5)
+            super().put(user_id, data)
+
+    backend = SlowBackend()
+    cache = CachedDraftBackend(backend, max_size=10, flush_interval=3600)
+    cache.put(1, {'step': 1})
+    flusher = threading.Thread(target=cache.flush)
+    flusher.start()
+    assert started.wait(5)
+
+    # Пока backend пишет, другие пользователи читают и пишут из памяти
+    cache.put(2, {'step': 1})
+    cache.update(1, lambda profile: dict(profile, step=2))
+    assert cache.get(1) == {'step': 2}
+    release.set()
+    flusher.join()
+
+    # Изменение, сделанное во время записи, не потеряно и уходит следующим сбросом
+    assert backend.data == {1: {'step': 1}}
+    cache.flush()
+    assert backend.data == {1: {'step': 2}, 2: {'step': 1}}
+
+
+def test_delete_of_cached_entry_reaches_backend():
+    backend, cache = make_cache()
+    backend.data[1] = {'name': 'Иван'}
+    assert cache.get(1) == {'name': 'Иван'}
+    cache.delete(1)
+    assert cache.get(1) is None
+    cache.flush()
+    assert cache.get(1) is None
+    assert backend.data == {}
+
+
+def test_legacy_json_is_imported_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings, 'DRAFTS_PATH', str(tmp_path / 'drafts.sqlite3'))
+    legacy = tmp_path / 'barber_profiles.json'
+    legacy.write_text(json.dumps({'1': {'name': 'Иван'}}), encoding='utf-8')
+    backend = MemoryBackend()
+
+    _import_legacy_json(backend, str(legacy))
+    assert backend.data == {1: {'name': 'Иван'}}
+
+    # Черновик завершён, хранилище опустело: после перезапуска он не возвращается
+    backend.delete(1)
+    _import_legacy_json(backend, str(legacy))
+    assert backend.data == {}